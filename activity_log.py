@@ -0,0 +1,72 @@
+"""
+Registro de actividad acotado para las interfaces gráficas
+
+Los mensajes se guardan en un buffer circular de tamaño fijo y se vuelcan
+al widget de texto en un solo insert por fotograma (las GUIs lo llaman
+desde el ProgressBus). El widget nunca pasa de max_lineas: las más viejas
+se borran al volcar. El historial completo va a un archivo de log que
+rota por tamaño, así la memoria y el coste de redibujar no crecen aunque
+la aplicación lleve días abierta.
+"""
+
+import logging
+import threading
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+# Líneas visibles en el widget
+MAX_LINEAS = 1000
+# Tamaño de cada archivo de log y copias rotadas que se conservan
+MAX_BYTES = 5 * 1024 * 1024
+COPIAS = 3
+
+
+class ActivityLog:
+    def __init__(self, archivo=None, max_lineas=MAX_LINEAS, max_bytes=MAX_BYTES, copias=COPIAS):
+        self.max_lineas = max_lineas
+        self._lock = threading.Lock()
+        # Si llegan más líneas que max_lineas entre dos volcados, las viejas
+        # ya no cabrían en el widget: el deque las descarta solo
+        self._pendientes = deque(maxlen=max_lineas)
+        self._log = None
+        if archivo:
+            archivo = Path(archivo)
+            try:
+                archivo.parent.mkdir(parents=True, exist_ok=True)
+                manejador = RotatingFileHandler(archivo, maxBytes=max_bytes, backupCount=copias,
+                                                encoding='utf-8')
+            except OSError:
+                manejador = None
+            if manejador is not None:
+                manejador.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+                self._log = logging.getLogger(f'{__name__}.{id(self)}')
+                self._log.propagate = False
+                self._log.setLevel(logging.INFO)
+                self._log.addHandler(manejador)
+
+    def escribir(self, mensaje):
+        """Añade un mensaje (se puede llamar desde cualquier hilo)"""
+        with self._lock:
+            self._pendientes.append(mensaje)
+        if self._log is not None:
+            self._log.info(mensaje)
+
+    def volcar(self, widget):
+        """Inserta lo pendiente en el widget de texto y recorta las líneas viejas (hilo de Tk)"""
+        with self._lock:
+            lineas = list(self._pendientes)
+            self._pendientes.clear()
+        if not lineas:
+            return
+        widget.insert("end", "\n".join(lineas) + "\n")
+        sobran = int(widget.index("end-1c").split(".")[0]) - 1 - self.max_lineas
+        if sobran > 0:
+            widget.delete("1.0", f"{sobran + 1}.0")
+        widget.see("end")
+
+    def cerrar(self):
+        if self._log is not None:
+            for manejador in list(self._log.handlers):
+                manejador.close()
+                self._log.removeHandler(manejador)
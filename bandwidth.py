@@ -0,0 +1,143 @@
+"""
+Planificador de ancho de banda compartido por todas las descargas del proceso
+
+Un cubo de tokens con límite global opcional, repartido entre los trabajos
+activos según su prioridad (reparto justo ponderado): una descarga de la
+interfaz con prioridad 4 recibe cuatro veces más que una de un lote con
+prioridad 1. Los trabajos inactivos no reservan su parte.
+
+Se engancha como progress hook de yt-dlp: el hook calcula los bytes nuevos
+y, si el trabajo va por encima de su parte, duerme el hilo de descarga.
+"""
+
+import itertools
+import threading
+import time
+
+PRIORIDAD_LOTE = 1
+PRIORIDAD_INTERACTIVA = 4
+
+# Segundos de ráfaga que puede acumular cada trabajo
+RAFAGA = 0.5
+# Un trabajo sin bytes nuevos durante este tiempo deja de contar en el reparto
+INACTIVIDAD = 1.0
+
+
+class BandwidthScheduler:
+    def __init__(self, limite=None):
+        # Bytes por segundo para todo el proceso (None = sin límite, solo se mide)
+        self.limite = limite
+        self._lock = threading.Lock()
+        self._trabajos = {}
+        self._ids = itertools.count(1)
+
+    def registrar(self, nombre, prioridad=PRIORIDAD_LOTE, al_consumir=None):
+        """
+        Da de alta un trabajo; usar su .hook como progress hook y llamar a .terminar() al acabar
+
+        al_consumir se llama con los bytes nuevos cada vez que el trabajo avanza.
+        """
+        with self._lock:
+            trabajo = _Trabajo(self, next(self._ids), nombre, prioridad, al_consumir)
+            self._trabajos[trabajo.id] = trabajo
+        return trabajo
+
+    def estadisticas(self):
+        """Velocidad actual por trabajo y total, en bytes por segundo"""
+        ahora = time.monotonic()
+        with self._lock:
+            trabajos = [
+                {
+                    'id': t.id,
+                    'nombre': t.nombre,
+                    'prioridad': t.prioridad,
+                    'bytes': t.bytes,
+                    'velocidad': t.velocidad if ahora - t.ultimo_uso < 2 else 0.0,
+                }
+                for t in self._trabajos.values()
+            ]
+        return {
+            'limite': self.limite,
+            'velocidad_total': sum(t['velocidad'] for t in trabajos),
+            'trabajos': trabajos,
+        }
+
+    def _cuota(self, trabajo, ahora):
+        """Parte del límite global que corresponde al trabajo (con el lock tomado)"""
+        # El propio trabajo cuenta aunque ya se haya quitado (una descarga repetida
+        # tras fallar la verificación sigue usando su registro)
+        pesos = trabajo.prioridad + sum(t.prioridad for t in self._trabajos.values()
+                                        if t is not trabajo and ahora - t.ultimo_uso < INACTIVIDAD)
+        return self.limite * trabajo.prioridad / pesos
+
+    def _quitar(self, trabajo):
+        with self._lock:
+            self._trabajos.pop(trabajo.id, None)
+
+
+class _Trabajo:
+    def __init__(self, planificador, id_trabajo, nombre, prioridad, al_consumir=None):
+        self.planificador = planificador
+        self.al_consumir = al_consumir
+        self.id = id_trabajo
+        self.nombre = nombre
+        self.prioridad = max(1, prioridad)
+        self.bytes = 0
+        self.velocidad = 0.0
+        self.ultimo_uso = self._inicio_ventana = self._tokens_en = time.monotonic()
+        self._bytes_ventana = 0
+        self._tokens = 0.0
+        self._vistos = {}
+
+    def hook(self, d):
+        """Progress hook de yt-dlp: cuenta los bytes nuevos de cada archivo"""
+        archivo = d.get('filename') or d.get('tmpfilename')
+        if d.get('status') == 'finished':
+            # Los bytes del último tramo solo llegan con 'finished'; si el
+            # archivo no se vio descargando es que ya existía y no cuenta
+            if archivo not in self._vistos:
+                return
+        elif d.get('status') != 'downloading':
+            return
+        descargado = d.get('downloaded_bytes') or 0
+        with self.planificador._lock:
+            anterior = self._vistos.get(archivo, 0)
+            self._vistos[archivo] = descargado
+        # Si el contador baja es que el archivo volvió a empezar
+        self.consumir(descargado - anterior if descargado >= anterior else descargado)
+
+    def consumir(self, n):
+        """Registra n bytes descargados y espera si el trabajo supera su parte"""
+        if n <= 0:
+            return
+        if self.al_consumir:
+            self.al_consumir(n)
+        planificador = self.planificador
+        with planificador._lock:
+            ahora = time.monotonic()
+            self.bytes += n
+            self._bytes_ventana += n
+            transcurrido = ahora - self._inicio_ventana
+            if transcurrido >= 0.5:
+                actual = self._bytes_ventana / transcurrido
+                self.velocidad = actual if not self.velocidad else 0.7 * self.velocidad + 0.3 * actual
+                self._inicio_ventana, self._bytes_ventana = ahora, 0
+            self.ultimo_uso = ahora
+
+            if not planificador.limite:
+                return
+            cuota = planificador._cuota(self, ahora)
+            self._tokens = min(self._tokens + (ahora - self._tokens_en) * cuota, cuota * RAFAGA)
+            self._tokens_en = ahora
+            self._tokens -= n
+            espera = -self._tokens / cuota if self._tokens < 0 else 0
+
+        if espera:
+            time.sleep(espera)
+
+    def terminar(self):
+        self.planificador._quitar(self)
+
+
+# Instancia única para todo el proceso
+planificador = BandwidthScheduler()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tiempo de importación y de primer pintado de las GUIs
+
+Cada medición se hace en un intérprete nuevo para que no haya módulos ya
+cargados. Mide lo que tarda en importarse cada interfaz, si yt-dlp acabó
+en la ruta de arranque (no debería: se importa en segundo plano) y, si hay
+pantalla disponible, el tiempo hasta que la ventana se pinta por primera vez.
+
+Como referencia también mide la importación de yt-dlp y de video_downloader,
+que antes estaban en la ruta de arranque.
+
+Uso: python benchmarks/bench_arranque.py [--repeticiones 5] [--max-ms 400]
+Con --max-ms el script termina con código 1 si alguna interfaz tarda más
+en pintarse (o en importarse, sin pantalla), para detectar regresiones.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+MEDIR_IMPORTACION = '''
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+print(json.dumps({{"importacion": time.perf_counter() - inicio, "yt_dlp": "yt_dlp" in sys.modules}}))
+'''
+
+MEDIR_PINTADO = '''
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+importacion = time.perf_counter() - inicio
+yt_dlp = "yt_dlp" in sys.modules
+app = {modulo}.{clase}()
+app.window.update()
+pintado = time.perf_counter() - inicio
+app.window.destroy()
+print(json.dumps({{"importacion": importacion, "pintado": pintado, "yt_dlp": yt_dlp}}))
+'''
+
+INTERFACES = (
+    ('video_downloader_modern', 'ModernVideoDownloader'),
+    ('video_downloader_gui', 'VideoDownloaderGUI'),
+)
+REFERENCIAS = ('yt_dlp', 'video_downloader')
+
+
+def ejecutar(codigo):
+    """Ejecuta el código en un intérprete nuevo; devuelve su JSON o None si falla"""
+    resultado = subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ,
+                               capture_output=True, text=True, timeout=120)
+    if resultado.returncode != 0:
+        return None
+    try:
+        return json.loads(resultado.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return None
+
+
+def medir(plantilla, repeticiones, **campos):
+    muestras = [ejecutar(plantilla.format(**campos)) for _ in range(repeticiones)]
+    if None in muestras:
+        return None
+    return {clave: statistics.median(m[clave] for m in muestras) if clave != 'yt_dlp' else any(
+        m[clave] for m in muestras) for clave in muestras[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='falla si una interfaz supera este tiempo de arranque')
+    args = parser.parse_args()
+
+    print("Referencia (importación, intérprete nuevo):")
+    for modulo in REFERENCIAS:
+        datos = medir(MEDIR_IMPORTACION, args.repeticiones, modulo=modulo)
+        texto = f"{datos['importacion'] * 1000:7.1f} ms" if datos else "no disponible"
+        print(f"  {modulo:<26} {texto}")
+
+    print("\nInterfaces:")
+    regresiones = []
+    for modulo, clase in INTERFACES:
+        datos = medir(MEDIR_PINTADO, args.repeticiones, modulo=modulo, clase=clase)
+        if datos is None:
+            # Sin pantalla (o sin el tema instalado) solo se puede medir la importación
+            datos = medir(MEDIR_IMPORTACION, args.repeticiones, modulo=modulo)
+        if datos is None:
+            print(f"  {modulo:<26} no disponible (faltan dependencias)")
+            continue
+
+        tiempo = datos.get('pintado', datos['importacion'])
+        linea = f"  {modulo:<26} importación {datos['importacion'] * 1000:7.1f} ms"
+        if 'pintado' in datos:
+            linea += f" | primer pintado {datos['pintado'] * 1000:7.1f} ms"
+        if datos['yt_dlp']:
+            linea += " | ⚠️ yt-dlp en la ruta de arranque"
+            regresiones.append(modulo)
+        print(linea)
+        if args.max_ms is not None and tiempo * 1000 > args.max_ms:
+            regresiones.append(modulo)
+
+    if regresiones:
+        print(f"\n❌ Regresión de arranque en: {', '.join(sorted(set(regresiones)))}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
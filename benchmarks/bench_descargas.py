@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Benchmark: rendimiento de descarga contra un servidor local, sin Internet
+
+Cada escenario publica medios sintéticos en LocalMediaServer (MP4
+progresivos, listas HLS con muchos segmentos, DASH con audio y video
+separados) con latencia, ancho de banda limitado o errores inyectados, y
+descarga con VideoDownloader en un proceso hijo nuevo, así el uso de CPU y
+la memoria máxima son solo de la descarga. Se usan los dos motores: el de
+la CLI (descargar_video) y el de las GUIs (ejecutar_descarga con el
+ProgressBus vaciándose a 30 fps, sin ventana).
+
+Métricas (mediana de las repeticiones): MB/s, tiempo hasta el primer byte,
+tiempo de extracción, segundos de CPU por GB, memoria máxima (RSS) y los
+tiempos de fusión y de verificación que mide el propio descargador (ver
+job_metrics). La fusión es '-' en los escenarios que no fusionan: los
+medios aleatorios no son video de verdad, así que FFmpeg no puede unirlos
+ni comprobarlos y en ellos la verificación solo guarda el resumen de
+integridad. Los escenarios con video real (fusión, fusión en flujo y
+verificación) lo generan con FFmpeg y se omiten si no está.
+
+Uso:
+    python benchmarks/bench_descargas.py                  # compara con baselines.json
+    python benchmarks/bench_descargas.py --guardar-base   # guarda los resultados como referencia
+    python benchmarks/bench_descargas.py --escenarios hls,hls_8_fragmentos --repeticiones 5
+
+Termina con código 1 si algún escenario empeora más de --tolerancia
+respecto a la referencia. Las referencias dependen de la máquina: hay que
+regenerarlas con --guardar-base al cambiar de equipo.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+from servidor_local import LocalMediaServer
+
+BASES = Path(__file__).resolve().parent / 'baselines.json'
+MB = 1024 * 1024
+
+ESCENARIOS = {
+    'progresivo': {
+        'medio': {'tipo': 'progresivo', 'tamano': 32 * MB},
+        'servidor': {'latencia': 0.02},
+    },
+    'progresivo_cli': {
+        'medio': {'tipo': 'progresivo', 'tamano': 32 * MB},
+        'servidor': {'latencia': 0.02},
+        'motor': 'cli',
+    },
+    'progresivo_4_conexiones': {
+        'medio': {'tipo': 'progresivo', 'tamano': 32 * MB},
+        'servidor': {'latencia': 0.02},
+        'descargador': {'conexiones': 4},
+    },
+    'progresivo_limitado': {
+        'medio': {'tipo': 'progresivo', 'tamano': 8 * MB},
+        'servidor': {'latencia': 0.05, 'ancho_banda': 2 * MB},
+    },
+    'progresivo_limitado_4_conexiones': {
+        'medio': {'tipo': 'progresivo', 'tamano': 8 * MB},
+        'servidor': {'latencia': 0.05, 'ancho_banda': 2 * MB},
+        'descargador': {'conexiones': 4},
+    },
+    'progresivo_errores': {
+        'medio': {'tipo': 'progresivo', 'tamano': 16 * MB},
+        'servidor': {'latencia': 0.02, 'errores': 0.05},
+        'descargador': {'conexiones': 4},
+    },
+    'hls': {
+        'medio': {'tipo': 'hls', 'segmentos': 150, 'tamano_segmento': 128 * 1024},
+        'servidor': {'latencia': 0.03},
+    },
+    'hls_8_fragmentos': {
+        'medio': {'tipo': 'hls', 'segmentos': 150, 'tamano_segmento': 128 * 1024},
+        'servidor': {'latencia': 0.03},
+        'descargador': {'fragmentos': 8},
+    },
+    'dash': {
+        'medio': {'tipo': 'dash', 'segmentos': 60, 'tamano_video': 256 * 1024, 'tamano_audio': 32 * 1024},
+        'servidor': {'latencia': 0.03},
+    },
+    'dash_8_fragmentos': {
+        'medio': {'tipo': 'dash', 'segmentos': 60, 'tamano_video': 256 * 1024, 'tamano_audio': 32 * 1024},
+        'servidor': {'latencia': 0.03},
+        'descargador': {'fragmentos': 8},
+    },
+    'fusion': {
+        # Video y audio reales generados con FFmpeg; solo si está instalado
+        'medio': {'tipo': 'fusion', 'segundos': 30},
+        'servidor': {'latencia': 0.02},
+    },
+    'fusion_en_flujo': {
+        # MP4 fragmentado (como DASH) para que FFmpeg lo lea en orden desde la tubería
+        'medio': {'tipo': 'fusion', 'segundos': 30, 'fragmentado': True},
+        'servidor': {'latencia': 0.02},
+        'descargador': {'fusion_en_flujo': True},
+    },
+    'verificacion': {
+        # Un MP4 progresivo con video y audio: sin fusión, solo la comprobación del contenedor
+        'medio': {'tipo': 'mp4_real', 'segundos': 30},
+        'servidor': {'latencia': 0.02},
+    },
+}
+
+# Medios que hay que generar con FFmpeg (el resto son bytes aleatorios)
+MEDIOS_FFMPEG = ('fusion', 'mp4_real')
+
+# Métrica: True si más alto es mejor
+METRICAS = {
+    'mb_s': True,
+    'primer_byte': False,
+    'extraccion': False,
+    'fusion': False,
+    'verificacion': False,
+    'cpu_s_gb': False,
+    'rss_mb': False,
+}
+# Diferencias menores que esto se consideran ruido aunque superen la tolerancia
+HOLGURA = {'primer_byte': 0.05, 'extraccion': 0.05, 'fusion': 0.1, 'verificacion': 0.1, 'cpu_s_gb': 0.5,
+           'rss_mb': 10}
+
+
+def publicar(servidor, medio, carpeta_medios):
+    """Publica el medio del escenario; devuelve lo que hay que pasar al hijo (URL o info dict)"""
+    tipo = medio['tipo']
+    # Salvo los generados con FFmpeg, los medios son bytes aleatorios: no pasarían la
+    # verificación del contenedor, que repetiría la descarga y la daría por fallida
+    if tipo == 'progresivo':
+        return {'url': servidor.agregar_archivo('/video.mp4', tamano=medio['tamano']),
+                'descargador': {'verificacion': False}}
+    # FFmpeg tampoco puede fusionar ni corregir los segmentos HLS/DASH, así que
+    # se bajan video y audio por separado y sin correcciones
+    if tipo == 'hls':
+        return {'url': servidor.agregar_hls('/hls/lista.m3u8', medio['segmentos'], medio['tamano_segmento']),
+                'opciones': {'fixup': 'never'}, 'descargador': {'verificacion': False}}
+    if tipo == 'dash':
+        url = servidor.agregar_dash('/dash/manifiesto.mpd', medio['segmentos'],
+                                    medio['tamano_video'], medio['tamano_audio'])
+        return {'url': url, 'formatos': ['v', 'a'], 'opciones': {'fixup': 'never'},
+                'descargador': {'verificacion': False}}
+    if tipo == 'fusion':
+        fragmentado = medio.get('fragmentado', False)
+        video, audio = generar_medios(carpeta_medios, medio['segundos'], fragmentado)
+        # Los fragmentados se anuncian como DASH, que es lo que la fusión en flujo sabe leer en orden
+        contenedor = {'container': 'mp4_dash'} if fragmentado else {}
+        info = {
+            'id': 'fusion', 'title': 'fusion', 'extractor': 'generic', 'extractor_key': 'Generic',
+            'webpage_url': servidor.url_base + '/fusion', 'duration': medio['segundos'],
+            'formats': [
+                {'format_id': 'v', 'url': servidor.agregar_archivo('/fusion/v.mp4', video.read_bytes()),
+                 'ext': 'mp4', 'vcodec': 'avc1.64001f', 'acodec': 'none', 'protocol': 'http',
+                 'height': 720, 'filesize': video.stat().st_size, **contenedor},
+                {'format_id': 'a', 'url': servidor.agregar_archivo('/fusion/a.m4a', audio.read_bytes()),
+                 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'protocol': 'http',
+                 'abr': 128, 'filesize': audio.stat().st_size, **contenedor},
+            ],
+        }
+        return {'info': info}
+    if tipo == 'mp4_real':
+        video, audio = generar_medios(carpeta_medios, medio['segundos'])
+        completo = Path(carpeta_medios) / 'av.mp4'
+        _ffmpeg(completo, '-i', str(video), '-i', str(audio), '-c', 'copy')
+        info = {
+            'id': 'verificacion', 'title': 'verificacion', 'extractor': 'generic', 'extractor_key': 'Generic',
+            'webpage_url': servidor.url_base + '/verificacion', 'duration': medio['segundos'],
+            'formats': [
+                {'format_id': 'av',
+                 'url': servidor.agregar_archivo('/verificacion/av.mp4', completo.read_bytes()),
+                 'ext': 'mp4', 'vcodec': 'avc1.64001f', 'acodec': 'mp4a.40.2', 'protocol': 'http',
+                 'height': 720, 'filesize': completo.stat().st_size},
+            ],
+        }
+        return {'info': info}
+    raise ValueError(tipo)
+
+
+def generar_medios(carpeta, segundos, fragmentado=False):
+    """Video H.264 y audio AAC de prueba (se generan una vez por ejecución)"""
+    sufijo = '-frag' if fragmentado else ''
+    # MP4 fragmentado: el índice va delante y cada fragmento se puede leer en orden
+    fragmentos = ['-movflags', 'frag_keyframe+empty_moov+default_base_moof'] if fragmentado else []
+    video, audio = Path(carpeta) / f'v{sufijo}.mp4', Path(carpeta) / f'a{sufijo}.m4a'
+    _ffmpeg(video, '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={segundos}',
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '3M', *fragmentos)
+    _ffmpeg(audio, '-f', 'lavfi', '-i', f'sine=frequency=440:duration={segundos}',
+            '-c:a', 'aac', '-b:a', '128k', *fragmentos)
+    return video, audio
+
+
+def _ffmpeg(destino, *argumentos):
+    """Genera destino con FFmpeg si no existe ya"""
+    if not destino.exists():
+        subprocess.run(['ffmpeg', '-v', 'error', '-y', *argumentos, str(destino)], check=True)
+
+
+def hijo(config):
+    """Ejecuta una descarga y escribe sus métricas como JSON en la última línea de stdout"""
+    from progress_bus import ProgressBus
+    from video_downloader import VideoDownloader
+
+    carpeta = tempfile.mkdtemp(prefix='bench-')
+    downloader = VideoDownloader(carpeta, **config.get('descargador', {}))
+    downloader.silencioso = True
+    # Las fases de fusión y verificación las mide el descargador (fuera de carpeta,
+    # que se usa para contar los bytes descargados)
+    registro = Path(tempfile.mkdtemp(prefix='bench-metricas-')) / 'metricas.jsonl'
+    downloader.metricas.configurar_archivo(registro)
+    marcas = {}
+    cpu_inicial = _cpu()
+    inicio = time.perf_counter()
+
+    extraer_info = downloader.extraer_info
+
+    def extraer_medido(*args, **kwargs):
+        antes = time.perf_counter()
+        try:
+            return extraer_info(*args, **kwargs)
+        finally:
+            marcas['extraccion'] = marcas.get('extraccion', 0) + time.perf_counter() - antes
+
+    downloader.extraer_info = extraer_medido
+
+    def hook_marcas(d):
+        ahora = time.perf_counter() - inicio
+        if d['status'] == 'downloading' and d.get('downloaded_bytes') and 'primer_byte' not in marcas:
+            marcas['primer_byte'] = ahora
+
+    objetivo = config.get('info') or config['url']
+    formatos = config.get('formatos') or [None]
+    opciones = {'quiet': True, 'noprogress': True, **config.get('opciones', {})}
+    error = None
+    try:
+        for formato in formatos:
+            extra = {**opciones, 'format': formato} if formato else opciones
+            if config.get('motor') == 'cli':
+                # descargar_video usa el hook de la CLI; se envuelve para tomar marcas
+                hook_cli = downloader._progress_hook
+                downloader._progress_hook = lambda d: (hook_marcas(d), hook_cli(d))
+                with open(os.devnull, 'w') as nulo:
+                    salida, sys.stdout = sys.stdout, nulo
+                    try:
+                        if not downloader.descargar_video(objetivo, 'best'):
+                            error = 'descargar_video devolvió False'
+                    finally:
+                        sys.stdout = salida
+            else:
+                # Igual que las GUIs: progreso al bus y un "hilo de Tk" que lo vacía a 30 fps
+                bus = ProgressBus()
+                parar = threading.Event()
+
+                def sondeo():
+                    while not parar.wait(1 / 30):
+                        bus.drenar()
+
+                threading.Thread(target=sondeo, daemon=True).start()
+                hook_gui = lambda d: bus.publicar_progreso('descarga', lambda *a: None, d.get('downloaded_bytes'))
+                try:
+                    downloader.ejecutar_descarga(objetivo, 'best', [hook_gui, hook_marcas], extra,
+                                                 al_extraer=lambda info: None)
+                finally:
+                    parar.set()
+    except Exception as e:
+        error = str(e)
+    total = time.perf_counter() - inicio
+
+    descargado = sum(f.stat().st_size for f in Path(carpeta).iterdir() if f.is_file())
+    cpu = _cpu() - cpu_inicial
+    fases = _fases(registro, len(formatos))
+    shutil.rmtree(carpeta, ignore_errors=True)
+    shutil.rmtree(registro.parent, ignore_errors=True)
+
+    print(json.dumps({
+        'error': error,
+        'segundos': total,
+        'bytes': descargado,
+        'mb_s': descargado / MB / total if total else 0,
+        'primer_byte': marcas.get('primer_byte'),
+        'extraccion': marcas.get('extraccion'),
+        # None si la fase no ocurrió: el tiempo tras la descarga no es una fusión
+        'fusion': fases.get('fusion'),
+        'verificacion': fases.get('verificacion'),
+        'cpu_s_gb': cpu / (descargado / 1024 ** 3) if descargado else None,
+        'rss_mb': _rss_maximo() / MB,
+    }))
+
+
+def _fases(registro, trabajos, espera=5.0):
+    """
+    Segundos de cada fase sumados en todos los trabajos del registro
+
+    Cada trabajo se escribe al terminar su Future, un instante después de
+    que ejecutar_descarga vuelva: se espera a que estén todos.
+    """
+    limite = time.monotonic() + espera
+    lineas = []
+    while time.monotonic() < limite:
+        try:
+            lineas = registro.read_text(encoding='utf-8').splitlines()
+        except OSError:
+            lineas = []
+        if len(lineas) >= trabajos:
+            break
+        time.sleep(0.05)
+    fases = {}
+    for linea in lineas:
+        for fase, segundos in json.loads(linea)['fases'].items():
+            fases[fase] = fases.get(fase, 0) + segundos
+    return fases
+
+
+def _cpu():
+    """Segundos de CPU del proceso y de sus hijos (FFmpeg)"""
+    propio = resource.getrusage(resource.RUSAGE_SELF)
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return propio.ru_utime + propio.ru_stime + hijos.ru_utime + hijos.ru_stime
+
+
+def _rss_maximo():
+    """Memoria máxima en bytes; ru_maxrss se hereda del padre a través de fork+exec, VmHWM no"""
+    try:
+        with open('/proc/self/status') as f:
+            for linea in f:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1]) * 1024
+    except OSError:
+        pass
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS da bytes, Linux kilobytes
+    return maximo if sys.platform == 'darwin' else maximo * 1024
+
+
+def ejecutar_escenario(nombre, escenario, repeticiones, carpeta_medios):
+    if escenario['medio']['tipo'] in MEDIOS_FFMPEG and not shutil.which('ffmpeg'):
+        return None, 'omitido: FFmpeg no está instalado'
+
+    with LocalMediaServer(**escenario.get('servidor', {})) as servidor:
+        config = publicar(servidor, escenario['medio'], carpeta_medios)
+        config.update(descargador={**config.get('descargador', {}), **escenario.get('descargador', {})},
+                      motor=escenario.get('motor', 'gui'))
+        muestras = []
+        for _ in range(repeticiones):
+            proceso = subprocess.run([sys.executable, __file__, '--hijo', json.dumps(config)],
+                                     cwd=RAIZ, capture_output=True, text=True, timeout=600)
+            try:
+                muestra = json.loads(proceso.stdout.strip().splitlines()[-1])
+            except (IndexError, ValueError):
+                return None, f"el proceso hijo falló: {proceso.stderr.strip()[-300:]}"
+            if muestra['error']:
+                return None, muestra['error']
+            muestras.append(muestra)
+
+    resultado = {}
+    for metrica in METRICAS:
+        valores = [m[metrica] for m in muestras if m[metrica] is not None]
+        resultado[metrica] = round(statistics.median(valores), 4) if valores else None
+    return resultado, None
+
+
+def comparar(nombre, resultado, base, tolerancia):
+    """Lista de regresiones del escenario respecto a su referencia"""
+    regresiones = []
+    for metrica, mas_es_mejor in METRICAS.items():
+        actual, referencia = resultado.get(metrica), (base or {}).get(metrica)
+        if actual is None or not referencia:
+            continue
+        diferencia = referencia - actual if mas_es_mejor else actual - referencia
+        if diferencia > referencia * tolerancia and diferencia > HOLGURA.get(metrica, 0):
+            regresiones.append(f"{nombre}.{metrica}: {referencia:g} → {actual:g}")
+    return regresiones
+
+
+def formato(valor, unidad=''):
+    return f"{valor:.2f}{unidad}" if valor is not None else '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--escenarios', help='lista separada por comas (por defecto todos)')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help='empeoramiento relativo admitido antes de marcar regresión')
+    parser.add_argument('--base', type=Path, default=BASES, help='archivo de referencias')
+    parser.add_argument('--guardar-base', action='store_true', help='guarda los resultados como referencia')
+    parser.add_argument('--hijo', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.hijo:
+        hijo(json.loads(args.hijo))
+        return
+
+    nombres = args.escenarios.split(',') if args.escenarios else list(ESCENARIOS)
+    bases = json.loads(args.base.read_text(encoding='utf-8')) if args.base.exists() else {}
+    resultados, regresiones = {}, []
+
+    print(f"{'escenario':<34}{'MB/s':>9}{'1er byte':>10}{'extrac.':>9}{'fusión':>9}{'verif.':>9}"
+          f"{'CPU s/GB':>10}{'RSS MB':>9}")
+    with tempfile.TemporaryDirectory(prefix='bench-medios-') as carpeta_medios:
+        for nombre in nombres:
+            resultado, problema = ejecutar_escenario(nombre, ESCENARIOS[nombre], args.repeticiones,
+                                                     carpeta_medios)
+            if resultado is None:
+                print(f"{nombre:<34}{problema}")
+                continue
+            resultados[nombre] = resultado
+            print(f"{nombre:<34}{formato(resultado['mb_s']):>9}{formato(resultado['primer_byte'], 's'):>10}"
+                  f"{formato(resultado['extraccion'], 's'):>9}{formato(resultado['fusion'], 's'):>9}"
+                  f"{formato(resultado['verificacion'], 's'):>9}"
+                  f"{formato(resultado['cpu_s_gb']):>10}{formato(resultado['rss_mb']):>9}")
+            regresiones += comparar(nombre, resultado, bases.get(nombre), args.tolerancia)
+
+    if args.guardar_base:
+        bases.update(resultados)
+        args.base.write_text(json.dumps(bases, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+        print(f"\n💾 Referencias guardadas en {args.base}")
+    elif regresiones:
+        print("\n❌ Regresiones respecto a la referencia:")
+        for regresion in regresiones:
+            print(f"  {regresion}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
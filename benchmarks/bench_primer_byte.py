@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tiempo desde el clic hasta el primer byte descargado
+
+Compara el flujo anterior de las GUIs (extract_info + ydl.download, que
+extrae dos veces) con el motor compartido VideoDownloader.ejecutar_descarga
+(una sola extracción). Usa un servidor HTTP local con latencia simulada.
+
+Uso: python benchmarks/bench_primer_byte.py [--latencia 0.15] [--repeticiones 5]
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import yt_dlp
+
+from servidor_local import LocalMediaServer
+from video_downloader import VideoDownloader
+
+
+class PrimerByte(Exception):
+    """Se lanza desde el hook para cortar la descarga en el primer byte"""
+
+
+def hook_primer_byte(d):
+    if d['status'] == 'downloading' and d.get('downloaded_bytes'):
+        raise PrimerByte()
+
+
+def flujo_anterior(url, carpeta):
+    """Réplica del download_video original de las GUIs"""
+    ydl_opts = {
+        'format': 'best',
+        'outtmpl': str(Path(carpeta) / '%(title)s.%(ext)s'),
+        'progress_hooks': [hook_primer_byte],
+        'quiet': True,
+        'noprogress': True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        info.get('title', 'video')
+        ydl.download([url])
+
+
+def flujo_actual(url, carpeta):
+    """Motor compartido: una extracción, sin caché previa"""
+    downloader = VideoDownloader(carpeta)
+    downloader.ejecutar_descarga(url, 'best', [hook_primer_byte], {'quiet': True, 'noprogress': True},
+                                 al_extraer=lambda info: info.get('title', 'video'))
+
+
+def medir(flujo, url, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        with tempfile.TemporaryDirectory() as carpeta:
+            inicio = time.perf_counter()
+            try:
+                flujo(url, carpeta)
+            except (PrimerByte, yt_dlp.utils.DownloadError):
+                pass
+            tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--latencia', type=float, default=0.15, help='segundos por petición HTTP')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    with LocalMediaServer(latencia=args.latencia) as servidor:
+        url = servidor.agregar_archivo('/video.mp4', tamano=8 * 1024 * 1024)
+
+        print(f"Latencia simulada: {args.latencia * 1000:.0f} ms por petición\n")
+        for nombre, flujo in (('antes (2 extracciones)', flujo_anterior),
+                              ('después (1 extracción)', flujo_actual)):
+            peticiones = servidor.peticiones
+            tiempos = medir(flujo, url, args.repeticiones)
+            peticiones = (servidor.peticiones - peticiones) / args.repeticiones
+            print(f"{nombre:<24} mediana {statistics.median(tiempos) * 1000:7.1f} ms | "
+                  f"mín {min(tiempos) * 1000:7.1f} ms | {peticiones:.1f} peticiones/descarga")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Servidor HTTP local que imita un CDN de video para los benchmarks
+
+Sirve archivos sintéticos desde memoria con soporte de Range, una
+latencia configurable por petición, un ancho de banda limitado por
+conexión y errores inyectados (503 o conexiones cortadas a mitad), para
+medir sin depender de la red. También publica listas HLS y manifiestos
+DASH con video y audio separados.
+
+Para las pruebas se pueden programar incidencias por ruta, en el orden
+de las peticiones (503, cortes y respuestas lentas), y hacer que ignore
+Range como los servidores que siempre mandan el archivo entero.
+"""
+
+import mimetypes
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('application/dash+xml', '.mpd')
+mimetypes.add_type('video/mp2t', '.ts')
+mimetypes.add_type('video/iso.segment', '.m4s')
+
+BLOQUE = 64 * 1024
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Los clientes cortan conexiones a propósito (cancelaciones, reintentos)
+        pass
+
+
+class LocalMediaServer:
+    def __init__(self, latencia=0.0, puerto=0, ancho_banda=None, errores=0.0, semilla=0, rangos=True,
+                 ancho_banda_lento=64 * 1024):
+        self.latencia = latencia
+        # Bytes por segundo de cada respuesta (None = sin límite)
+        self.ancho_banda = ancho_banda
+        # False = ignora Range y responde 200 con el archivo entero
+        self.rangos = rangos
+        # Bytes por segundo de las respuestas con la incidencia 'lenta'
+        self.ancho_banda_lento = ancho_banda_lento
+        # Incidencias programadas por ruta, ver incidencias()
+        self._incidencias = {}
+        # Rutas pedidas (GET), en orden de llegada
+        self.rutas = []
+        # Probabilidad de que una petición falle; con semilla fija para repetir la medición
+        self.errores = errores
+        self.errores_inyectados = 0
+        self._azar = random.Random(semilla)
+        self.archivos = {}
+        self.peticiones = 0
+        self._lock = threading.Lock()
+        self._server = _Servidor(('127.0.0.1', puerto), self._crear_handler())
+        self._hilo = None
+
+    @property
+    def url_base(self):
+        host, puerto = self._server.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def agregar_archivo(self, ruta, datos=None, tamano=0):
+        """Publica un archivo; si no se dan datos se generan bytes aleatorios"""
+        self.archivos[ruta] = datos if datos is not None else os.urandom(tamano)
+        return self.url_base + ruta
+
+    def incidencias(self, ruta, *incidencias):
+        """
+        Programa lo que les pasa a las siguientes peticiones GET de ruta, en orden
+
+        Cada una es '503', 'corte' (media respuesta y conexión cerrada),
+        'lenta' (a ancho_banda_lento) o None (normal). Se suman a las ya
+        programadas; al acabarse vuelven las normales (y los errores al azar).
+        """
+        with self._lock:
+            self._incidencias.setdefault(ruta, deque()).extend(incidencias)
+
+    def agregar_hls(self, ruta, segmentos, tamano_segmento, duracion=4):
+        """Publica una lista HLS de segmentos .ts; devuelve la URL de la lista"""
+        base = ruta.rsplit('/', 1)[0]
+        lineas = ['#EXTM3U', '#EXT-X-VERSION:3', f'#EXT-X-TARGETDURATION:{duracion}',
+                  '#EXT-X-MEDIA-SEQUENCE:0']
+        for i in range(segmentos):
+            self.agregar_archivo(f'{base}/seg{i}.ts', tamano=tamano_segmento)
+            lineas += [f'#EXTINF:{duracion:.1f},', f'seg{i}.ts']
+        lineas.append('#EXT-X-ENDLIST')
+        return self.agregar_archivo(ruta, ('\n'.join(lineas) + '\n').encode())
+
+    def agregar_dash(self, ruta, segmentos, tamano_video, tamano_audio, duracion=4):
+        """Publica un manifiesto DASH con video y audio separados; devuelve su URL"""
+        base = ruta.rsplit('/', 1)[0]
+        representaciones = (
+            ('video', 'v', 'video/mp4', 'avc1.4d401f', tamano_video, 'width="1280" height="720"'),
+            ('audio', 'a', 'audio/mp4', 'mp4a.40.2', tamano_audio, 'audioSamplingRate="44100"'),
+        )
+        conjuntos = []
+        for tipo, prefijo, mime, codec, tamano, atributos in representaciones:
+            self.agregar_archivo(f'{base}/{prefijo}-init.mp4', tamano=1024)
+            for i in range(1, segmentos + 1):
+                self.agregar_archivo(f'{base}/{prefijo}-{i}.m4s', tamano=tamano)
+            bandwidth = tamano * 8 // duracion
+            conjuntos.append(f'''
+    <AdaptationSet contentType="{tipo}" mimeType="{mime}">
+      <Representation id="{prefijo}" codecs="{codec}" bandwidth="{bandwidth}" {atributos}>
+        <SegmentTemplate initialization="{prefijo}-init.mp4" media="{prefijo}-$Number$.m4s"
+                         startNumber="1" duration="{duracion}" timescale="1"/>
+      </Representation>
+    </AdaptationSet>''')
+        mpd = f'''<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" profiles="urn:mpeg:dash:profile:isoff-live:2011"
+     mediaPresentationDuration="PT{segmentos * duracion}S" minBufferTime="PT2S">
+  <Period>{''.join(conjuntos)}
+  </Period>
+</MPD>
+'''
+        return self.agregar_archivo(ruta, mpd.encode())
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.detener()
+
+    def _crear_handler(self):
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self._responder(con_cuerpo=False)
+
+            def do_GET(self):
+                self._responder(con_cuerpo=True)
+
+            def _responder(self, con_cuerpo):
+                with servidor._lock:
+                    servidor.peticiones += 1
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+
+                ruta = self.path.split('?')[0]
+                datos = servidor.archivos.get(ruta)
+                if datos is None:
+                    self.send_error(404)
+                    return
+
+                fallo = None
+                if con_cuerpo:
+                    with servidor._lock:
+                        servidor.rutas.append(ruta)
+                        programadas = servidor._incidencias.get(ruta)
+                        if programadas:
+                            fallo = programadas.popleft()
+                        elif servidor.errores and servidor._azar.random() < servidor.errores:
+                            servidor.errores_inyectados += 1
+                            fallo = servidor._azar.choice(('503', 'corte'))
+                if fallo == '503':
+                    self.send_error(503)
+                    return
+
+                inicio, fin = 0, len(datos) - 1
+                rango = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+                if rango and servidor.rangos:
+                    inicio = int(rango.group(1) or 0)
+                    fin = min(int(rango.group(2) or fin), fin)
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {inicio}-{fin}/{len(datos)}')
+                else:
+                    self.send_response(200)
+
+                tipo = mimetypes.guess_type(self.path.split('?')[0])[0] or 'application/octet-stream'
+                self.send_header('Content-Type', tipo)
+                if servidor.rangos:
+                    self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Length', str(fin - inicio + 1))
+                self.end_headers()
+                if con_cuerpo:
+                    try:
+                        self._enviar(datos[inicio:fin + 1], cortar=fallo == 'corte',
+                                     ancho_banda=servidor.ancho_banda_lento if fallo == 'lenta'
+                                     else servidor.ancho_banda)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+
+            def _enviar(self, cuerpo, cortar, ancho_banda):
+                if cortar:
+                    # Media respuesta y conexión cerrada, como un CDN que se cae
+                    self.wfile.write(cuerpo[:len(cuerpo) // 2])
+                    self.close_connection = True
+                    return
+                if not ancho_banda:
+                    self.wfile.write(cuerpo)
+                    return
+                inicio = time.monotonic()
+                for enviado in range(0, len(cuerpo), BLOQUE):
+                    self.wfile.write(cuerpo[enviado:enviado + BLOQUE])
+                    adelanto = (enviado + BLOQUE) / ancho_banda - (time.monotonic() - inicio)
+                    if adelanto > 0:
+                        time.sleep(adelanto)
+
+        return Handler
@@ -0,0 +1,181 @@
+"""
+Concurrencia adaptativa por host
+
+Un número fijo de descargas o conexiones simultáneas falla en las dos
+direcciones: pocas dejan ancho de banda sin usar y demasiadas provocan
+respuestas 429/403 de las plataformas. AdaptiveConcurrency ajusta el
+límite de cada host como el control de congestión de TCP (AIMD):
+
+- Cada INTERVALO segundos compara la velocidad agregada del host con la
+  de la ventana anterior. Si mejora y todos los huecos estaban en uso,
+  sube el límite en uno. Si el hueco añadido no mejoró nada, lo deshace.
+- Una respuesta de estrangulamiento (429, 403, 503) o una tasa de errores
+  alta multiplica el límite por FACTOR_RECORTE, como mucho una vez por
+  intervalo (varias conexiones suelen recibir el 429 a la vez).
+
+Hay dos instancias para todo el proceso: trabajos_por_host (descargas de
+un lote contra la misma plataforma) y conexiones_por_host (conexiones de
+las descargas paralelas contra el mismo servidor de medios).
+
+espera_reintento da la pausa antes de cada reintento: exponencial con
+jitter, para que las conexiones que fallaron juntas no vuelvan juntas.
+"""
+
+import random
+import re
+import threading
+import time
+
+# Segundos de cada ventana de medición
+INTERVALO = 2.0
+# Mejora mínima de velocidad para considerar que un hueco más sirvió
+MEJORA = 0.05
+# Multiplicador del límite al detectar estrangulamiento
+FACTOR_RECORTE = 0.5
+# Proporción de peticiones fallidas en una ventana que cuenta como congestión
+TASA_ERRORES_MAX = 0.2
+# Códigos HTTP con los que las plataformas piden bajar el ritmo
+CODIGOS_ESTRANGULAMIENTO = (429, 403, 503)
+
+
+class AdaptiveConcurrency:
+    def __init__(self, inicial=2, minimo=1, maximo=16, intervalo=INTERVALO):
+        self.inicial = inicial
+        self.minimo = minimo
+        self.maximo = maximo
+        self.intervalo = intervalo
+        self._cond = threading.Condition()
+        self._hosts = {}
+
+    def limite(self, host, inicial=None):
+        """Límite actual del host (inicial si todavía no se ha visto)"""
+        with self._cond:
+            return int(self._host(host, inicial).limite)
+
+    def ocupar(self, host, inicial=None):
+        """Cuenta un hueco en uso sin esperar (quien llama ya comprobó el límite)"""
+        with self._cond:
+            self._host(host, inicial).activas += 1
+
+    def entrar(self, host, inicial=None):
+        """Espera a que haya un hueco libre en el host y lo ocupa"""
+        with self._cond:
+            estado = self._host(host, inicial)
+            self._cond.wait_for(lambda: estado.activas < int(estado.limite))
+            estado.activas += 1
+
+    def salir(self, host):
+        with self._cond:
+            self._hosts[host].activas -= 1
+            self._cond.notify_all()
+
+    def transferidos(self, host, n):
+        """Suma n bytes recibidos del host; al cerrar cada ventana se ajusta el límite"""
+        with self._cond:
+            estado = self._host(host)
+            estado.bytes += n
+            ahora = time.monotonic()
+            if ahora - estado.inicio_ventana >= self.intervalo:
+                self._ajustar(estado, ahora)
+
+    def exito(self, host):
+        """Cuenta una petición terminada bien (para la tasa de errores)"""
+        with self._cond:
+            self._host(host).exitos += 1
+
+    def error(self, host, error):
+        """Cuenta una petición fallida; si es un estrangulamiento recorta el límite ya"""
+        with self._cond:
+            estado = self._host(host)
+            estado.errores += 1
+            if es_estrangulamiento(error):
+                self._recortar(estado, time.monotonic())
+
+    def estado(self, host=None):
+        """Huecos en uso, límite y velocidad de un host (None si no se conoce) o de todos"""
+        with self._cond:
+            if host is not None:
+                estado = self._hosts.get(host)
+                return estado.resumen() if estado else None
+            return {h: e.resumen() for h, e in self._hosts.items()}
+
+    def _host(self, host, inicial=None):
+        """Estado del host, creándolo si hace falta (con el lock tomado)"""
+        estado = self._hosts.get(host)
+        if estado is None:
+            limite = min(self.maximo, max(self.minimo, inicial or self.inicial))
+            estado = self._hosts[host] = _Host(limite)
+        return estado
+
+    def _ajustar(self, estado, ahora):
+        """Cierra la ventana de medición del host y aplica el aumento aditivo"""
+        velocidad = estado.bytes / (ahora - estado.inicio_ventana)
+        peticiones = estado.exitos + estado.errores
+        if peticiones and estado.errores / peticiones > TASA_ERRORES_MAX:
+            self._recortar(estado, ahora)
+        elif estado.aumentado and velocidad < estado.velocidad * (1 + MEJORA):
+            # El último hueco añadido no aportó nada: volver atrás
+            estado.limite = max(self.minimo, estado.limite - 1)
+            estado.aumentado = False
+        elif velocidad > estado.velocidad * (1 + MEJORA) and estado.activas >= int(estado.limite):
+            # Más rápido y sin huecos libres: probar con uno más
+            estado.aumentado = estado.limite < self.maximo
+            estado.limite = min(self.maximo, estado.limite + 1)
+        else:
+            estado.aumentado = False
+        estado.velocidad = velocidad
+        estado.bytes = estado.exitos = estado.errores = 0
+        estado.inicio_ventana = ahora
+        self._cond.notify_all()
+
+    def _recortar(self, estado, ahora):
+        """Disminución multiplicativa, como mucho una vez por intervalo"""
+        if ahora - estado.ultimo_recorte < self.intervalo:
+            return
+        estado.limite = max(self.minimo, int(estado.limite * FACTOR_RECORTE))
+        estado.ultimo_recorte = ahora
+        estado.aumentado = False
+        # La velocidad de referencia pasa a ser la que se mida con el nuevo límite
+        estado.velocidad = 0.0
+        estado.bytes = estado.exitos = estado.errores = 0
+        estado.inicio_ventana = ahora
+
+
+class _Host:
+    def __init__(self, limite):
+        self.limite = limite
+        self.activas = 0
+        self.velocidad = 0.0
+        self.bytes = self.exitos = self.errores = 0
+        self.aumentado = False
+        self.inicio_ventana = time.monotonic()
+        self.ultimo_recorte = float('-inf')
+
+    def resumen(self):
+        return {'activas': self.activas, 'limite': int(self.limite), 'velocidad': round(self.velocidad)}
+
+
+def es_estrangulamiento(error):
+    """True si el error (excepción o mensaje) es una respuesta HTTP de estrangulamiento"""
+    codigo = getattr(error, 'status', None) or getattr(error, 'code', None)
+    if codigo is None:
+        # Mensajes propios ("HTTP 429 en ...") y de yt-dlp ("HTTP Error 429: ...")
+        encontrado = re.search(r'HTTP (?:Error )?(\d{3})', str(error))
+        codigo = int(encontrado.group(1)) if encontrado else None
+    return codigo in CODIGOS_ESTRANGULAMIENTO
+
+
+def espera_reintento(intento, base=1.0, tope=30.0):
+    """
+    Segundos de espera antes del reintento número intento (desde 0)
+
+    Exponencial con tope y "equal jitter": la mitad fija y la otra mitad
+    al azar, así nunca es casi cero pero los reintentos no coinciden.
+    """
+    espera = min(tope, base * 2 ** intento)
+    return espera / 2 + random.uniform(0, espera / 2)
+
+
+# Instancias únicas para todo el proceso
+trabajos_por_host = AdaptiveConcurrency(inicial=2, maximo=8)
+conexiones_por_host = AdaptiveConcurrency(inicial=4, maximo=16)
@@ -0,0 +1,123 @@
+"""
+Almacén direccionado por contenido para la carpeta de descargas
+
+Cada archivo descargado se guarda una vez bajo una clave derivada de
+extractor + id del video + formato elegido. Si se vuelve a pedir lo mismo
+(aunque sea con otro título), se crea un enlace duro (o reflink) con el
+nombre pedido en lugar de descargarlo otra vez.
+
+La ruta de cada objeto se calcula a partir de su clave en dos niveles de
+subcarpetas, así que buscar es O(1) aunque haya cientos de miles.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl de Linux para clonar un archivo (btrfs, xfs...) sin copiar datos
+FICLONE = 0x40049409
+
+
+class ContentStore:
+    def __init__(self, raiz):
+        self.raiz = Path(raiz)
+        self.raiz.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def clave(info):
+        """Clave del contenido: extractor + id + formato seleccionado"""
+        if not info.get('id') or not info.get('format_id'):
+            return None
+        extractor = info.get('extractor_key', 'Generic')
+        # El id del extractor genérico sale del nombre del archivo: no es único
+        video_id = info.get('webpage_url') or info['id'] if extractor == 'Generic' else info['id']
+        texto = f"{extractor}:{video_id}:{info['format_id']}"
+        return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+    def ruta(self, clave):
+        return self.raiz / clave[:2] / clave[2:4] / clave
+
+    def buscar(self, clave):
+        """Devuelve la ruta del objeto guardado, o None"""
+        if clave is None:
+            return None
+        objeto = self.ruta(clave)
+        return objeto if objeto.is_file() else None
+
+    def enlazar(self, clave, destino):
+        """
+        Materializa el objeto en destino; devuelve False si no está guardado
+
+        También devuelve False si destino ya existe con otro contenido, para
+        que el llamador elija otro nombre en vez de pisarlo.
+        """
+        objeto = self.buscar(clave)
+        if objeto is None:
+            return False
+
+        destino = Path(destino)
+        if destino.exists():
+            return os.path.samefile(objeto, destino)
+
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(objeto, destino)
+        except OSError:
+            if not _reflink(objeto, destino):
+                shutil.copy2(objeto, destino)
+        return True
+
+    def guardar(self, clave, archivo, info=None):
+        """
+        Añade un archivo recién descargado al almacén (enlazándolo, sin copiar)
+
+        Devuelve False si no se pudo enlazar (sistema de archivos sin
+        enlaces duros): guardarlo costaría el doble de disco, así que ese
+        archivo no se deduplica.
+        """
+        if clave is None or self.buscar(clave):
+            return True
+        objeto = self.ruta(clave)
+        objeto.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(archivo, objeto)
+        except OSError:
+            return False
+
+        info = info or {}
+        metadatos = {
+            'extractor': info.get('extractor_key'),
+            'id': info.get('id'),
+            'format_id': info.get('format_id'),
+            'title': info.get('title'),
+            'ext': info.get('ext'),
+            'tamano': os.path.getsize(objeto),
+            'guardado': time.time(),
+        }
+        with open(objeto.with_name(clave + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(metadatos, f, ensure_ascii=False)
+        return True
+
+
+def _reflink(origen, destino):
+    """Intenta clonar el archivo con FICLONE; devuelve False si el sistema no lo permite"""
+    if fcntl is None:
+        return False
+    try:
+        with open(origen, 'rb') as src, open(destino, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(destino)
+        except OSError:
+            pass
+        return False
@@ -0,0 +1,96 @@
+"""
+Registro de descargas en SQLite
+
+Sustituye al archivo de texto de --download-archive de yt-dlp, que se carga
+entero en memoria. Aquí cada consulta es una búsqueda por clave primaria,
+las altas se escriben por lotes en una transacción y la base de datos en
+modo WAL se puede compartir entre hilos y procesos.
+
+yt-dlp acepta cualquier objeto con `in` y `add()` como download_archive,
+así que se pasa directamente en las opciones de YoutubeDL.
+"""
+
+import atexit
+import sqlite3
+import threading
+import time
+
+
+class DownloadArchive:
+    def __init__(self, path, lote=100, intervalo=2.0):
+        self.path = str(path)
+        self.lote = lote
+        self.intervalo = intervalo
+        self._pendientes = {}
+        self._ultima_escritura = time.monotonic()
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS descargas (
+                extractor TEXT NOT NULL,
+                video_id TEXT NOT NULL,
+                fecha REAL NOT NULL,
+                PRIMARY KEY (extractor, video_id)
+            ) WITHOUT ROWID
+        ''')
+        self._db.commit()
+        atexit.register(self.cerrar)
+
+    def __contains__(self, archive_id):
+        """archive_id tiene el formato de yt-dlp: 'extractor id'"""
+        clave = _separar(archive_id)
+        with self._lock:
+            if clave in self._pendientes:
+                return True
+            fila = self._db.execute(
+                'SELECT 1 FROM descargas WHERE extractor = ? AND video_id = ?', clave).fetchone()
+        return fila is not None
+
+    def __bool__(self):
+        # yt-dlp no consulta el archivo si se evalúa como falso
+        return True
+
+    def add(self, archive_id):
+        """Registra una descarga; se escribe en disco por lotes"""
+        with self._lock:
+            self._pendientes[_separar(archive_id)] = time.time()
+            if (len(self._pendientes) >= self.lote
+                    or time.monotonic() - self._ultima_escritura >= self.intervalo):
+                self._escribir()
+
+    def vaciar(self):
+        """Escribe en disco las altas pendientes"""
+        with self._lock:
+            self._escribir()
+
+    def importar_texto(self, path):
+        """Importa un archivo de texto de --download-archive de yt-dlp"""
+        with open(path, encoding='utf-8') as f:
+            filas = [(*_separar(linea), time.time()) for linea in f if linea.strip()]
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR IGNORE INTO descargas VALUES (?, ?, ?)', filas)
+        return len(filas)
+
+    def cerrar(self):
+        with self._lock:
+            if self._db is None:
+                return
+            self._escribir()
+            self._db.close()
+            self._db = None
+
+    def _escribir(self):
+        if self._pendientes:
+            filas = [(*clave, fecha) for clave, fecha in self._pendientes.items()]
+            with self._db:
+                self._db.executemany('INSERT OR IGNORE INTO descargas VALUES (?, ?, ?)', filas)
+            self._pendientes.clear()
+        self._ultima_escritura = time.monotonic()
+
+
+def _separar(archive_id):
+    extractor, _, video_id = archive_id.strip().partition(' ')
+    return extractor, video_id
@@ -0,0 +1,537 @@
+"""
+Demonio de descargas con API HTTP/JSON local
+
+Un único proceso con un VideoDownloader compartido: yt-dlp y los
+extractores se cargan una vez, la caché de metadatos, el almacén y el
+planificador de ancho de banda son comunes a todos los trabajos, y la
+automatización puede enviar miles de URLs sin arrancar un intérprete por
+cada una. Solo escucha en 127.0.0.1.
+
+    python download_daemon.py --puerto 8765 --carpeta descargas
+
+Endpoints:
+    POST   /trabajos             {"url": ..., "calidad": "720", "prioridad": 1}
+                                 (o {"urls": [...]} para enviar varias)
+    GET    /trabajos             lista de trabajos
+    GET    /trabajos/<id>        estado de un trabajo
+    DELETE /trabajos/<id>        cancela un trabajo en cola o descargando
+                                 (409 si ya terminó o se está procesando)
+    GET    /planes?url=...       tamaño estimado de cada calidad
+    GET    /eventos              progreso como Server-Sent Events
+                                 (?trabajo=<id> para uno solo: empieza con su estado
+                                 actual y se cierra cuando termina; ?desde=<n> para reanudar)
+    GET    /metricas             tiempos por fase, bytes, reintentos y errores
+                                 en formato de texto de Prometheus
+
+Las interfaces gráficas funcionan como clientes ligeros si se define la
+variable de entorno VIDEO_DOWNLOADER_DAEMON=http://127.0.0.1:8765.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+from bandwidth import PRIORIDAD_INTERACTIVA, PRIORIDAD_LOTE
+from format_planner import AUDIO_OBJETIVO_KBPS, CALIDADES
+from postprocessing import CONTENEDORES_AUDIO
+
+PUERTO = 8765
+VARIABLE_ENTORNO = 'VIDEO_DOWNLOADER_DAEMON'
+TERMINADOS = ('completado', 'error', 'cancelado')
+# Como mucho un evento de progreso por trabajo cada tanto tiempo
+INTERVALO_PROGRESO = 0.25
+
+
+class DescargaCancelada(Exception):
+    pass
+
+
+class DownloadDaemon:
+    def __init__(self, downloader=None, puerto=PUERTO, max_descargas=4,
+                 max_eventos=10000, max_terminados=10000):
+        if downloader is None:
+            from video_downloader import VideoDownloader
+            downloader = VideoDownloader()
+        self.downloader = downloader
+        self.puerto = puerto
+        self.max_descargas = max_descargas
+        self._trabajos = {}
+        self._terminados = deque()
+        self._max_terminados = max_terminados
+        # Los trabajos interactivos adelantan a los lotes que esperan en la cola
+        self._cola = queue.PriorityQueue()
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._eventos = deque(maxlen=max_eventos)
+        self._secuencia = 0
+        self._servidor = None
+
+    def iniciar(self):
+        for _ in range(self.max_descargas):
+            threading.Thread(target=self._trabajador, daemon=True).start()
+        self._servidor = _Servidor(('127.0.0.1', self.puerto), self._crear_handler())
+        self.puerto = self._servidor.server_address[1]
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def enviar(self, url, calidad='best', prioridad=PRIORIDAD_LOTE):
+        """Encola una descarga y devuelve su estado inicial; ValueError si algún dato no es válido"""
+        url, calidad, prioridad = _comprobar(url, calidad, prioridad)
+        with self._cond:
+            trabajo = {
+                'id': next(self._ids),
+                'url': url,
+                'calidad': calidad,
+                'prioridad': prioridad,
+                'estado': 'en_cola',
+                'titulo': None,
+                'duracion': None,
+                'descargado': 0,
+                'total': None,
+                'velocidad': None,
+                'eta': None,
+                'error': None,
+                'creado': time.time(),
+            }
+            self._trabajos[trabajo['id']] = trabajo
+            self._publicar(trabajo)
+        self._cola.put((-trabajo['prioridad'], trabajo['id']))
+        return _vista(trabajo)
+
+    def listar(self):
+        with self._cond:
+            return [_vista(t) for t in self._trabajos.values()]
+
+    def obtener(self, id_trabajo):
+        with self._cond:
+            trabajo = self._trabajos.get(id_trabajo)
+            return _vista(trabajo) if trabajo else None
+
+    def instantanea(self, id_trabajo):
+        """(secuencia actual, estado del trabajo o None si no existe) tomados a la vez"""
+        with self._cond:
+            trabajo = self._trabajos.get(id_trabajo)
+            return self._secuencia, _vista(trabajo) if trabajo else None
+
+    def cancelar(self, id_trabajo):
+        """
+        Marca el trabajo para cancelar; devuelve False si no existe, ya terminó o se está procesando
+
+        La cancelación solo se atiende en el progress hook, que no se llama
+        durante la fusión y la verificación: un trabajo en 'procesando' ya
+        no se puede cancelar y terminará como 'completado' o 'error'.
+        """
+        with self._cond:
+            trabajo = self._trabajos.get(id_trabajo)
+            if trabajo is None or trabajo['estado'] in TERMINADOS or trabajo['estado'] == 'procesando':
+                return False
+            trabajo['cancelar'] = True
+            if trabajo['estado'] == 'en_cola':
+                # Nadie lo ha empezado: se da por cancelado ya
+                self._terminar(trabajo, 'cancelado')
+            return True
+
+    def eventos(self, desde=0, id_trabajo=None, timeout=15):
+        """
+        Devuelve (última secuencia, eventos posteriores a desde)
+
+        Si no hay ninguno (del trabajo pedido) espera hasta timeout segundos.
+        """
+        limite = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                eventos = []
+                for secuencia, evento in reversed(self._eventos):
+                    if secuencia <= desde:
+                        break
+                    if id_trabajo is None or evento['id'] == id_trabajo:
+                        eventos.append((secuencia, evento))
+                desde = max(desde, self._secuencia)
+                restante = limite - time.monotonic()
+                if eventos or restante <= 0:
+                    return desde, eventos[::-1]
+                self._cond.wait(restante)
+
+    def _publicar(self, trabajo):
+        """Registra el estado actual del trabajo como evento (con el lock tomado)"""
+        self._secuencia += 1
+        self._eventos.append((self._secuencia, _vista(trabajo)))
+        self._cond.notify_all()
+
+    def _actualizar(self, trabajo, **cambios):
+        with self._cond:
+            trabajo.update(cambios)
+            self._publicar(trabajo)
+
+    def _terminar(self, trabajo, estado, error=None):
+        """Cierra el trabajo (con el lock tomado) y olvida los más antiguos"""
+        trabajo.update(estado=estado, error=error, velocidad=None, eta=None)
+        self._publicar(trabajo)
+        self._terminados.append(trabajo['id'])
+        while len(self._terminados) > self._max_terminados:
+            self._trabajos.pop(self._terminados.popleft(), None)
+
+    def _trabajador(self):
+        while True:
+            _, id_trabajo = self._cola.get()
+            with self._cond:
+                trabajo = self._trabajos.get(id_trabajo)
+                if trabajo is None or trabajo['estado'] != 'en_cola':
+                    continue
+                trabajo['estado'] = 'descargando'
+                self._publicar(trabajo)
+            self._ejecutar(trabajo)
+
+    def _ejecutar(self, trabajo):
+        ultimo = 0.0
+
+        def hook(d):
+            nonlocal ultimo
+            if d['status'] == 'finished':
+                with self._cond:
+                    # Comprobar y pasar a 'procesando' a la vez: después cancelar ya no lo acepta
+                    if trabajo.get('cancelar'):
+                        raise DescargaCancelada('Cancelado')
+                    trabajo['estado'] = 'procesando'
+                    self._publicar(trabajo)
+                return
+            if trabajo.get('cancelar'):
+                # Lanzar desde el hook corta la descarga en curso
+                raise DescargaCancelada('Cancelado')
+            ahora = time.monotonic()
+            if d['status'] != 'downloading' or ahora - ultimo < INTERVALO_PROGRESO:
+                return
+            ultimo = ahora
+            self._actualizar(
+                trabajo,
+                estado='descargando',
+                descargado=d.get('downloaded_bytes') or 0,
+                total=d.get('total_bytes') or d.get('total_bytes_estimate'),
+                velocidad=d.get('speed'),
+                eta=d.get('eta'),
+            )
+
+        def al_extraer(info):
+            self._actualizar(trabajo, titulo=info.get('title'), duracion=info.get('duration'))
+
+        try:
+            self.downloader.ejecutar_descarga(
+                trabajo['url'], trabajo['calidad'], [hook],
+                {'quiet': True, 'noprogress': True},
+                al_extraer=al_extraer, prioridad=trabajo['prioridad'])
+            estado, error = 'completado', None
+        except Exception as e:
+            if trabajo.get('cancelar'):
+                estado, error = 'cancelado', None
+            else:
+                estado, error = 'error', str(e)
+        with self._cond:
+            self._terminar(trabajo, estado, error)
+
+    def _crear_handler(self):
+        demonio = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _responder(self, codigo, datos):
+                cuerpo = json.dumps(datos, ensure_ascii=False).encode('utf-8')
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def _responder_texto(self, codigo, texto, tipo='text/plain; version=0.0.4; charset=utf-8'):
+                cuerpo = texto.encode('utf-8')
+                self.send_response(codigo)
+                self.send_header('Content-Type', tipo)
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def _ruta(self):
+                partes = urlsplit(self.path)
+                consulta = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+                return [p for p in partes.path.split('/') if p], consulta
+
+            def _id(self, texto):
+                return int(texto) if texto.isdigit() else None
+
+            def do_GET(self):
+                ruta, consulta = self._ruta()
+                if ruta == ['trabajos']:
+                    self._responder(200, demonio.listar())
+                elif len(ruta) == 2 and ruta[0] == 'trabajos':
+                    trabajo = demonio.obtener(self._id(ruta[1]))
+                    self._responder(200 if trabajo else 404, trabajo or {'error': 'No existe'})
+                elif ruta == ['planes'] and consulta.get('url'):
+                    try:
+                        planes, titulo = demonio.downloader.estimar_calidades(consulta['url'])
+                        self._responder(200, {'titulo': titulo, 'planes': planes})
+                    except Exception as e:
+                        self._responder(502, {'error': str(e)})
+                elif ruta == ['eventos']:
+                    self._eventos(consulta)
+                elif ruta == ['metricas']:
+                    self._responder_texto(200, demonio.downloader.metricas.prometheus())
+                else:
+                    self._responder(404, {'error': 'Ruta desconocida'})
+
+            def do_POST(self):
+                ruta, _ = self._ruta()
+                if ruta != ['trabajos']:
+                    self._responder(404, {'error': 'Ruta desconocida'})
+                    return
+                try:
+                    longitud = int(self.headers.get('Content-Length') or 0)
+                    datos = json.loads(self.rfile.read(longitud) or b'{}')
+                    urls = datos['urls'] if 'urls' in datos else [datos['url']]
+                    if not isinstance(urls, list) or not urls:
+                        raise TypeError
+                except (ValueError, KeyError, TypeError):
+                    self._responder(400, {'error': 'Se esperaba {"url": ...} o {"urls": [...]}'})
+                    return
+                try:
+                    # Todo comprobado antes de encolar nada
+                    validos = [_comprobar(url, datos.get('calidad', 'best'),
+                                          datos.get('prioridad', PRIORIDAD_LOTE)) for url in urls]
+                except ValueError as e:
+                    self._responder(400, {'error': str(e)})
+                    return
+                trabajos = [demonio.enviar(*valido) for valido in validos]
+                self._responder(201, trabajos if 'urls' in datos else trabajos[0])
+
+            def do_DELETE(self):
+                ruta, _ = self._ruta()
+                if len(ruta) == 2 and ruta[0] == 'trabajos':
+                    id_trabajo = self._id(ruta[1])
+                    if demonio.cancelar(id_trabajo):
+                        self._responder(200, demonio.obtener(id_trabajo))
+                    else:
+                        self._responder(409, {'error': 'No existe, ya terminó o se está procesando'})
+                else:
+                    self._responder(404, {'error': 'Ruta desconocida'})
+
+            def _eventos(self, consulta):
+                desde = consulta.get('desde') or self.headers.get('Last-Event-ID') or '0'
+                if not desde.isdigit():
+                    self._responder(400, {'error': 'desde tiene que ser un número'})
+                    return
+                desde = int(desde)
+                id_trabajo = None
+                if 'trabajo' in consulta:
+                    id_trabajo = self._id(consulta['trabajo'])
+                    secuencia, actual = demonio.instantanea(id_trabajo)
+                    if actual is None:
+                        self._responder(404, {'error': 'No existe'})
+                        return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                # Sin longitud: la conexión se cierra al acabar el stream
+                self.close_connection = True
+                try:
+                    if id_trabajo is not None:
+                        # Cada evento es el estado completo: se empieza por el actual, por si
+                        # los anteriores ya salieron de la cola de eventos
+                        self._evento(secuencia, actual)
+                        if actual['estado'] in TERMINADOS:
+                            return
+                        desde = secuencia
+                    while True:
+                        desde, eventos = demonio.eventos(desde, id_trabajo)
+                        if not eventos and id_trabajo is not None:
+                            # Si su evento final se perdió, terminar con el estado actual
+                            secuencia, actual = demonio.instantanea(id_trabajo)
+                            if actual is None or actual['estado'] in TERMINADOS:
+                                if actual is not None:
+                                    self._evento(secuencia, actual)
+                                return
+                        if not eventos:
+                            self.wfile.write(b': sigo aqui\n\n')
+                            self.wfile.flush()
+                        for secuencia, evento in eventos:
+                            self._evento(secuencia, evento)
+                        if id_trabajo is not None and any(e['estado'] in TERMINADOS for _, e in eventos):
+                            return
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+
+            def _evento(self, secuencia, evento):
+                datos = json.dumps(evento, ensure_ascii=False)
+                self.wfile.write(f"id: {secuencia}\nevent: trabajo\ndata: {datos}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+        return Handler
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class DaemonClient:
+    """
+    Cliente del demonio con la interfaz de VideoDownloader que usan las GUIs
+
+    ejecutar_descarga envía el trabajo y traduce sus eventos a llamadas de
+    progress hook con el mismo formato que yt-dlp.
+    """
+
+    def __init__(self, url_base=f'http://127.0.0.1:{PUERTO}'):
+        self.url_base = url_base.rstrip('/')
+        # Las GUIs los ajustan; el demonio usa su propia configuración
+        self.fragmentos = 1
+        self.vigilancia = False
+
+    def _pedir(self, metodo, ruta, datos=None):
+        cuerpo = json.dumps(datos).encode('utf-8') if datos is not None else None
+        peticion = urllib.request.Request(self.url_base + ruta, data=cuerpo, method=metodo,
+                                          headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(peticion, timeout=60) as respuesta:
+            return json.loads(respuesta.read())
+
+    def enviar(self, url, calidad='best', prioridad=PRIORIDAD_LOTE):
+        return self._pedir('POST', '/trabajos', {'url': url, 'calidad': calidad, 'prioridad': prioridad})
+
+    def listar(self):
+        return self._pedir('GET', '/trabajos')
+
+    def cancelar(self, id_trabajo):
+        return self._pedir('DELETE', f'/trabajos/{id_trabajo}')
+
+    def estimar_calidades(self, url):
+        datos = self._pedir('GET', f'/planes?url={quote(url, safe="")}')
+        return datos['planes'], datos['titulo']
+
+    def seguir(self, id_trabajo):
+        """Itera los estados del trabajo hasta que termina"""
+        respuesta = urllib.request.urlopen(f'{self.url_base}/eventos?trabajo={id_trabajo}')
+        with respuesta:
+            for linea in respuesta:
+                if linea.startswith(b'data: '):
+                    yield json.loads(linea[6:])
+
+    def ejecutar_descarga(self, url, calidad, progress_hooks, opciones=None, al_extraer=None,
+                          prioridad=PRIORIDAD_INTERACTIVA, esperar_postproceso=True):
+        trabajo = self.enviar(url, calidad, prioridad)
+        informado = procesando = False
+        for evento in self.seguir(trabajo['id']):
+            if al_extraer and evento['titulo'] and not informado:
+                informado = True
+                al_extraer({'title': evento['titulo'], 'duration': evento['duracion']})
+            if evento['estado'] == 'descargando' and evento['descargado']:
+                d = _progreso_como_ytdlp(evento)
+                for hook in progress_hooks:
+                    hook(d)
+            elif evento['estado'] == 'procesando' and not procesando:
+                procesando = True
+                for hook in progress_hooks:
+                    hook({'status': 'finished'})
+            elif evento['estado'] == 'error':
+                raise RuntimeError(evento['error'])
+            elif evento['estado'] == 'cancelado':
+                raise DescargaCancelada('Cancelado')
+            elif evento['estado'] == 'completado':
+                return None
+        raise RuntimeError('Se perdió la conexión con el demonio')
+
+
+def _comprobar(url, calidad, prioridad):
+    """(url, calidad, prioridad) normalizados; ValueError con el motivo si alguno no vale"""
+    if not isinstance(url, str) or not url.strip():
+        raise ValueError("Cada URL tiene que ser un texto no vacío")
+    # 720 o "720"
+    calidad = str(calidad) if isinstance(calidad, (str, int)) and not isinstance(calidad, bool) else None
+    if calidad not in CALIDADES:
+        raise ValueError(f"Calidad desconocida; se admite: {', '.join(CALIDADES)}")
+    if isinstance(prioridad, bool) or not isinstance(prioridad, int) or prioridad < 1:
+        raise ValueError("La prioridad tiene que ser un entero mayor o igual que 1")
+    return url.strip(), calidad, prioridad
+
+
+def _vista(trabajo):
+    """Copia del trabajo sin las marcas internas"""
+    return {k: v for k, v in trabajo.items() if k != 'cancelar'}
+
+
+def _progreso_como_ytdlp(evento):
+    """Convierte un evento del demonio en un dict de progress hook de yt-dlp"""
+    descargado, total = evento['descargado'], evento['total']
+    velocidad, eta = evento['velocidad'], evento['eta']
+    d = {'status': 'downloading', 'downloaded_bytes': descargado}
+    if total:
+        d['total_bytes'] = total
+    d['_percent_str'] = f"{descargado / total * 100:5.1f}%" if total else 'N/A'
+    d['_speed_str'] = f"{velocidad / (1024 * 1024):.2f}MiB/s" if velocidad else 'N/A'
+    d['_eta_str'] = f"{int(eta) // 60:02d}:{int(eta) % 60:02d}" if eta is not None else 'N/A'
+    return d
+
+
+def cliente_desde_entorno():
+    """DaemonClient si VIDEO_DOWNLOADER_DAEMON está definida, si no None"""
+    url = os.environ.get(VARIABLE_ENTORNO)
+    return DaemonClient(url) if url else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Demonio de descargas con API HTTP local')
+    parser.add_argument('--puerto', type=int, default=PUERTO)
+    parser.add_argument('--carpeta', default='descargas')
+    parser.add_argument('--descargas', type=int, default=4, help='descargas simultáneas')
+    parser.add_argument('--conexiones', type=int, default=1, help='conexiones por archivo')
+    parser.add_argument('--fragmentos', type=int, default=4, help='fragmentos HLS/DASH en paralelo')
+    parser.add_argument('--fusion-en-flujo', action='store_true',
+                        help='unir video y audio con FFmpeg mientras se descargan, sin archivos intermedios')
+    parser.add_argument('--vigilancia', action='store_true',
+                        help='relevar con una conexión nueva las conexiones atascadas')
+    parser.add_argument('--sin-verificacion', action='store_true',
+                        help='no comprobar con ffprobe los archivos terminados')
+    parser.add_argument('--formato-audio', default='m4a', choices=list(CONTENEDORES_AUDIO),
+                        help='contenedor de los trabajos con calidad "audio"')
+    parser.add_argument('--kbps-audio', type=int, default=AUDIO_OBJETIVO_KBPS, metavar='KBPS',
+                        help='bitrate si hay que recodificar el audio')
+    parser.add_argument('--metricas', metavar='ARCHIVO',
+                        help='añadir las métricas de cada trabajo terminado a este archivo JSON lines')
+    args = parser.parse_args()
+
+    from video_downloader import VideoDownloader
+    downloader = VideoDownloader(args.carpeta, conexiones=args.conexiones,
+                                 fragmentos=args.fragmentos, archivo=True,
+                                 fusion_en_flujo=args.fusion_en_flujo,
+                                 formato_audio=args.formato_audio, audio_kbps=args.kbps_audio,
+                                 vigilancia=args.vigilancia, verificacion=not args.sin_verificacion)
+    if args.metricas:
+        downloader.metricas.configurar_archivo(args.metricas)
+    demonio = DownloadDaemon(downloader, args.puerto, args.descargas).iniciar()
+    print(f"🛰️ Demonio escuchando en http://127.0.0.1:{demonio.puerto}")
+    print(f"📁 Guardando en: {downloader.output_dir.absolute()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\n👋 Deteniendo demonio...")
+        demonio.detener()
+        downloader.cerrar()
+
+
+if __name__ == "__main__":
+    main()
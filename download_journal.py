@@ -0,0 +1,112 @@
+"""
+Diario de piezas completadas para reanudar descargas
+
+Junto a cada archivo .part se guarda un archivo .journal (JSON lines) con
+las piezas ya escritas (rangos de bytes o fragmentos) y su sha256. Al
+reanudar se vuelve a leer cada pieza del .part y solo se aceptan las que
+coinciden con su hash, así que no hace falta fsync: si el proceso muere o
+se corta la luz, lo que no llegó a disco simplemente se vuelve a descargar.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+TAMANO_LECTURA = 1024 * 1024
+
+
+class ChunkJournal:
+    def __init__(self, destino, identidad, **parametros):
+        self.path = str(destino) + '.journal'
+        # Describe el contenido (tamaño total, lista de fragmentos...); si cambia, el diario no vale
+        self.identidad = identidad
+        # Cómo se repartió la descarga (p. ej. tamaño de segmento); al reanudar se usa el guardado
+        self.parametros = parametros
+        self.piezas = {}
+        self._archivo = None
+        self._lock = threading.Lock()
+
+    def cargar(self):
+        """Lee el diario existente; devuelve False si no hay uno compatible"""
+        self.piezas = {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                lineas = f.read().splitlines()
+        except OSError:
+            return False
+
+        try:
+            cabecera = json.loads(lineas[0])
+        except (IndexError, ValueError):
+            return False
+        if cabecera.get('identidad') != self.identidad:
+            return False
+        self.parametros = cabecera.get('parametros', self.parametros)
+
+        for linea in lineas[1:]:
+            try:
+                pieza = json.loads(linea)
+            except ValueError:
+                # Última línea cortada por un cierre brusco
+                continue
+            self.piezas[pieza['clave']] = pieza
+        return True
+
+    def verificar(self, parcial):
+        """Comprueba el hash de cada pieza contra el .part y descarta las corruptas"""
+        validas = {}
+        try:
+            with open(parcial, 'rb') as f:
+                for clave, pieza in self.piezas.items():
+                    f.seek(pieza['inicio'])
+                    if _sha256(f, pieza['fin'] - pieza['inicio'] + 1) == pieza['sha256']:
+                        validas[clave] = pieza
+        except OSError:
+            validas = {}
+        self.piezas = validas
+        return validas
+
+    def iniciar(self):
+        """Reescribe el diario con las piezas válidas actuales y lo deja abierto para añadir"""
+        with self._lock:
+            temporal = self.path + '.tmp'
+            with open(temporal, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'identidad': self.identidad, 'parametros': self.parametros}) + '\n')
+                for pieza in self.piezas.values():
+                    f.write(json.dumps(pieza) + '\n')
+            os.replace(temporal, self.path)
+            self._archivo = open(self.path, 'a', encoding='utf-8')
+
+    def registrar(self, clave, inicio, fin, sha256):
+        """Anota una pieza completada (bytes inicio..fin inclusive del .part)"""
+        pieza = {'clave': clave, 'inicio': inicio, 'fin': fin, 'sha256': sha256}
+        with self._lock:
+            self.piezas[clave] = pieza
+            self._archivo.write(json.dumps(pieza) + '\n')
+            self._archivo.flush()
+
+    def cerrar(self):
+        with self._lock:
+            if self._archivo is not None:
+                self._archivo.close()
+                self._archivo = None
+
+    def eliminar(self):
+        """Borra el diario una vez terminada la descarga"""
+        self.cerrar()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _sha256(f, longitud):
+    h = hashlib.sha256()
+    while longitud > 0:
+        datos = f.read(min(TAMANO_LECTURA, longitud))
+        if not datos:
+            break
+        h.update(datos)
+        longitud -= len(datos)
+    return h.hexdigest()
@@ -0,0 +1,156 @@
+"""
+Planificador de formatos: la combinación más barata para cada calidad
+
+Los ajustes de calidad usaban cadenas fijas como
+'bestvideo[height<=720]+bestaudio', que eligen el stream de más bitrate
+aunque haya otro de la misma resolución que pese la mitad (p. ej. AV1
+frente a H.264). Aquí se prueban todas las combinaciones (formatos con
+audio y video, y video solo + audio solo de DASH), se estima su tamaño y
+se elige la que menos bytes descarga sin bajar de la resolución pedida.
+
+Para 'audio' (modo solo audio) se elige el formato de solo audio más
+pequeño que llegue al bitrate objetivo (audio_kbps).
+
+Si ningún formato trae datos para estimar el tamaño se devuelve None y se
+usa la cadena de formato de siempre.
+"""
+
+from postprocessing import compatible_mp4
+
+CALIDADES = ('best', '1080', '720', '480', '360', 'worst', 'audio')
+
+# Por debajo de esto el audio se nota peor; solo se usa si no hay otro
+AUDIO_MINIMO_KBPS = 96
+# Bitrate objetivo del modo solo audio
+AUDIO_OBJETIVO_KBPS = 128
+# Contenedores que se pueden unir en un MP4 sin remux adicional
+EXTENSIONES_MP4 = ('mp4', 'm4a', 'm4v', 'mov')
+
+
+def tamano_estimado(formato, duracion=None):
+    """Bytes esperados del formato: filesize, filesize_approx o tbr × duración"""
+    tamano = formato.get('filesize') or formato.get('filesize_approx')
+    if tamano:
+        return int(tamano)
+    tbr = formato.get('tbr') or ((formato.get('vbr') or 0) + (formato.get('abr') or 0))
+    if tbr and duracion:
+        # tbr viene en kbit/s
+        return int(tbr * 1000 / 8 * duracion)
+    return None
+
+
+def _tiene(formato, clave):
+    return (formato.get(clave) or 'none') != 'none'
+
+
+def _kbps(formato):
+    return formato.get('abr') or formato.get('tbr') or 0
+
+
+def combinaciones(info):
+    """Todas las formas de obtener video + audio: formatos completos y parejas DASH"""
+    formatos = [f for f in info.get('formats') or [] if not f.get('has_drm')]
+    completos = [f for f in formatos if _tiene(f, 'vcodec') and _tiene(f, 'acodec')]
+    solo_video = [f for f in formatos if _tiene(f, 'vcodec') and not _tiene(f, 'acodec')]
+    solo_audio = [f for f in formatos if _tiene(f, 'acodec') and not _tiene(f, 'vcodec')]
+
+    # Audio aceptable: el que llega al mínimo, o todo si ninguno llega
+    audio_bueno = [f for f in solo_audio if _kbps(f) >= AUDIO_MINIMO_KBPS]
+    audio = audio_bueno or solo_audio
+
+    for f in completos:
+        yield (f,)
+    for v in solo_video:
+        for a in audio:
+            yield (v, a)
+
+
+def _plan(combinacion, duracion):
+    video = combinacion[0]
+    tamanos = [tamano_estimado(f, duracion) for f in combinacion]
+    return {
+        'format': '+'.join(f['format_id'] for f in combinacion),
+        'bytes': sum(tamanos) if None not in tamanos else None,
+        'altura': video.get('height') or 0,
+        'fps': video.get('fps') or 0,
+        'mp4': compatible_mp4(combinacion),
+        'ext': video.get('ext') if len(combinacion) == 1 else 'mp4',
+        'remux': any(f.get('ext') not in EXTENSIONES_MP4 for f in combinacion),
+    }
+
+
+def _nivel(plan):
+    # Resolución y si es de alta tasa de fotogramas (muchos formatos no indican fps)
+    return plan['altura'], plan['fps'] > 30
+
+
+def planificar(info, calidad='best', audio_kbps=AUDIO_OBJETIVO_KBPS):
+    """
+    Devuelve el plan más barato para la calidad pedida, o None si no se puede estimar
+
+    La calidad objetivo es la mayor resolución (y 60 fps si existe) que no
+    pase de la pedida; para 'worst', la menor. Entre los planes que la
+    cumplen gana el de menos bytes, prefiriendo los que caben en un MP4
+    sin recodificar ni remuxear. Para 'audio', ver planificar_audio.
+    """
+    if calidad == 'audio':
+        return planificar_audio(info, audio_kbps)
+    duracion = info.get('duration')
+    planes = [_plan(c, duracion) for c in combinaciones(info)]
+    planes = [p for p in planes if p['bytes']]
+    if not planes:
+        return None
+
+    if calidad not in ('best', 'worst'):
+        limite = int(calidad)
+        dentro = [p for p in planes if p['altura'] <= limite]
+        # Si todo supera la altura pedida, lo más cercano por arriba
+        planes = dentro or [p for p in planes if p['altura'] == min(p['altura'] for p in planes)]
+
+    nivel = (min if calidad == 'worst' else max)(_nivel(p) for p in planes)
+    candidatos = [p for p in planes if _nivel(p) == nivel]
+    return min(candidatos, key=lambda p: (not p['mp4'], p['remux'], p['bytes']))
+
+
+def planificar_audio(info, kbps=AUDIO_OBJETIVO_KBPS):
+    """
+    Formato de solo audio más pequeño que llegue a kbps, o None si no hay ninguno
+
+    Si ninguno llega, el de más bitrate. A igual tamaño (o sin datos para
+    estimarlo) gana el de menos bitrate que cumpla.
+    """
+    duracion = info.get('duration')
+    formatos = [f for f in info.get('formats') or []
+                if not f.get('has_drm') and _tiene(f, 'acodec') and not _tiene(f, 'vcodec')]
+    if not formatos:
+        return None
+    suficientes = [f for f in formatos if _kbps(f) >= kbps]
+    if suficientes:
+        elegido = min(suficientes, key=lambda f: (tamano_estimado(f, duracion) or float('inf'), _kbps(f)))
+    else:
+        elegido = max(formatos, key=_kbps)
+    return {
+        'format': elegido['format_id'],
+        'bytes': tamano_estimado(elegido, duracion),
+        'altura': 0,
+        'fps': 0,
+        'mp4': compatible_mp4((elegido,)),
+        'ext': elegido.get('ext'),
+        'remux': False,
+        'acodec': elegido.get('acodec'),
+        'kbps': _kbps(elegido),
+    }
+
+
+def planificar_calidades(info, audio_kbps=AUDIO_OBJETIVO_KBPS):
+    """Plan de cada calidad del menú (o None si no se puede estimar)"""
+    return {calidad: planificar(info, calidad, audio_kbps) for calidad in CALIDADES}
+
+
+def formato_tamano(bytes_):
+    """Tamaño legible para mostrar en menús: '~45.2 MB'"""
+    if not bytes_:
+        return '? MB'
+    if bytes_ >= 1024 ** 3:
+        return f"~{bytes_ / 1024 ** 3:.2f} GB"
+    return f"~{bytes_ / 1024 ** 2:.1f} MB"
@@ -0,0 +1,173 @@
+"""
+Integridad de los archivos descargados
+
+Las descargas propias (por rangos, por fragmentos y en flujo) calculan el
+sha256 de cada pieza mientras la escriben: son los mismos hashes que el
+diario usa para reanudar, así que tener el resumen de un archivo no cuesta
+volver a leerlo. IntegrityIndex guarda, por cada archivo terminado, un JSON
+en descargas/.integridad/ con esos hashes y el resultado de comprobar el
+contenedor.
+
+verificar_contenedor abre el archivo con ffprobe (o FFmpeg si no está) y
+comprueba que tiene los streams esperados y que la duración coincide con la
+de extract_info. Solo se leen la cabecera y el índice, no el archivo
+entero. Si no cuadra lanza ArchivoCorrupto para que se vuelva a descargar.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+# Diferencia de duración admitida: la mayor entre los segundos y la proporción
+TOLERANCIA_DURACION = 2.0
+TOLERANCIA_RELATIVA = 0.02
+
+
+class ArchivoCorrupto(Exception):
+    """El archivo terminado no se puede abrir o no coincide con lo que se pidió"""
+
+
+class IntegrityIndex:
+    def __init__(self, raiz):
+        self.raiz = Path(raiz)
+        self.raiz.mkdir(parents=True, exist_ok=True)
+
+    def ruta(self, archivo):
+        return self.raiz / (Path(archivo).name + '.json')
+
+    def obtener(self, archivo):
+        """Datos guardados del archivo, o None"""
+        try:
+            with open(self.ruta(archivo), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def guardar(self, archivo, datos):
+        temporal = f"{self.ruta(archivo)}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'archivo': Path(archivo).name, **datos}, f, ensure_ascii=False)
+        os.replace(temporal, self.ruta(archivo))
+
+    def eliminar(self, archivo):
+        try:
+            os.remove(self.ruta(archivo))
+        except OSError:
+            pass
+
+
+def huella(ruta, piezas):
+    """
+    Resumen de un archivo recién escrito a partir de los sha256 de sus piezas
+
+    piezas son dicts con inicio, fin (inclusive) y sha256, como los del
+    diario. Se guarda también la identidad del archivo (inodo, tamaño y
+    fecha) para saber más tarde si sigue siendo el mismo o si FFmpeg lo
+    reescribió al fusionarlo o corregirlo.
+    """
+    piezas = sorted(piezas, key=lambda p: p['inicio'])
+    h = hashlib.sha256()
+    siguiente = 0
+    for pieza in piezas:
+        if pieza['inicio'] != siguiente:
+            # Falta o se solapa una pieza: el resumen no describiría el archivo
+            return None
+        h.update(f"{pieza['inicio']}-{pieza['fin']}:{pieza['sha256']}\n".encode('ascii'))
+        siguiente = pieza['fin'] + 1
+    datos = {
+        'tamano': siguiente,
+        'sha256_piezas': h.hexdigest(),
+        'piezas': [[p['inicio'], p['fin'], p['sha256']] for p in piezas],
+    }
+    if ruta is not None:
+        datos['identidad'] = _identidad(ruta)
+    return datos
+
+
+def es_el_mismo(datos, ruta):
+    """True si ruta es el mismo archivo (sin reescribir) del que se tomó la huella"""
+    try:
+        return datos.get('identidad') == _identidad(ruta)
+    except OSError:
+        return False
+
+
+def esperado_de(seleccion):
+    """Duración y streams que tiene que tener el archivo de una selección de yt-dlp"""
+    formatos = seleccion.get('requested_formats') or [seleccion]
+    return {
+        'duracion': seleccion.get('duration'),
+        # Un códec desconocido (None) no obliga a nada
+        'video': any(f.get('vcodec') not in (None, 'none') for f in formatos),
+        'audio': any(f.get('acodec') not in (None, 'none') for f in formatos),
+    }
+
+
+def verificar_contenedor(ruta, esperado):
+    """
+    Abre el archivo y lo compara con lo esperado; devuelve duración y streams
+
+    Devuelve None si no hay ni ffprobe ni FFmpeg para comprobarlo. Lanza
+    ArchivoCorrupto si no se puede abrir, le falta un stream o la duración
+    no coincide.
+    """
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe:
+        resultado = _ejecutar([ffprobe, '-v', 'error', '-show_entries', 'format=duration:stream=codec_type',
+                               '-of', 'json', str(ruta)])
+        if resultado.returncode != 0:
+            raise ArchivoCorrupto(_ultima_linea(resultado.stderr) or f"ffprobe terminó con {resultado.returncode}")
+        datos = json.loads(resultado.stdout or b'{}')
+        duracion = (datos.get('format') or {}).get('duration')
+        contenedor = {
+            'duracion': float(duracion) if duracion not in (None, 'N/A') else None,
+            'streams': sorted({s.get('codec_type') for s in datos.get('streams') or []} - {None}),
+        }
+    else:
+        ffmpeg = shutil.which('ffmpeg')
+        if not ffmpeg:
+            return None
+        # Sin salida FFmpeg termina con error, pero antes describe la entrada
+        resultado = _ejecutar([ffmpeg, '-hide_banner', '-nostdin', '-i', str(ruta)])
+        texto = resultado.stderr.decode('utf-8', 'replace')
+        if not re.search(r'^Input #0', texto, re.MULTILINE):
+            raise ArchivoCorrupto(_ultima_linea(resultado.stderr) or "FFmpeg no pudo abrir el archivo")
+        duracion = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', texto)
+        contenedor = {
+            'duracion': (int(duracion.group(1)) * 3600 + int(duracion.group(2)) * 60
+                         + float(duracion.group(3))) if duracion else None,
+            'streams': sorted({t.lower() for t in re.findall(r'Stream #0:\d+.*?: (Video|Audio|Subtitle|Data)',
+                                                             texto)}),
+        }
+
+    for tipo in ('video', 'audio'):
+        if esperado.get(tipo) and tipo not in contenedor['streams']:
+            raise ArchivoCorrupto(f"Falta el stream de {tipo}")
+    if not contenedor['streams']:
+        raise ArchivoCorrupto("El archivo no tiene ningún stream")
+    duracion = esperado.get('duracion')
+    if duracion and contenedor['duracion'] is not None:
+        tolerancia = max(TOLERANCIA_DURACION, duracion * TOLERANCIA_RELATIVA)
+        if abs(contenedor['duracion'] - duracion) > tolerancia:
+            raise ArchivoCorrupto(f"Dura {contenedor['duracion']:.1f} s en lugar de {duracion:.1f} s")
+    contenedor['verificado'] = time.time()
+    return contenedor
+
+
+def _ejecutar(comando):
+    return subprocess.run(comando, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def _ultima_linea(salida):
+    lineas = (salida or b'').decode('utf-8', 'replace').strip().splitlines()
+    return lineas[-1] if lineas else ''
+
+
+def _identidad(ruta):
+    estado = os.stat(ruta)
+    return [estado.st_dev, estado.st_ino, estado.st_size, estado.st_mtime_ns]
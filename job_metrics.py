@@ -0,0 +1,195 @@
+"""
+Métricas por trabajo de descarga
+
+Cada descarga mide cuánto pasa en cada fase (extracción, selección de
+formato, transferencia, fusión con FFmpeg, movimiento al destino y
+verificación del contenedor), los bytes, los reintentos y el error si
+falla. Los resultados se acumulan en histogramas que se exportan en el
+formato de texto de Prometheus (el demonio los sirve en GET /metricas) y,
+si se configura un archivo, cada trabajo terminado se añade como una línea
+JSON (el archivo rota al llegar al tamaño máximo y se conserva el anterior
+como .1).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+FASES = ('extraccion', 'seleccion', 'transferencia', 'fusion', 'movimiento', 'verificacion')
+
+# Límites de los histogramas en segundos (el último es +Inf)
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Tamaño a partir del cual rota el archivo JSON lines
+MAX_BYTES_ARCHIVO = 10 * 1024 * 1024
+
+
+class _Histograma:
+    def __init__(self):
+        self.cuentas = [0] * (len(BUCKETS) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(BUCKETS):
+            if valor <= limite:
+                break
+        else:
+            i = len(BUCKETS)
+        self.cuentas[i] += 1
+        self.suma += valor
+        self.total += 1
+
+    def lineas(self, nombre, etiquetas=''):
+        separador = ',' if etiquetas else ''
+        acumulado = 0
+        for limite, cuenta in zip((*BUCKETS, '+Inf'), self.cuentas):
+            acumulado += cuenta
+            yield f'{nombre}_bucket{{{etiquetas}{separador}le="{limite}"}} {acumulado}'
+        sufijo = f'{{{etiquetas}}}' if etiquetas else ''
+        yield f'{nombre}_sum{sufijo} {self.suma:.6f}'
+        yield f'{nombre}_count{sufijo} {self.total}'
+
+
+class JobMetrics:
+    def __init__(self, archivo=None, max_bytes=MAX_BYTES_ARCHIVO):
+        self._lock = threading.Lock()
+        self._duracion = _Histograma()
+        self._fases = {fase: _Histograma() for fase in FASES}
+        self._resultados = Counter()
+        self._errores = Counter()
+        self._bytes = 0
+        self._reintentos = 0
+        self._activos = 0
+        self.archivo = None
+        self.max_bytes = max_bytes
+        if archivo:
+            self.configurar_archivo(archivo, max_bytes)
+
+    def configurar_archivo(self, archivo, max_bytes=MAX_BYTES_ARCHIVO):
+        """Escribe cada trabajo terminado como una línea JSON en el archivo (None = desactivar)"""
+        with self._lock:
+            self.archivo = str(archivo) if archivo else None
+            self.max_bytes = max_bytes
+
+    def iniciar(self, url):
+        """Empieza a medir un trabajo; llamar a .terminar() al acabar"""
+        with self._lock:
+            self._activos += 1
+        return _Medicion(self, url)
+
+    def prometheus(self):
+        """Métricas acumuladas en el formato de texto de Prometheus"""
+        with self._lock:
+            lineas = [
+                '# HELP video_downloader_jobs_active Descargas en curso',
+                '# TYPE video_downloader_jobs_active gauge',
+                f'video_downloader_jobs_active {self._activos}',
+                '# HELP video_downloader_jobs_total Descargas terminadas por resultado',
+                '# TYPE video_downloader_jobs_total counter',
+            ]
+            for resultado in ('ok', 'error'):
+                lineas.append(f'video_downloader_jobs_total{{resultado="{resultado}"}} '
+                              f'{self._resultados[resultado]}')
+            lineas += [
+                '# HELP video_downloader_errors_total Descargas fallidas por tipo de error',
+                '# TYPE video_downloader_errors_total counter',
+            ]
+            for tipo, cuenta in sorted(self._errores.items()):
+                lineas.append(f'video_downloader_errors_total{{tipo="{tipo}"}} {cuenta}')
+            lineas += [
+                '# HELP video_downloader_downloaded_bytes_total Bytes transferidos',
+                '# TYPE video_downloader_downloaded_bytes_total counter',
+                f'video_downloader_downloaded_bytes_total {self._bytes}',
+                '# HELP video_downloader_retries_total Reintentos de conexiones y fragmentos',
+                '# TYPE video_downloader_retries_total counter',
+                f'video_downloader_retries_total {self._reintentos}',
+                '# HELP video_downloader_job_seconds Duración total de cada descarga',
+                '# TYPE video_downloader_job_seconds histogram',
+                *self._duracion.lineas('video_downloader_job_seconds'),
+                '# HELP video_downloader_phase_seconds Duración de cada fase de una descarga',
+                '# TYPE video_downloader_phase_seconds histogram',
+            ]
+            for fase, histograma in self._fases.items():
+                lineas += histograma.lineas('video_downloader_phase_seconds', f'fase="{fase}"')
+        return '\n'.join(lineas) + '\n'
+
+    def _registrar(self, registro):
+        with self._lock:
+            self._activos -= 1
+            self._duracion.observar(registro['segundos'])
+            for fase, segundos in registro['fases'].items():
+                self._fases[fase].observar(segundos)
+            self._resultados['ok' if registro['ok'] else 'error'] += 1
+            if registro['error']:
+                self._errores[registro['error']['tipo']] += 1
+            self._bytes += registro['bytes']
+            self._reintentos += registro['reintentos']
+            if self.archivo:
+                self._escribir(registro)
+
+    def _escribir(self, registro):
+        """Añade el registro al archivo JSON lines (con el lock tomado)"""
+        try:
+            if os.path.exists(self.archivo) and os.path.getsize(self.archivo) >= self.max_bytes:
+                os.replace(self.archivo, self.archivo + '.1')
+            with open(self.archivo, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        except OSError:
+            # Las métricas nunca deben hacer fallar una descarga
+            pass
+
+
+class _Medicion:
+    def __init__(self, metricas, url):
+        self.metricas = metricas
+        self.url = url
+        self.fases = {}
+        self.bytes = 0
+        self.reintentos = 0
+        self.inicio = time.monotonic()
+        self._lock = threading.Lock()
+        self._terminada = False
+
+    @contextmanager
+    def fase(self, nombre):
+        """Suma a la fase el tiempo que pasa dentro del bloque with"""
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            self.sumar(nombre, time.monotonic() - inicio)
+
+    def sumar(self, fase, segundos):
+        with self._lock:
+            self.fases[fase] = self.fases.get(fase, 0.0) + segundos
+
+    def reintento(self, *_):
+        """Cuenta un reintento (admite argumentos para usarse como callback)"""
+        with self._lock:
+            self.reintentos += 1
+
+    def terminar(self, error=None):
+        """Registra el trabajo; solo cuenta la primera llamada"""
+        with self._lock:
+            if self._terminada:
+                return
+            self._terminada = True
+            registro = {
+                'fecha': time.time(),
+                'url': self.url,
+                'ok': error is None,
+                'segundos': round(time.monotonic() - self.inicio, 4),
+                'fases': {fase: round(s, 4) for fase, s in self.fases.items()},
+                'bytes': self.bytes,
+                'reintentos': self.reintentos,
+                'error': None if error is None else {'tipo': type(error).__name__, 'mensaje': str(error)},
+            }
+        self.metricas._registrar(registro)
+
+
+# Instancia única para todo el proceso
+metricas = JobMetrics()
@@ -0,0 +1,206 @@
+"""
+Caché persistente de metadatos de yt-dlp
+
+Guarda en disco el resultado de extract_info para no repetir la extracción
+(segundos de trabajo del extractor y varias peticiones de red) cuando se
+vuelve a pedir la misma URL. Las entradas caducan por TTL, cuando expiran
+las URLs firmadas de los formatos, o por LRU al superar el tamaño máximo.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from yt_dlp.extractor import gen_extractor_classes
+
+# Parámetros de seguimiento que no cambian el video
+PARAMETROS_IGNORADOS = {'si', 'feature', 'fbclid', 'gclid', 'pp', 'igshid', 't'}
+
+# Margen antes de la expiración de las URLs firmadas
+MARGEN_EXPIRACION = 5 * 60
+
+
+def normalizar_url(url):
+    """Normaliza una URL para usarla como clave de caché"""
+    partes = urlsplit(url.strip())
+    host = (partes.hostname or '').lower()
+    for prefijo in ('www.', 'm.'):
+        if host.startswith(prefijo):
+            host = host[len(prefijo):]
+
+    ruta = partes.path.rstrip('/')
+    query = [(k, v) for k, v in parse_qsl(partes.query)
+             if k not in PARAMETROS_IGNORADOS and not k.startswith('utm_')]
+
+    # Variantes cortas de YouTube -> watch?v=ID
+    if host == 'youtu.be' and ruta:
+        host, query = 'youtube.com', [('v', ruta[1:])] + query
+        ruta = '/watch'
+    elif host == 'youtube.com' and ruta.startswith('/shorts/'):
+        query = [('v', ruta.split('/')[2])] + query
+        ruta = '/watch'
+
+    if partes.port:
+        host = f"{host}:{partes.port}"
+    return urlunsplit(('https', host, ruta, urlencode(sorted(query)), ''))
+
+
+def clave_extractor(url):
+    """Devuelve 'Extractor:id' sin hacer peticiones, o None si no se reconoce"""
+    for ie in gen_extractor_classes():
+        if ie.ie_key() == 'Generic':
+            continue
+        if ie.suitable(url):
+            temp_id = ie.get_temp_id(url)
+            return f"{ie.ie_key()}:{temp_id}" if temp_id else None
+    return None
+
+
+def expiracion_formatos(info):
+    """Devuelve el timestamp en que caducan las URLs firmadas de los formatos"""
+    expiraciones = []
+    for f in info.get('formats') or []:
+        for campo in ('url', 'manifest_url', 'fragment_base_url'):
+            valor = f.get(campo)
+            if not valor:
+                continue
+            query = dict(parse_qsl(urlsplit(valor).query))
+            if query.get('expire', '').isdigit():
+                expiraciones.append(int(query['expire']))
+    return min(expiraciones) if expiraciones else None
+
+
+class MetadataCache:
+    def __init__(self, directorio, ttl=6 * 3600, max_bytes=200 * 1024 * 1024):
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._indice_path = self.directorio / 'indice.json'
+        self._alias = {}
+        self._entradas = {}
+        self._cargar_indice()
+
+    def obtener(self, url):
+        """Devuelve el info dict guardado para la URL, o None si no hay uno válido"""
+        with self._lock:
+            clave = self._resolver(url)
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+
+            if time.time() >= entrada['expira']:
+                self._eliminar(clave)
+                self._guardar_indice()
+                return None
+
+            try:
+                with open(self.directorio / entrada['archivo'], encoding='utf-8') as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                self._eliminar(clave)
+                self._guardar_indice()
+                return None
+
+            # Mover al final para el orden LRU
+            entrada['usado'] = time.time()
+            self._entradas[clave] = self._entradas.pop(clave)
+            return info
+
+    def guardar(self, url, info):
+        """Guarda un info dict ya saneado (ver YoutubeDL.sanitize_info)"""
+        if info.get('_type', 'video') != 'video' or not info.get('id'):
+            return
+
+        extractor = info.get('extractor_key', 'Generic')
+        if extractor == 'Generic':
+            # El id genérico sale del nombre del archivo y puede repetirse entre sitios
+            clave = f"Generic:{normalizar_url(info.get('webpage_url') or url)}"
+        else:
+            clave = f"{extractor}:{info['id']}"
+        datos = json.dumps(info, ensure_ascii=False).encode('utf-8')
+        archivo = hashlib.sha1(clave.encode('utf-8')).hexdigest() + '.json'
+
+        ahora = time.time()
+        expira = ahora + self.ttl
+        expiracion_urls = expiracion_formatos(info)
+        if expiracion_urls:
+            expira = min(expira, expiracion_urls - MARGEN_EXPIRACION)
+
+        alias = [normalizar_url(url), clave_extractor(url)]
+        if info.get('webpage_url'):
+            alias.append(normalizar_url(info['webpage_url']))
+
+        with self._lock:
+            temporal = self.directorio / (archivo + '.tmp')
+            temporal.write_bytes(datos)
+            os.replace(temporal, self.directorio / archivo)
+
+            self._entradas.pop(clave, None)
+            self._entradas[clave] = {
+                'archivo': archivo,
+                'tamano': len(datos),
+                'expira': expira,
+                'usado': ahora,
+            }
+            for a in alias:
+                if a:
+                    self._alias[a] = clave
+
+            self._recortar()
+            self._guardar_indice()
+
+    def invalidar(self, url):
+        """Elimina la entrada de una URL (p. ej. si sus formatos ya no son válidos)"""
+        with self._lock:
+            clave = self._resolver(url)
+            if clave in self._entradas:
+                self._eliminar(clave)
+                self._guardar_indice()
+
+    def _resolver(self, url):
+        """Traduce una URL a la clave canónica Extractor:id"""
+        normalizada = normalizar_url(url)
+        if normalizada in self._alias:
+            return self._alias[normalizada]
+        clave = clave_extractor(url)
+        if clave:
+            return self._alias.get(clave, clave)
+        return None
+
+    def _recortar(self):
+        """Expulsa las entradas menos usadas hasta caber en max_bytes"""
+        total = sum(e['tamano'] for e in self._entradas.values())
+        while total > self.max_bytes and len(self._entradas) > 1:
+            clave = next(iter(self._entradas))
+            total -= self._entradas[clave]['tamano']
+            self._eliminar(clave)
+
+    def _eliminar(self, clave):
+        entrada = self._entradas.pop(clave)
+        try:
+            (self.directorio / entrada['archivo']).unlink()
+        except OSError:
+            pass
+        self._alias = {a: c for a, c in self._alias.items() if c != clave}
+
+    def _cargar_indice(self):
+        try:
+            with open(self._indice_path, encoding='utf-8') as f:
+                datos = json.load(f)
+        except (OSError, ValueError):
+            return
+        entradas = sorted(datos.get('entradas', {}).items(), key=lambda e: e[1]['usado'])
+        self._entradas = dict(entradas)
+        self._alias = datos.get('alias', {})
+
+    def _guardar_indice(self):
+        temporal = self._indice_path.with_suffix('.tmp')
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'entradas': self._entradas, 'alias': self._alias}, f)
+        os.replace(temporal, self._indice_path)
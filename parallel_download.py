@@ -0,0 +1,1241 @@
+"""
+Descargas HTTP en paralelo
+
+SegmentedDownloader divide un archivo en rangos de bytes y los descarga por
+varias conexiones keep-alive, escribiendo cada trozo en su posición dentro
+de un archivo reservado de antemano. Sirve para formatos progresivos (un
+único archivo por HTTP) en CDNs que limitan la velocidad por conexión.
+Un vigilante compara la velocidad de cada conexión con la mediana reciente:
+si una se atasca (un nodo del CDN lento o una conexión TCP medio muerta),
+abre otra desde el mismo punto del rango y se queda con la que acabe antes.
+
+FragmentDownloader descarga en paralelo los fragmentos de HLS/DASH y los
+vuelve a unir en orden con un buffer de reordenación acotado.
+
+StreamingMerger descarga a la vez el video y el audio de un formato
+bestvideo+bestaudio y los pasa por tuberías a un FFmpeg que los une al
+vuelo: los bytes tocan el disco una sola vez, en el archivo final. Del
+mismo modo convierte un formato de solo audio mientras se descarga.
+
+Todos pueden compartir un HostConnectionPool para que las conexiones
+keep-alive (y sus handshakes TLS) sobrevivan de una descarga a la
+siguiente contra el mismo CDN, y reciben un RedHTTP con el proxy, las
+cookies y la verificación TLS de la sesión de yt-dlp.
+"""
+
+import base64
+import hashlib
+import http.client
+import os
+import queue
+import re
+import select
+import shutil
+import socket
+import ssl
+import statistics
+import subprocess
+import threading
+import time
+import urllib.request
+from collections import deque
+from urllib.parse import unquote, urljoin, urlsplit
+
+from yt_dlp.downloader.common import FileDownloader
+from yt_dlp.networking.exceptions import TransportError
+from yt_dlp.utils import format_bytes
+
+from concurrency import espera_reintento
+from download_journal import ChunkJournal
+
+TAMANO_BLOQUE = 64 * 1024
+# Formatos que FFmpeg puede leer en orden desde una tubería (además de los DASH)
+EXTENSIONES_EN_ORDEN = ('webm', 'mp3', 'ogg', 'opus')
+# Extensión → nombre del contenedor para -f de FFmpeg
+FORMATOS_FFMPEG = {'mkv': 'matroska', 'm4a': 'ipod'}
+
+# Vigilancia de conexiones atascadas: segundos que una conexión tiene que ir
+# por debajo de FRACCION_ATASCO de la mediana reciente para abrirle un relevo
+VENTANA_ATASCO = 5.0
+FRACCION_ATASCO = 0.25
+# Velocidades recientes (una por conexión y revisión) para la mediana
+MUESTRAS_MEDIANA = 40
+# Con menos muestras o menos bytes pendientes no se releva
+MUESTRAS_MINIMAS = 4
+RELEVO_MINIMO = 256 * 1024
+
+
+class RangosNoSoportados(Exception):
+    """El servidor no admite peticiones con Range"""
+
+
+class FragmentosNoSoportados(Exception):
+    """La lista de fragmentos usa algo que no manejamos (cifrado, byteranges, en vivo...)"""
+
+
+class FusionNoSoportada(Exception):
+    """Los formatos no se pueden unir o convertir en flujo (sin FFmpeg, Windows, MP4 no fragmentado...)"""
+
+
+class RedHTTP:
+    """
+    Ajustes de red de una sesión de yt-dlp para las conexiones propias
+
+    Proxy (el de --proxy o, si no se indicó, el de las variables de
+    entorno, como hace yt-dlp), cookies del tarro de la sesión y
+    verificación de certificados. Solo se admiten proxies HTTP: con otro
+    tipo (SOCKS) soportada() es False y la descarga la hace yt-dlp.
+    """
+
+    def __init__(self, proxy=None, cookies=None, verificar_tls=True):
+        # URL del proxy; None = el de las variables de entorno, '' = conexión directa
+        self.proxy = proxy
+        # Tarro de cookies de yt-dlp (None = sin cookies)
+        self.cookies = cookies
+        self.verificar_tls = verificar_tls
+
+    @classmethod
+    def de_ydl(cls, ydl):
+        return cls(ydl.params.get('proxy'), ydl.cookiejar, not ydl.params.get('nocheckcertificate'))
+
+    def proxy_para(self, url):
+        """URL del proxy por el que va url, o None si va directa"""
+        if self.proxy is not None:
+            proxy = self.proxy
+        else:
+            partes = urlsplit(url)
+            if urllib.request.proxy_bypass(partes.hostname or ''):
+                return None
+            proxy = urllib.request.getproxies().get(partes.scheme)
+        if not proxy:
+            return None
+        return proxy if '://' in proxy else f'http://{proxy}'
+
+    def soportada(self, url):
+        proxy = self.proxy_para(url)
+        return proxy is None or urlsplit(proxy).scheme == 'http'
+
+    def cabeceras(self, url, headers):
+        """headers con las cookies que la sesión tiene para url"""
+        cookie = self.cookies.get_cookie_header(url) if self.cookies is not None else None
+        return {**headers, 'Cookie': cookie} if cookie else headers
+
+    def conectar(self, url, timeout):
+        partes = urlsplit(url)
+        contexto = None if self.verificar_tls else ssl._create_unverified_context()
+        proxy = self.proxy_para(url)
+        if proxy is None:
+            return _conectar(url, timeout, contexto)
+
+        proxy = urlsplit(proxy)
+        autorizacion = {}
+        if proxy.username:
+            credenciales = f"{unquote(proxy.username)}:{unquote(proxy.password or '')}"
+            autorizacion['Proxy-Authorization'] = 'Basic ' + base64.b64encode(credenciales.encode()).decode()
+        if partes.scheme == 'https':
+            # CONNECT al proxy y TLS con el servidor por el túnel
+            conexion = http.client.HTTPSConnection(proxy.hostname, proxy.port or 80, timeout=timeout,
+                                                   context=contexto)
+            conexion.set_tunnel(partes.hostname, partes.port, headers=autorizacion)
+            return conexion
+        return _ConexionProxy(proxy.hostname, proxy.port or 80, f'http://{partes.netloc}', autorizacion,
+                              timeout=timeout)
+
+
+class _ConexionProxy(http.client.HTTPConnection):
+    """Conexión HTTP a través de un proxy: las peticiones llevan la URL completa"""
+
+    def __init__(self, host, port, origen, cabeceras, timeout):
+        super().__init__(host, port, timeout=timeout)
+        self.origen = origen
+        self.cabeceras_proxy = cabeceras
+
+    def request(self, method, url, body=None, headers={}, **kwargs):
+        super().request(method, self.origen + url, body, {**headers, **self.cabeceras_proxy}, **kwargs)
+
+
+class HostConnectionPool:
+    """
+    Conexiones keep-alive libres por host, compartidas entre descargas e hilos
+
+    Solo se devuelven conexiones con la última respuesta leída entera. Al
+    tomar una se descarta si lleva demasiado tiempo parada o si el servidor
+    la cerró mientras esperaba.
+    """
+
+    def __init__(self, max_por_host=8, inactividad=30):
+        self.max_por_host = max_por_host
+        self.inactividad = inactividad
+        self._lock = threading.Lock()
+        self._libres = {}
+
+    def tomar(self, url, timeout, red=None):
+        """Conexión libre al host de url (por el mismo proxy), o una nueva si no hay"""
+        clave = _clave_pool(url, red)
+        ahora = time.monotonic()
+        with self._lock:
+            libres = self._libres.get(clave, [])
+            while libres:
+                conexion, desde = libres.pop()
+                if ahora - desde < self.inactividad and _viva(conexion):
+                    conexion.timeout = timeout
+                    conexion.sock.settimeout(timeout)
+                    return conexion
+                conexion.close()
+        return _conectar(url, timeout, red=red)
+
+    def devolver(self, url, conexion, red=None):
+        """Deja la conexión libre para la siguiente petición al mismo host"""
+        clave = _clave_pool(url, red)
+        with self._lock:
+            libres = self._libres.setdefault(clave, [])
+            if conexion.sock is not None and len(libres) < self.max_por_host:
+                libres.append((conexion, time.monotonic()))
+                return
+        conexion.close()
+
+    def cerrar(self):
+        with self._lock:
+            libres, self._libres = self._libres, {}
+        for conexiones in libres.values():
+            for conexion, _ in conexiones:
+                conexion.close()
+
+
+class SegmentedDownloader:
+    def __init__(self, conexiones=4, segmento_minimo=1024 * 1024, reintentos=3, timeout=20,
+                 al_reintentar=None, pool=None, concurrencia=None, vigilancia=True,
+                 ventana_atasco=VENTANA_ATASCO, fraccion_atasco=FRACCION_ATASCO, al_relevar=None,
+                 red=None, limite=None):
+        self.conexiones = conexiones
+        self.segmento_minimo = segmento_minimo
+        self.reintentos = reintentos
+        self.timeout = timeout
+        # Se llama con la excepción antes de cada reintento (para las métricas)
+        self.al_reintentar = al_reintentar
+        # HostConnectionPool compartido (None = conexiones propias que se cierran al terminar)
+        self.pool = pool
+        # AdaptiveConcurrency que decide cuántas conexiones se usan contra el
+        # servidor (None = siempre self.conexiones); conexiones es el inicial
+        self.concurrencia = concurrencia
+        # Relevar conexiones que pasan ventana_atasco segundos por debajo de
+        # fraccion_atasco de la mediana; al_relevar se llama al abrir cada relevo
+        self.vigilancia = vigilancia
+        self.ventana_atasco = ventana_atasco
+        self.fraccion_atasco = fraccion_atasco
+        self.al_relevar = al_relevar
+        # RedHTTP de la sesión (None = conexión directa, sin cookies)
+        self.red = red
+        # Bytes por segundo para esta descarga (ratelimit de yt-dlp; None = sin límite)
+        self.limite = limite
+
+    def descargar(self, url, destino, headers=None, progress_hooks=(), info_dict=None):
+        """
+        Descarga url en destino usando varias conexiones
+
+        Lanza RangosNoSoportados (sin haber escrito nada) si el servidor no
+        acepta Range o el sondeo falla (conexión, TLS, proxy), para que el
+        llamador use la descarga normal de yt-dlp. Los errores de red que
+        agotan los reintentos salen como TransportError. Si quedó un .part
+        con su diario de una ejecución anterior, solo se descargan los
+        segmentos que faltan o no pasan la verificación. Devuelve los
+        segmentos escritos (inicio, fin y sha256 de cada uno).
+        """
+        headers = {**(headers or {}), 'Accept-Encoding': 'identity'}
+        if self.red is not None and not self.red.soportada(url):
+            raise RangosNoSoportados("Proxy no soportado")
+        try:
+            url, total = self._sondear(url, headers)
+        except (OSError, http.client.HTTPException) as e:
+            raise RangosNoSoportados(f"Sondeo fallido: {e}") from e
+
+        destino = str(destino)
+        parcial = destino + '.part'
+        # Más segmentos que conexiones para que las rápidas tomen más trabajo
+        tamano = max(self.segmento_minimo, -(-total // (self.conexiones * 4)))
+        # Algunos CDN (YouTube) limitan las peticiones de rangos grandes: yt-dlp lo indica
+        trozo = ((info_dict or {}).get('downloader_options') or {}).get('http_chunk_size')
+        if trozo:
+            tamano = min(tamano, trozo)
+        journal = ChunkJournal(destino, {'total': total}, segmento=tamano)
+        if os.path.isfile(parcial) and os.path.getsize(parcial) == total and journal.cargar():
+            tamano = journal.parametros['segmento']
+            hechos = journal.verificar(parcial)
+        else:
+            hechos = journal.piezas = {}
+            with open(parcial, 'wb') as f:
+                f.truncate(total)
+        journal.iniciar()
+
+        cola = queue.Queue()
+        for inicio in range(0, total, tamano):
+            segmento = (inicio, min(inicio + tamano, total) - 1)
+            if f"{segmento[0]}-{segmento[1]}" not in hechos:
+                cola.put(segmento)
+
+        progreso = _Progreso(total, destino, parcial, progress_hooks, info_dict, self.limite)
+        progreso.descargado = sum(p['fin'] - p['inicio'] + 1 for p in hechos.values())
+        errores = []
+        vigilante = None
+        if self.vigilancia:
+            vigilante = _Vigilante(self.ventana_atasco, self.fraccion_atasco, lambda tramo: self._relevar(
+                url, headers, parcial, tramo, progreso, errores, journal, vigilante))
+        # Con concurrencia adaptativa sobran hilos: esperan a que el límite del host suba
+        maximo = max(self.conexiones, self.concurrencia.maximo) if self.concurrencia else self.conexiones
+        hilos = [
+            threading.Thread(target=self._trabajador,
+                             args=(url, headers, parcial, cola, progreso, errores, journal, vigilante))
+            for _ in range(min(maximo, cola.qsize()))
+        ]
+        try:
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        finally:
+            if vigilante is not None:
+                vigilante.cerrar()
+            journal.cerrar()
+
+        if errores:
+            _lanzar_error(errores[0])
+
+        os.replace(parcial, destino)
+        piezas = list(journal.piezas.values())
+        journal.eliminar()
+        progreso.terminar()
+        return piezas
+
+    def _sondear(self, url, headers):
+        """
+        Sigue redirecciones y comprueba que el servidor acepta rangos
+
+        El estado y Content-Range se miran antes de leer el cuerpo: si el
+        servidor ignora Range y manda el archivo entero con un 200, se
+        cierra la conexión sin leerlo.
+        """
+        for _ in range(5):
+            conexion = _abrir(self.pool, url, self.timeout, self.red)
+            try:
+                respuesta = _pedir(conexion, url, headers, 0, 0, self.red)
+            except BaseException:
+                conexion.close()
+                raise
+
+            if respuesta.status in (301, 302, 303, 307, 308):
+                _descartar(self.pool, url, conexion, respuesta, self.red)
+                url = urljoin(url, respuesta.getheader('Location'))
+                continue
+
+            rango = re.match(r'bytes 0-0/(\d+)', respuesta.getheader('Content-Range') or '')
+            if respuesta.status != 206 or not rango:
+                conexion.close()
+                raise RangosNoSoportados(f"HTTP {respuesta.status} sin Content-Range")
+            _descartar(self.pool, url, conexion, respuesta, self.red)
+            return url, int(rango.group(1))
+
+        raise RangosNoSoportados("Demasiadas redirecciones")
+
+    def _trabajador(self, url, headers, parcial, cola, progreso, errores, journal, vigilante):
+        try:
+            self._descargar_segmentos(url, headers, parcial, cola, progreso, errores, journal, vigilante)
+        except Exception as e:
+            # Errores no recuperables (p. ej. lanzados por un hook) detienen a todos
+            errores.append(e)
+
+    def _descargar_segmentos(self, url, headers, parcial, cola, progreso, errores, journal, vigilante):
+        conexion = None
+        host = urlsplit(url).hostname
+        # Sin buffer: un relevo puede tener que releer lo que esta conexión ya escribió
+        with open(parcial, 'r+b', buffering=0) as f:
+            while not errores:
+                self._entrar(host)
+                try:
+                    inicio, fin = cola.get_nowait()
+                except queue.Empty:
+                    self._salir(host)
+                    break
+                try:
+                    conexion = self._descargar_segmento(url, headers, f, _Tramo(inicio, fin), conexion, host,
+                                                        progreso, errores, journal, vigilante)
+                finally:
+                    self._salir(host)
+
+        if conexion is not None:
+            if errores:
+                # Puede haber quedado una respuesta a medio leer
+                conexion.close()
+            else:
+                _soltar(self.pool, url, conexion, self.red)
+
+    def _descargar_segmento(self, url, headers, f, tramo, conexion, host, progreso, errores, journal, vigilante):
+        """Descarga un segmento con reintentos; devuelve la conexión para el siguiente"""
+        posicion = tramo.inicio
+        h = hashlib.sha256()
+        for intento in range(self.reintentos + 1):
+            try:
+                if conexion is None:
+                    conexion = _abrir(self.pool, url, self.timeout, self.red)
+                posicion = self._leer_tramo(conexion, url, headers, f, tramo, posicion, h, host,
+                                            progreso, errores, journal, vigilante)
+                if posicion <= tramo.fin and not errores and not tramo.terminado:
+                    raise http.client.IncompleteRead(b'', tramo.fin + 1 - posicion)
+                break
+            except (OSError, http.client.HTTPException) as e:
+                # Reconectar y seguir desde donde se quedó el segmento
+                if conexion is not None:
+                    conexion.close()
+                    conexion = None
+                if tramo.terminado:
+                    # Lo terminó un relevo y cortó esta conexión
+                    break
+                if self.concurrencia:
+                    self.concurrencia.error(host, e)
+                if intento == self.reintentos:
+                    errores.append(e)
+                    break
+                if self.al_reintentar:
+                    self.al_reintentar(e)
+                time.sleep(espera_reintento(intento))
+        if conexion is not None and tramo.terminado and tramo.ganadora is not conexion:
+            # Perdió contra un relevo: la respuesta quedó a medio leer
+            conexion.close()
+            conexion = None
+        return conexion
+
+    def _leer_tramo(self, conexion, url, headers, f, tramo, posicion, h, host, progreso, errores, journal,
+                    vigilante):
+        """
+        Pide el tramo desde posicion y lo escribe; devuelve la posición alcanzada
+
+        Si es la primera conexión en completarlo, lo registra en el diario.
+        h es el hash de lo leído desde el inicio del tramo; los relevos
+        empiezan a medias y pasan None (el hash se calcula releyendo).
+        """
+        respuesta = _pedir(conexion, url, headers, posicion, tramo.fin, self.red)
+        if respuesta.status != 206:
+            # Sin leer el cuerpo: puede ser el archivo entero (quien llama cierra la conexión)
+            raise http.client.HTTPException(f"HTTP {respuesta.status} en rango {posicion}-{tramo.fin}")
+
+        competidora = tramo.unir(conexion, posicion)
+        if vigilante is not None:
+            vigilante.seguir(competidora)
+        try:
+            while not errores and not tramo.terminado:
+                datos = respuesta.read(min(TAMANO_BLOQUE, tramo.fin + 1 - posicion))
+                if not datos:
+                    break
+                f.seek(posicion)
+                f.write(datos)
+                if h is not None:
+                    h.update(datos)
+                posicion += len(datos)
+                competidora.posicion = posicion
+                # Con un relevo en marcha, los bytes que ya trajo la otra conexión no cuentan dos veces
+                nuevos = tramo.cubrir(posicion)
+                if nuevos:
+                    progreso.avanzar(nuevos)
+                if self.concurrencia:
+                    self.concurrencia.transferidos(host, len(datos))
+        finally:
+            if vigilante is not None:
+                vigilante.dejar(competidora)
+            tramo.salir(competidora)
+
+        if posicion > tramo.fin and tramo.ganar(conexion):
+            resumen = h.hexdigest() if h is not None else _resumen_region(f, tramo.inicio, tramo.fin)
+            journal.registrar(f"{tramo.inicio}-{tramo.fin}", tramo.inicio, tramo.fin, resumen)
+            if self.concurrencia:
+                self.concurrencia.exito(host)
+        return posicion
+
+    def _relevar(self, url, headers, parcial, tramo, progreso, errores, journal, vigilante):
+        """Abre una conexión nueva desde el punto en que va el tramo atascado (hilo del relevo)"""
+        if self.al_relevar:
+            self.al_relevar(tramo)
+        # Conexión nueva, no del pool: puede tocar otro nodo del CDN
+        conexion = _conectar(url, self.timeout, red=self.red)
+        try:
+            with open(parcial, 'r+b', buffering=0) as f:
+                self._leer_tramo(conexion, url, headers, f, tramo, tramo.posicion, None,
+                                 urlsplit(url).hostname, progreso, errores, journal, vigilante)
+        except Exception as e:
+            # Si el relevo falla sigue la conexión original, con sus reintentos
+            conexion.close()
+            if not isinstance(e, (OSError, http.client.HTTPException)):
+                # Errores no recuperables (p. ej. lanzados por un hook) detienen a todos
+                errores.append(e)
+            return
+        if tramo.ganadora is conexion:
+            _soltar(self.pool, url, conexion, self.red)
+        else:
+            conexion.close()
+
+    def _entrar(self, host):
+        if self.concurrencia:
+            self.concurrencia.entrar(host, self.conexiones)
+
+    def _salir(self, host):
+        if self.concurrencia:
+            self.concurrencia.salir(host)
+
+
+class FragmentDownloader:
+    def __init__(self, simultaneos=4, buffer=None, reintentos=5, timeout=20, al_reintentar=None,
+                 pool=None, concurrencia=None, red=None, limite=None):
+        self.simultaneos = simultaneos
+        # Fragmentos descargados que pueden esperar en memoria a ser escritos
+        self.buffer = buffer or simultaneos * 2
+        self.reintentos = reintentos
+        self.timeout = timeout
+        # Se llama con la excepción antes de cada reintento (para las métricas)
+        self.al_reintentar = al_reintentar
+        # HostConnectionPool compartido (None = conexiones propias que se cierran al terminar)
+        self.pool = pool
+        # AdaptiveConcurrency que decide cuántos fragmentos se piden a la vez
+        # al servidor (None = siempre self.simultaneos); el buffer sigue
+        # acotando la memoria aunque el límite suba
+        self.concurrencia = concurrencia
+        # RedHTTP de la sesión (None = conexión directa, sin cookies)
+        self.red = red
+        # Bytes por segundo para esta descarga (ratelimit de yt-dlp; None = sin límite)
+        self.limite = limite
+
+    def descargar(self, info, destino, headers=None, progress_hooks=()):
+        """
+        Descarga un formato m3u8_native o http_dash_segments en destino
+
+        Lanza FragmentosNoSoportados antes de escribir nada si la lista no
+        se puede descargar aquí, para que el llamador use yt-dlp. Los
+        errores HTTP o de conexión (también los de la lista) salen como
+        TransportError, igual que en las descargas de yt-dlp, para que
+        acaben en un DownloadError. Devuelve los fragmentos escritos
+        (posición, fin y sha256 de cada uno).
+        """
+        headers = {**(headers or {}), 'Accept-Encoding': 'identity'}
+        if self.red is not None and not self.red.soportada(info['url']):
+            raise FragmentosNoSoportados("Proxy no soportado")
+        try:
+            urls = self._listar_fragmentos(info, headers)
+        except (OSError, http.client.HTTPException) as e:
+            _lanzar_error(e)
+
+        destino = str(destino)
+        parcial = destino + '.part'
+
+        # Reanudar tras el último fragmento consecutivo que pase la verificación
+        lista = hashlib.sha1('\n'.join(urlsplit(u).path for u in urls).encode('utf-8')).hexdigest()
+        journal = ChunkJournal(destino, {'fragmentos': len(urls), 'lista': lista})
+        primero = posicion = 0
+        if os.path.isfile(parcial) and journal.cargar():
+            validas = journal.verificar(parcial)
+            while str(primero) in validas:
+                posicion = validas[str(primero)]['fin'] + 1
+                primero += 1
+            journal.piezas = {str(i): validas[str(i)] for i in range(primero)}
+        else:
+            journal.piezas = {}
+        with open(parcial, 'ab') as f:
+            f.truncate(posicion)
+        journal.iniciar()
+
+        cola = queue.Queue()
+        for indice in range(primero, len(urls)):
+            cola.put((indice, urls[indice]))
+
+        listos = {}
+        errores = []
+        cond = threading.Condition()
+        permisos = threading.Semaphore(self.buffer)
+        # Los fragmentos de una lista salen del mismo servidor
+        host = urlsplit(urls[0]).hostname
+        maximo = min(max(self.simultaneos, self.concurrencia.maximo), self.buffer) if self.concurrencia \
+            else self.simultaneos
+        hilos = [
+            threading.Thread(target=self._trabajador,
+                             args=(cola, headers, listos, errores, cond, permisos, host))
+            for _ in range(min(maximo, len(urls)))
+        ]
+        for hilo in hilos:
+            hilo.daemon = True
+            hilo.start()
+
+        progreso = _Progreso(None, destino, parcial, progress_hooks, info, self.limite)
+        progreso.descargado = posicion
+        try:
+            with open(parcial, 'ab') as f:
+                for indice in range(primero, len(urls)):
+                    with cond:
+                        cond.wait_for(lambda: indice in listos or errores)
+                        if errores:
+                            _lanzar_error(errores[0])
+                        datos = listos.pop(indice)
+                    f.write(datos)
+                    f.flush()
+                    journal.registrar(str(indice), posicion, posicion + len(datos) - 1,
+                                      hashlib.sha256(datos).hexdigest())
+                    posicion += len(datos)
+                    permisos.release()
+                    progreso.avanzar(len(datos), indice + 1, len(urls))
+        except BaseException:
+            with cond:
+                errores.append(FragmentosNoSoportados("Descarga interrumpida"))
+            # Despertar a los hilos que esperan permiso para que puedan salir
+            for _ in hilos:
+                permisos.release()
+            raise
+        finally:
+            for hilo in hilos:
+                hilo.join()
+            journal.cerrar()
+
+        os.replace(parcial, destino)
+        piezas = list(journal.piezas.values())
+        journal.eliminar()
+        progreso.terminar()
+        return piezas
+
+    def _listar_fragmentos(self, info, headers):
+        if info.get('protocol') == 'http_dash_segments':
+            base = info.get('fragment_base_url') or ''
+            fragmentos = info.get('fragments') or []
+            if not fragmentos or any('byte_range' in f for f in fragmentos):
+                raise FragmentosNoSoportados("DASH sin fragmentos o con byteranges")
+            return [f.get('url') or urljoin(base, f['path']) for f in fragmentos]
+
+        if info.get('protocol') != 'm3u8_native':
+            raise FragmentosNoSoportados(f"Protocolo {info.get('protocol')}")
+
+        lista = info['url']
+        conexiones = {}
+        try:
+            texto = _obtener(conexiones, lista, headers, self.timeout, self.pool, self.red)
+            texto = texto.decode('utf-8', 'replace')
+        except BaseException:
+            _cerrar(conexiones)
+            raise
+        _soltar_todas(self.pool, conexiones, self.red)
+        if '#EXT-X-STREAM-INF' in texto or '#EXT-X-ENDLIST' not in texto:
+            raise FragmentosNoSoportados("Lista maestra o emisión en vivo")
+
+        urls = []
+        for linea in texto.splitlines():
+            linea = linea.strip()
+            if linea.startswith('#EXT-X-KEY') and 'METHOD=NONE' not in linea:
+                raise FragmentosNoSoportados("HLS cifrado")
+            if linea.startswith('#EXT-X-BYTERANGE') or (linea.startswith('#EXT-X-MAP') and 'BYTERANGE' in linea):
+                raise FragmentosNoSoportados("HLS con byteranges")
+            if linea.startswith('#EXT-X-MAP'):
+                urls.append(urljoin(lista, re.search(r'URI="([^"]+)"', linea).group(1)))
+            elif linea and not linea.startswith('#'):
+                urls.append(urljoin(lista, linea))
+        if not urls:
+            raise FragmentosNoSoportados("Lista vacía")
+        return urls
+
+    def _trabajador(self, cola, headers, listos, errores, cond, permisos, host):
+        conexiones = {}
+        try:
+            while not errores:
+                # Pedir permiso antes de tomar un fragmento mantiene la memoria acotada:
+                # como se reparten en orden, el siguiente a escribir siempre está en curso
+                permisos.acquire()
+                if errores:
+                    break
+                # Con concurrencia adaptativa, el hueco se toma antes que el
+                # fragmento para que siempre avance el más antiguo
+                self._entrar(host)
+                try:
+                    indice, url = cola.get_nowait()
+                except queue.Empty:
+                    self._salir(host)
+                    permisos.release()
+                    break
+
+                try:
+                    datos = self._obtener_fragmento(conexiones, url, headers, errores, host)
+                finally:
+                    self._salir(host)
+
+                with cond:
+                    listos[indice] = datos
+                    cond.notify_all()
+        except Exception as e:
+            _cerrar(conexiones)
+            with cond:
+                errores.append(e)
+                cond.notify_all()
+        finally:
+            # Las que siguen abiertas tienen su última respuesta leída entera
+            _soltar_todas(self.pool, conexiones, self.red)
+
+    def _obtener_fragmento(self, conexiones, url, headers, errores, host):
+        for intento in range(self.reintentos + 1):
+            try:
+                datos = _obtener(conexiones, url, headers, self.timeout, self.pool, self.red)
+                break
+            except (OSError, http.client.HTTPException) as e:
+                _cerrar(conexiones)
+                if self.concurrencia:
+                    self.concurrencia.error(host, e)
+                if intento == self.reintentos or errores:
+                    raise
+                if self.al_reintentar:
+                    self.al_reintentar(e)
+                time.sleep(espera_reintento(intento, tope=10))
+        if self.concurrencia:
+            self.concurrencia.exito(host)
+            self.concurrencia.transferidos(host, len(datos))
+        return datos
+
+    def _entrar(self, host):
+        if self.concurrencia:
+            self.concurrencia.entrar(host, self.simultaneos)
+
+    def _salir(self, host):
+        if self.concurrencia:
+            self.concurrencia.salir(host)
+
+
+class StreamingMerger:
+    def __init__(self, ffmpeg=None, reintentos=3, timeout=20, al_reintentar=None, pool=None, red=None,
+                 limite=None):
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self.reintentos = reintentos
+        self.timeout = timeout
+        # Se llama con la excepción antes de cada reintento (para las métricas)
+        self.al_reintentar = al_reintentar
+        # HostConnectionPool compartido (None = conexiones propias que se cierran al terminar)
+        self.pool = pool
+        # RedHTTP de la sesión (None = conexión directa, sin cookies)
+        self.red = red
+        # Bytes por segundo para esta descarga (ratelimit de yt-dlp; None = sin límite)
+        self.limite = limite
+
+    def fusionar(self, formatos, destino, contenedor='mp4', progress_hooks=(), info_dict=None):
+        """
+        Descarga los formatos y los une con FFmpeg en destino sin archivos intermedios
+
+        Cada formato se lee de una tubería propia (pass_fds), así que no
+        hace falta que FFmpeg pueda buscar en la entrada, pero sí que el
+        formato se pueda leer en orden: WebM o MP4 fragmentado (DASH). La
+        salida es un archivo normal, donde FFmpeg escribe el índice al final
+        en la misma pasada. Lanza FusionNoSoportada sin haber dejado nada
+        escrito si no se puede (también si un formato no se puede abrir o
+        la red falla tras los reintentos), para que el llamador descargue y
+        fusione como siempre. Devuelve el sha256 de cada formato tal como se
+        descargó, como una lista de piezas por formato.
+        """
+        if os.name == 'nt':
+            # subprocess no puede heredar más tuberías que stdin en Windows
+            raise FusionNoSoportada("Windows")
+        mapas = []
+        for i, f in enumerate(formatos):
+            if f.get('vcodec') != 'none':
+                mapas += ['-map', f'{i}:v:0?']
+            if f.get('acodec') != 'none':
+                mapas += ['-map', f'{i}:a:0?']
+        # FFmpeg llama matroska al contenedor de los .mkv
+        return self._canalizar(formatos, destino,
+                               [*mapas, '-c', 'copy', '-f', FORMATOS_FFMPEG.get(contenedor, contenedor)],
+                               progress_hooks, info_dict)
+
+    def convertir(self, formato, destino, argumentos, progress_hooks=(), info_dict=None):
+        """
+        Descarga un formato de solo audio y lo pasa por FFmpeg con los argumentos de salida
+
+        Una sola entrada va por stdin, así que también funciona en Windows.
+        Lanza FusionNoSoportada antes de escribir nada si no se puede.
+        Devuelve el sha256 del formato descargado como una lista de piezas.
+        """
+        return self._canalizar([formato], destino, argumentos, progress_hooks, info_dict)[0]
+
+    def _canalizar(self, formatos, destino, argumentos, progress_hooks, info_dict):
+        if not self.ffmpeg:
+            raise FusionNoSoportada("FFmpeg no está instalado")
+        for f in formatos:
+            if f.get('protocol') not in ('http', 'https'):
+                raise FusionNoSoportada(f"Protocolo {f.get('protocol')}")
+            if self.red is not None and not self.red.soportada(f['url']):
+                raise FusionNoSoportada("Proxy no soportado")
+            if f.get('ext') not in EXTENSIONES_EN_ORDEN and not (f.get('container') or '').endswith('_dash'):
+                raise FusionNoSoportada(f"{f.get('format_id')}: no se puede leer en orden")
+
+        destino = str(destino)
+        parcial = destino + '.part'
+        respuestas = []
+        try:
+            for f in formatos:
+                respuestas.append(self._abrir_reintentando(f, 0))
+        except BaseException as e:
+            for conexion, *_ in respuestas:
+                conexion.close()
+            if isinstance(e, (OSError, http.client.HTTPException)):
+                # URL caducada (403/404) o servidor caído: la vía normal de
+                # yt-dlp lo vuelve a intentar y, si falla, da un DownloadError
+                raise FusionNoSoportada(f"No se pudo abrir {f.get('format_id')}: {e}") from e
+            raise
+        if any(total is None for _, _, total, _ in respuestas):
+            for conexion, *_ in respuestas:
+                conexion.close()
+            raise FusionNoSoportada("Tamaño desconocido")
+
+        tuberias = [os.pipe() for _ in formatos]
+        comando = [self.ffmpeg, '-v', 'error', '-y']
+        if len(tuberias) == 1:
+            comando += ['-i', 'pipe:0']
+            herencia = {'stdin': tuberias[0][0]}
+        else:
+            for lectura, _ in tuberias:
+                comando += ['-i', f'pipe:{lectura}']
+            herencia = {'stdin': subprocess.DEVNULL, 'pass_fds': [lectura for lectura, _ in tuberias]}
+        comando += [*argumentos, parcial]
+        try:
+            proceso = subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                       **herencia)
+        finally:
+            for lectura, _ in tuberias:
+                os.close(lectura)
+
+        mensajes = []
+        lector = threading.Thread(target=lambda: mensajes.append(proceso.stderr.read()), daemon=True)
+        lector.start()
+        progreso = _Progreso(sum(total for _, _, total, _ in respuestas), destino, parcial,
+                             progress_hooks, info_dict, self.limite)
+        errores = []
+        # Lo que se va pasando a FFmpeg se resume al vuelo: [piezas] por formato
+        resumenes = [[] for _ in formatos]
+        hilos = [
+            threading.Thread(target=self._alimentar, args=(f, respuesta, escritura, progreso, errores, resumen))
+            for f, respuesta, (_, escritura), resumen in zip(formatos, respuestas, tuberias, resumenes)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        if errores:
+            proceso.kill()
+        proceso.wait()
+        lector.join()
+
+        if errores or proceso.returncode != 0:
+            if os.path.exists(parcial):
+                os.remove(parcial)
+            if errores and not isinstance(errores[0], (OSError, http.client.HTTPException)):
+                raise errores[0]
+            if errores and not isinstance(errores[0], BrokenPipeError):
+                # La red falló a mitad tras los reintentos: que el llamador use la vía normal
+                raise FusionNoSoportada(f"Error de red: {errores[0]}") from errores[0]
+            # FFmpeg no pudo con las entradas: que el llamador use la vía normal
+            mensaje = (mensajes[0] if mensajes else b'').decode('utf-8', 'replace').strip()
+            raise FusionNoSoportada(f"FFmpeg: {mensaje.splitlines()[-1] if mensaje else proceso.returncode}")
+
+        os.replace(parcial, destino)
+        progreso.terminar()
+        return resumenes
+
+    def _abrir_reintentando(self, formato, inicio):
+        for intento in range(self.reintentos + 1):
+            try:
+                return self._abrir_flujo(formato['url'], formato.get('http_headers') or {}, inicio)
+            except (OSError, http.client.HTTPException) as e:
+                if intento == self.reintentos:
+                    raise
+                if self.al_reintentar:
+                    self.al_reintentar(e)
+                time.sleep(espera_reintento(intento))
+
+    def _abrir_flujo(self, url, headers, inicio):
+        """(conexión, respuesta, bytes que faltan desde inicio, URL final) siguiendo redirecciones"""
+        headers = {**headers, 'Accept-Encoding': 'identity'}
+        if inicio:
+            headers['Range'] = f'bytes={inicio}-'
+        for _ in range(5):
+            conexion = _abrir(self.pool, url, self.timeout, self.red)
+            try:
+                respuesta = _pedir(conexion, url, headers, red=self.red)
+            except BaseException:
+                conexion.close()
+                raise
+            if respuesta.status in (301, 302, 303, 307, 308):
+                _descartar(self.pool, url, conexion, respuesta, self.red)
+                url = urljoin(url, respuesta.getheader('Location'))
+                continue
+            if respuesta.status != (206 if inicio else 200):
+                conexion.close()
+                raise http.client.HTTPException(f"HTTP {respuesta.status} en {url}")
+            longitud = respuesta.getheader('Content-Length')
+            return conexion, respuesta, int(longitud) if longitud and longitud.isdigit() else None, url
+        raise http.client.HTTPException("Demasiadas redirecciones")
+
+    def _alimentar(self, formato, abierta, escritura, progreso, errores, resumen):
+        """Copia un formato de la red a su tubería, reanudando con Range si se corta"""
+        conexion, respuesta, total, url = abierta
+        posicion = 0
+        h = hashlib.sha256()
+        try:
+            with open(escritura, 'wb') as tuberia:
+                for intento in range(self.reintentos + 1):
+                    try:
+                        if respuesta is None:
+                            conexion, respuesta, _, url = self._abrir_reintentando(formato, posicion)
+                        while not errores:
+                            datos = respuesta.read(TAMANO_BLOQUE)
+                            if not datos:
+                                break
+                            tuberia.write(datos)
+                            h.update(datos)
+                            posicion += len(datos)
+                            progreso.avanzar(len(datos))
+                        if posicion < total and not errores:
+                            raise http.client.IncompleteRead(b'', total - posicion)
+                        break
+                    except BrokenPipeError:
+                        raise
+                    except (OSError, http.client.HTTPException) as e:
+                        conexion.close()
+                        respuesta = None
+                        if intento == self.reintentos or errores:
+                            raise
+                        if self.al_reintentar:
+                            self.al_reintentar(e)
+                        time.sleep(espera_reintento(intento))
+            if errores:
+                conexion.close()
+            else:
+                _soltar(self.pool, url, conexion, self.red)
+                resumen.append({'inicio': 0, 'fin': posicion - 1, 'sha256': h.hexdigest()})
+        except Exception as e:
+            conexion.close()
+            errores.append(e)
+
+
+class _Tramo:
+    """Segmento en curso; con un relevo lo leen dos conexiones y gana la primera en acabar"""
+
+    def __init__(self, inicio, fin):
+        self.inicio = inicio
+        self.fin = fin
+        # Hasta dónde lo ha traído alguna de las conexiones
+        self.posicion = inicio
+        self.terminado = False
+        self.ganadora = None
+        self.relevado = False
+        self._competidoras = []
+        self._lock = threading.Lock()
+
+    def unir(self, conexion, posicion):
+        competidora = _Competidora(self, conexion, posicion)
+        with self._lock:
+            self._competidoras.append(competidora)
+        return competidora
+
+    def salir(self, competidora):
+        with self._lock:
+            self._competidoras.remove(competidora)
+
+    def cubrir(self, posicion):
+        """Avanza el tramo hasta posicion; devuelve los bytes que ninguna conexión había traído"""
+        with self._lock:
+            nuevos = max(0, posicion - self.posicion)
+            self.posicion += nuevos
+            return nuevos
+
+    def restante(self):
+        return self.fin + 1 - self.posicion
+
+    def ganar(self, conexion):
+        """Marca el tramo como terminado por conexion y corta las demás; False si ya lo terminó otra"""
+        with self._lock:
+            if self.terminado:
+                return False
+            self.terminado = True
+            self.ganadora = conexion
+            otras = [c.conexion for c in self._competidoras if c.conexion is not conexion]
+        for otra in otras:
+            _cortar(otra)
+        return True
+
+
+class _Competidora:
+    """Una conexión leyendo un tramo, con las posiciones que ha visto el vigilante"""
+
+    def __init__(self, tramo, conexion, posicion):
+        self.tramo = tramo
+        self.conexion = conexion
+        self.posicion = posicion
+        self.marcas = deque([(time.monotonic(), posicion)])
+
+    def velocidad(self, ahora, ventana):
+        """
+        Bytes por segundo en la última ventana y si la conexión lleva ya una ventana entera
+
+        Las conexiones cortas (segmentos pequeños en un servidor rápido)
+        también cuentan para la mediana, aunque no lleguen a la ventana.
+        """
+        posicion = self.posicion
+        self.marcas.append((ahora, posicion))
+        while len(self.marcas) > 2 and self.marcas[1][0] <= ahora - ventana:
+            self.marcas.popleft()
+        desde, inicial = self.marcas[0]
+        return (posicion - inicial) / (ahora - desde), ahora - desde >= ventana
+
+
+class _Vigilante:
+    """Revisa cada medio segundo las conexiones de una descarga y releva las atascadas"""
+
+    def __init__(self, ventana, fraccion, relevar):
+        self.ventana = ventana
+        self.fraccion = fraccion
+        self.relevar = relevar
+        self._muestras = deque(maxlen=MUESTRAS_MEDIANA)
+        self._competidoras = set()
+        self._relevos = []
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._vigilar, daemon=True)
+        self._hilo.start()
+
+    def seguir(self, competidora):
+        with self._lock:
+            self._competidoras.add(competidora)
+
+    def dejar(self, competidora):
+        with self._lock:
+            self._competidoras.discard(competidora)
+
+    def cerrar(self):
+        """Detiene la vigilancia y espera a los relevos que sigan en marcha"""
+        self._parar.set()
+        self._hilo.join()
+        for hilo in self._relevos:
+            hilo.join()
+
+    def _vigilar(self):
+        while not self._parar.wait(0.5):
+            self._revisar(time.monotonic())
+
+    def _revisar(self, ahora):
+        with self._lock:
+            competidoras = list(self._competidoras)
+        umbral = None
+        if len(self._muestras) >= MUESTRAS_MINIMAS:
+            umbral = self.fraccion * statistics.median(self._muestras)
+        for competidora in competidoras:
+            velocidad, completa = competidora.velocidad(ahora, self.ventana)
+            tramo = competidora.tramo
+            if umbral is None or velocidad >= umbral or tramo.relevado:
+                # Las conexiones atascadas no cuentan para la mediana hasta tener
+                # relevo: si el relevo también va lento, la red es lenta para todos
+                self._muestras.append(velocidad)
+            elif completa and not tramo.terminado and tramo.restante() >= RELEVO_MINIMO:
+                # Un relevo por tramo: si también se atasca, quedan los reintentos
+                tramo.relevado = True
+                hilo = threading.Thread(target=self.relevar, args=(tramo,), daemon=True)
+                hilo.start()
+                self._relevos.append(hilo)
+
+
+class _Progreso:
+    """Acumula el progreso de todas las conexiones y llama a los hooks de yt-dlp"""
+
+    def __init__(self, total, destino, parcial, hooks, info_dict, limite=None):
+        self.total = total
+        self.descargado = 0
+        self.destino = destino
+        self.parcial = parcial
+        self.hooks = hooks
+        self.info_dict = info_dict or {}
+        # Bytes por segundo: el hilo que se adelanta a la media duerme (lo
+        # reanudado de una ejecución anterior no cuenta)
+        self.limite = limite
+        self._transferidos = 0
+        self.inicio = time.monotonic()
+        self._ultimo_aviso = 0
+        self._lock = threading.Lock()
+
+    def avanzar(self, n, fragmento=None, fragmentos=None):
+        with self._lock:
+            self.descargado += n
+            self._transferidos += n
+            ahora = time.monotonic()
+            espera = self._transferidos / self.limite - (ahora - self.inicio) if self.limite else 0
+            ultimo_fragmento = fragmentos is not None and fragmento == fragmentos
+            if ahora - self._ultimo_aviso >= 0.1 or ultimo_fragmento:
+                self._ultimo_aviso = ahora
+                self._aviso(ahora, fragmento, fragmentos)
+        if espera > 0:
+            time.sleep(espera)
+
+    def _aviso(self, ahora, fragmento, fragmentos):
+        """Llama a los hooks con el progreso (con el lock tomado)"""
+        transcurrido = ahora - self.inicio
+        velocidad = self.descargado / transcurrido if transcurrido else None
+
+        datos = {
+            'status': 'downloading',
+            'downloaded_bytes': self.descargado,
+            'tmpfilename': self.parcial,
+            'elapsed': transcurrido,
+            'speed': velocidad,
+            '_speed_str': FileDownloader.format_speed(velocidad),
+        }
+        if fragmentos:
+            # Con fragmentos el total se estima a partir de lo ya descargado
+            total = self.descargado * fragmentos / fragmento
+            datos.update(total_bytes_estimate=total, fragment_index=fragmento, fragment_count=fragmentos)
+            clave_total = 'total_bytes_estimate'
+        else:
+            total = self.total
+            datos['total_bytes'] = total
+            clave_total = 'total_bytes'
+
+        eta = (total - self.descargado) / velocidad if velocidad else None
+        datos.update({
+            'eta': eta,
+            '_percent_str': FileDownloader.format_percent(100 * self.descargado / total),
+            '_eta_str': FileDownloader.format_eta(eta),
+            '_total_bytes_str': format_bytes(datos[clave_total]),
+        })
+        self._avisar(datos)
+
+    def terminar(self):
+        self._avisar({
+            'status': 'finished',
+            'downloaded_bytes': self.descargado,
+            'total_bytes': self.descargado,
+            'elapsed': time.monotonic() - self.inicio,
+        })
+
+    def _avisar(self, datos):
+        datos.update(filename=self.destino, info_dict=self.info_dict)
+        for hook in self.hooks:
+            hook(datos)
+
+
+def _clave_host(url):
+    partes = urlsplit(url)
+    return partes.scheme, partes.netloc
+
+
+def _clave_pool(url, red):
+    """Las conexiones por un proxy no sirven para ir directo (ni por otro proxy)"""
+    return (*_clave_host(url), red.proxy_para(url) if red is not None else None)
+
+
+def _viva(conexion):
+    """False si el servidor cerró la conexión (el socket se vuelve legible al recibir el cierre)"""
+    if conexion.sock is None:
+        return False
+    try:
+        legible, _, _ = select.select([conexion.sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not legible
+
+
+def _abrir(pool, url, timeout, red=None):
+    return pool.tomar(url, timeout, red) if pool is not None else _conectar(url, timeout, red=red)
+
+
+def _soltar(pool, url, conexion, red=None):
+    if pool is not None:
+        pool.devolver(url, conexion, red)
+    else:
+        conexion.close()
+
+
+def _soltar_todas(pool, conexiones, red=None):
+    for (esquema, host), conexion in conexiones.items():
+        _soltar(pool, f'{esquema}://{host}/', conexion, red)
+    conexiones.clear()
+
+
+def _descartar(pool, url, conexion, respuesta, red=None):
+    """Acaba una respuesta que no interesa: si es corta se lee y la conexión se reutiliza, si no se cierra"""
+    longitud = respuesta.getheader('Content-Length')
+    if longitud and longitud.isdigit() and int(longitud) <= TAMANO_BLOQUE:
+        respuesta.read()
+        _soltar(pool, url, conexion, red)
+    else:
+        conexion.close()
+
+
+def _cortar(conexion):
+    """Desbloquea al hilo que lee de la conexión (verá fin de datos o un error)"""
+    if conexion.sock is not None:
+        try:
+            conexion.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _resumen_region(f, inicio, fin):
+    """SHA-256 de los bytes inicio..fin (inclusive) ya escritos en f"""
+    h = hashlib.sha256()
+    f.seek(inicio)
+    restante = fin + 1 - inicio
+    while restante:
+        datos = f.read(min(TAMANO_BLOQUE * 16, restante))
+        if not datos:
+            break
+        h.update(datos)
+        restante -= len(datos)
+    return h.hexdigest()
+
+
+def _conectar(url, timeout, contexto=None, red=None):
+    if red is not None:
+        return red.conectar(url, timeout)
+    partes = urlsplit(url)
+    if partes.scheme == 'https':
+        return http.client.HTTPSConnection(partes.hostname, partes.port, timeout=timeout, context=contexto)
+    return http.client.HTTPConnection(partes.hostname, partes.port, timeout=timeout)
+
+
+def _pedir(conexion, url, headers, inicio=None, fin=None, red=None):
+    partes = urlsplit(url)
+    ruta = (partes.path or '/') + (f'?{partes.query}' if partes.query else '')
+    if inicio is not None:
+        headers = {**headers, 'Range': f'bytes={inicio}-{fin}'}
+    if red is not None:
+        headers = red.cabeceras(url, headers)
+    conexion.request('GET', ruta, headers=headers)
+    return conexion.getresponse()
+
+
+def _obtener(conexiones, url, headers, timeout, pool=None, red=None):
+    """GET completo reutilizando una conexión keep-alive por host"""
+    for _ in range(5):
+        clave = _clave_host(url)
+        if clave not in conexiones:
+            conexiones[clave] = _abrir(pool, url, timeout, red)
+        respuesta = _pedir(conexiones[clave], url, headers, red=red)
+        if respuesta.status in (301, 302, 303, 307, 308):
+            respuesta.read()
+            url = urljoin(url, respuesta.getheader('Location'))
+            continue
+        if respuesta.status != 200:
+            # Sin leer el cuerpo; quien llama cierra la conexión
+            raise http.client.HTTPException(f"HTTP {respuesta.status} en {url}")
+        return respuesta.read()
+    raise http.client.HTTPException("Demasiadas redirecciones")
+
+
+def _lanzar_error(error):
+    """
+    Relanza un error; los de red como TransportError de yt-dlp
+
+    process_info los convierte en DownloadError como los de sus propias
+    descargas, y así quien llama puede reintentar (p. ej. con la
+    información de nuevo extraída si la de la caché caducó).
+    """
+    if isinstance(error, (OSError, http.client.HTTPException)) and not isinstance(error, BrokenPipeError):
+        raise TransportError(str(error) or type(error).__name__, cause=error) from error
+    raise error
+
+
+def _cerrar(conexiones):
+    for conexion in conexiones.values():
+        conexion.close()
+    conexiones.clear()
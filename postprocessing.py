@@ -0,0 +1,117 @@
+"""
+Etapa de posprocesado separada de la descarga
+
+yt-dlp fusiona video y audio con FFmpeg dentro de la misma llamada que los
+descarga, así que la red queda parada mientras se muxea. Aquí el
+posprocesado (fusión, correcciones de contenedor, registro en el archivo)
+se envía a un grupo acotado de trabajadores y el hilo de descarga puede
+pasar al siguiente video.
+
+Cada trabajador lanza un proceso de FFmpeg, así que el tamaño del grupo es
+también el número máximo de FFmpeg a la vez. Las conversiones del modo solo
+audio van a un grupo propio con un trabajador por núcleo: los codificadores
+de audio usan un solo hilo. encadenar enlaza etapas de grupos distintos
+(posprocesado y después verificación) sin dejar un hilo esperando.
+"""
+
+import os
+import shutil
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Códecs que un MP4 admite tal cual: la fusión es una copia de streams
+CODECS_VIDEO_MP4 = ('avc1', 'avc3', 'h264', 'hvc1', 'hev1', 'h265', 'hevc', 'av01', 'vp09', 'vp9')
+CODECS_AUDIO_MP4 = ('mp4a', 'aac', 'mp3', 'opus', 'ac-3', 'ec-3', 'flac', 'alac')
+
+# Modo solo audio: contenedor → (códecs que caben tal cual, codificador de FFmpeg, nombre para -f)
+CONTENEDORES_AUDIO = {
+    'm4a': (('mp4a', 'aac', 'alac'), 'aac', 'ipod'),
+    'mp3': (('mp3',), 'libmp3lame', 'mp3'),
+    'opus': (('opus',), 'libopus', 'opus'),
+}
+
+
+class PostProcessPool:
+    def __init__(self, trabajadores=None, nombre='posprocesado'):
+        # FFmpeg ya usa varios hilos por proceso: con la mitad de los núcleos basta
+        self.trabajadores = trabajadores or max(1, (os.cpu_count() or 2) // 2)
+        self._pool = ThreadPoolExecutor(max_workers=self.trabajadores,
+                                        thread_name_prefix=nombre)
+
+    def enviar(self, funcion, *args):
+        """Encola un trabajo de posprocesado; devuelve un Future"""
+        return self._pool.submit(funcion, *args)
+
+    def cerrar(self, esperar=True):
+        self._pool.shutdown(wait=esperar)
+
+
+def encadenar(previo, pool, funcion):
+    """
+    Future de funcion(resultado de previo) en pool, lanzada cuando previo termina bien
+
+    Con previo None se lanza funcion(None) ya. Si funcion devuelve otro
+    Future (p. ej. el de una descarga repetida), el resultado es el suyo.
+    """
+    siguiente = Future()
+
+    def seguir(futuro):
+        if futuro.exception() is not None:
+            siguiente.set_exception(futuro.exception())
+        elif isinstance(futuro.result(), Future):
+            futuro.result().add_done_callback(seguir)
+        else:
+            siguiente.set_result(futuro.result())
+
+    def lanzar(futuro):
+        if futuro is not None and futuro.exception() is not None:
+            siguiente.set_exception(futuro.exception())
+            return
+        pool.enviar(funcion, None if futuro is None else futuro.result()).add_done_callback(seguir)
+
+    if previo is None:
+        lanzar(None)
+    else:
+        previo.add_done_callback(lanzar)
+    return siguiente
+
+
+def compatible_mp4(formatos):
+    """True si todos los streams se pueden copiar a un MP4 sin recodificar"""
+    for f in formatos:
+        for clave, permitidos in (('vcodec', CODECS_VIDEO_MP4), ('acodec', CODECS_AUDIO_MP4)):
+            codec = (f.get(clave) or 'none').lower()
+            if codec != 'none' and not codec.startswith(permitidos):
+                return False
+    return True
+
+
+def copia_audio(acodec, contenedor):
+    """True si el códec de audio cabe en el contenedor sin recodificar"""
+    return (acodec or 'none').lower().startswith(CONTENEDORES_AUDIO[contenedor][0])
+
+
+def argumentos_audio(contenedor, kbps, copiar):
+    """Argumentos de salida de FFmpeg para dejar solo el audio en el contenedor"""
+    _, codificador, formato = CONTENEDORES_AUDIO[contenedor]
+    if copiar:
+        return ['-vn', '-c:a', 'copy', '-f', formato]
+    return ['-vn', '-c:a', codificador, '-b:a', f'{kbps}k', '-f', formato]
+
+
+def convertir_audio(origen, destino, argumentos):
+    """Convierte un archivo ya descargado con FFmpeg y borra el original"""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        raise RuntimeError("FFmpeg no está instalado: no se puede convertir el audio")
+    parcial = f"{destino}.part"
+    resultado = subprocess.run([ffmpeg, '-v', 'error', '-nostdin', '-y', '-i', str(origen), *argumentos, parcial],
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if resultado.returncode != 0:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        mensaje = resultado.stderr.decode('utf-8', 'replace').strip()
+        raise RuntimeError(f"FFmpeg: {mensaje.splitlines()[-1] if mensaje else resultado.returncode}")
+    os.replace(parcial, destino)
+    if os.path.abspath(origen) != os.path.abspath(destino):
+        os.remove(origen)
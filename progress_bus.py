@@ -0,0 +1,51 @@
+"""
+Bus de eventos de progreso entre los hilos de descarga y Tk
+
+Los hilos de descarga publican en el bus sin tocar la interfaz. Un único
+sondeo con window.after lo vacía a una frecuencia fija y aplica los
+cambios en el hilo de Tk, así el coste de la UI no depende de lo rápido
+que lleguen los ticks de yt-dlp.
+"""
+
+import logging
+import threading
+from collections import deque
+
+
+class ProgressBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._eventos = deque()
+        self._progreso = {}
+
+    def publicar(self, funcion, *args):
+        """Encola una llamada que se ejecutará en el hilo de Tk (se conservan todas)"""
+        with self._lock:
+            self._eventos.append((funcion, args))
+
+    def publicar_progreso(self, trabajo, funcion, *args):
+        """Publica el progreso de un trabajo; solo se conserva el último por trabajo"""
+        with self._lock:
+            self._progreso[trabajo] = (funcion, args)
+
+    def drenar(self):
+        """Devuelve y vacía los eventos pendientes, en orden de aplicación"""
+        with self._lock:
+            eventos, self._eventos = self._eventos, deque()
+            progreso, self._progreso = self._progreso, {}
+        return list(eventos) + list(progreso.values())
+
+    def iniciar_sondeo(self, window, fps=30):
+        """Vacía el bus desde el hilo de Tk fps veces por segundo"""
+        intervalo = max(1, int(1000 / fps))
+
+        def sondear():
+            for funcion, args in self.drenar():
+                try:
+                    funcion(*args)
+                except Exception:
+                    # Un suscriptor que falla no para a los demás ni al sondeo
+                    logging.exception("Error en %r del bus de progreso", funcion)
+            window.after(intervalo, sondear)
+
+        window.after(intervalo, sondear)
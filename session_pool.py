@@ -0,0 +1,115 @@
+"""
+Sesiones de yt-dlp reutilizables entre descargas
+
+Crear un YoutubeDL por descarga obliga a inicializar otra vez los
+extractores, el tarro de cookies y las conexiones HTTP (con su handshake
+TLS) contra los mismos CDN. YoutubeDLPool guarda las instancias libres
+agrupadas por sus opciones de sesión y las presta a un hilo cada vez: una
+instancia nunca la usan dos descargas a la vez.
+
+Las opciones de POR_TRABAJO (formato, hooks de progreso, plantilla de
+salida...) se aplican al prestar la sesión sin reconstruirla. Al
+devolverla se restauran sus parámetros y se quitan los métodos que la
+descarga haya sustituido en la instancia (dl, to_screen, post_process...).
+"""
+
+import copy
+import threading
+from contextlib import contextmanager
+
+import yt_dlp
+
+# Opciones que cambian en cada descarga sin crear otra sesión
+POR_TRABAJO = ('format', 'progress_hooks', 'merge_output_format', 'outtmpl')
+
+# Sesiones libres que se guardan por cada combinación de opciones
+MAX_LIBRES = 8
+
+
+class YoutubeDLPool:
+    def __init__(self, max_libres=MAX_LIBRES):
+        self.max_libres = max_libres
+        self._lock = threading.Lock()
+        self._libres = {}
+        self._cerrado = False
+
+    def tomar(self, opciones):
+        """Presta un YoutubeDL con las opciones indicadas; hay que devolverlo con devolver()"""
+        base = {k: v for k, v in opciones.items() if k not in POR_TRABAJO}
+        clave = _congelar(base)
+        with self._lock:
+            libres = self._libres.get(clave)
+            ydl = libres.pop() if libres else None
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL(base)
+            ydl._sesion = (clave, _copiar_params(ydl.params), ydl.format_selector)
+        self._aplicar(ydl, opciones)
+        return ydl
+
+    def devolver(self, ydl):
+        """Deja la sesión como se creó y la guarda para la siguiente descarga"""
+        clave, params, format_selector = ydl._sesion
+        # Métodos sustituidos en la instancia durante la descarga
+        for nombre in [n for n in vars(ydl) if callable(getattr(type(ydl), n, None))]:
+            delattr(ydl, nombre)
+        ydl.params.clear()
+        ydl.params.update(_copiar_params(params))
+        ydl.format_selector = format_selector
+        ydl._progress_hooks = []
+        ydl._download_retcode = 0
+        with self._lock:
+            libres = self._libres.setdefault(clave, [])
+            if not self._cerrado and len(libres) < self.max_libres:
+                libres.append(ydl)
+                return
+        ydl.close()
+
+    @contextmanager
+    def sesion(self, opciones):
+        """Presta una sesión durante el bloque with"""
+        ydl = self.tomar(opciones)
+        try:
+            yield ydl
+        finally:
+            self.devolver(ydl)
+
+    def cerrar(self):
+        """Cierra las sesiones libres (guarda cookies y cierra conexiones)"""
+        with self._lock:
+            self._cerrado = True
+            libres, self._libres = self._libres, {}
+        for sesiones in libres.values():
+            for ydl in sesiones:
+                ydl.close()
+
+    def _aplicar(self, ydl, opciones):
+        """Aplica las opciones por trabajo a una sesión recién tomada"""
+        for nombre in POR_TRABAJO:
+            if nombre not in opciones:
+                continue
+            valor = opciones[nombre]
+            if nombre == 'progress_hooks':
+                ydl._progress_hooks = list(valor)
+                continue
+            ydl.params[nombre] = copy.copy(valor)
+            if nombre == 'format':
+                ydl.format_selector = valor if valor in (None, '-') or callable(valor) \
+                    else ydl.build_format_selector(valor)
+            elif nombre == 'outtmpl':
+                ydl._parse_outtmpl()
+
+
+def _copiar_params(params):
+    # Copia de un nivel: la descarga puede cambiar diccionarios como outtmpl
+    return {k: copy.copy(v) if isinstance(v, (dict, list)) else v for k, v in params.items()}
+
+
+def _congelar(valor):
+    """Clave hashable para unas opciones (los objetos cuentan por identidad)"""
+    if isinstance(valor, dict):
+        return tuple(sorted((k, _congelar(v)) for k, v in valor.items()))
+    if isinstance(valor, (list, tuple)):
+        return tuple(_congelar(v) for v in valor)
+    if isinstance(valor, (str, int, float, bool, type(None))):
+        return valor
+    return ('id', id(valor))
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Los módulos están en la raíz del repositorio, sin paquete
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Y el servidor local de los benchmarks, que también usan las pruebas de red
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
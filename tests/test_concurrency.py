@@ -0,0 +1,128 @@
+import pytest
+
+import concurrency
+from concurrency import AdaptiveConcurrency, es_estrangulamiento, espera_reintento
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(concurrency.time, 'monotonic', reloj)
+    return reloj
+
+
+def ventana(limitador, reloj, n_bytes, host='h'):
+    """Transfiere n_bytes durante una ventana completa"""
+    reloj.ahora += limitador.intervalo
+    limitador.transferidos(host, n_bytes)
+
+
+def ocupar_todos(limitador, host='h'):
+    while limitador.limite(host) > limitador.estado(host)['activas']:
+        limitador.ocupar(host)
+
+
+def test_limite_inicial_dentro_de_los_topes():
+    limitador = AdaptiveConcurrency(inicial=2, minimo=1, maximo=4)
+    assert limitador.limite('a') == 2
+    assert limitador.limite('b', inicial=10) == 4
+    assert limitador.estado('desconocido') is None
+
+
+def test_aumento_aditivo_con_todos_los_huecos_en_uso(reloj):
+    limitador = AdaptiveConcurrency(inicial=2, maximo=4)
+    ocupar_todos(limitador)
+    ventana(limitador, reloj, 1000)
+    assert limitador.limite('h') == 3
+    ocupar_todos(limitador)
+    ventana(limitador, reloj, 2000)
+    assert limitador.limite('h') == 4
+    ocupar_todos(limitador)
+    ventana(limitador, reloj, 4000)
+    assert limitador.limite('h') == 4
+
+
+def test_no_aumenta_con_huecos_libres(reloj):
+    limitador = AdaptiveConcurrency(inicial=2)
+    limitador.ocupar('h')
+    ventana(limitador, reloj, 1000)
+    assert limitador.limite('h') == 2
+
+
+def test_deshace_el_aumento_que_no_mejoro(reloj):
+    limitador = AdaptiveConcurrency(inicial=2)
+    ocupar_todos(limitador)
+    ventana(limitador, reloj, 1000)
+    assert limitador.limite('h') == 3
+    ocupar_todos(limitador)
+    ventana(limitador, reloj, 1020)
+    assert limitador.limite('h') == 2
+
+
+def test_recorte_multiplicativo_una_vez_por_intervalo(reloj):
+    limitador = AdaptiveConcurrency(inicial=8)
+    limitador.error('h', 'HTTP Error 429: Too Many Requests')
+    assert limitador.limite('h') == 4
+    limitador.error('h', 'HTTP 429 en https://cdn/x')
+    assert limitador.limite('h') == 4
+    reloj.ahora += limitador.intervalo
+    limitador.error('h', 'HTTP 503 en https://cdn/x')
+    assert limitador.limite('h') == 2
+
+
+def test_otros_errores_no_recortan_al_momento(reloj):
+    limitador = AdaptiveConcurrency(inicial=8)
+    limitador.error('h', ConnectionResetError())
+    assert limitador.limite('h') == 8
+
+
+def test_recorta_con_tasa_de_errores_alta(reloj):
+    limitador = AdaptiveConcurrency(inicial=8)
+    for _ in range(7):
+        limitador.exito('h')
+    for _ in range(3):
+        limitador.error('h', TimeoutError())
+    ventana(limitador, reloj, 1000)
+    assert limitador.limite('h') == 4
+
+
+def test_nunca_baja_del_minimo(reloj):
+    limitador = AdaptiveConcurrency(inicial=1, minimo=1)
+    limitador.error('h', 'HTTP Error 429')
+    assert limitador.limite('h') == 1
+
+
+def test_salir_libera_el_hueco():
+    limitador = AdaptiveConcurrency(inicial=1)
+    limitador.entrar('h')
+    assert limitador.estado('h')['activas'] == 1
+    limitador.salir('h')
+    assert limitador.estado('h')['activas'] == 0
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, status):
+        self.status = status
+
+
+def test_es_estrangulamiento():
+    assert es_estrangulamiento(ErrorHTTP(429))
+    assert es_estrangulamiento(ErrorHTTP(403))
+    assert not es_estrangulamiento(ErrorHTTP(404))
+    assert es_estrangulamiento('HTTP Error 503: Service Unavailable')
+    assert not es_estrangulamiento('Connection reset by peer')
+
+
+def test_espera_reintento_exponencial_con_jitter():
+    for intento in range(8):
+        tope = min(30.0, 2 ** intento)
+        espera = espera_reintento(intento)
+        assert tope / 2 <= espera <= tope
@@ -0,0 +1,62 @@
+import os
+
+from content_store import ContentStore
+
+INFO = {'extractor_key': 'Youtube', 'id': 'abc', 'format_id': '137+140', 'title': 'Video', 'ext': 'mp4'}
+
+
+def test_clave_por_extractor_id_y_formato():
+    clave = ContentStore.clave(INFO)
+    assert clave == ContentStore.clave({**INFO, 'title': 'Otro título'})
+    assert clave != ContentStore.clave({**INFO, 'format_id': '22'})
+    assert clave != ContentStore.clave({**INFO, 'extractor_key': 'Vimeo'})
+    assert ContentStore.clave({'id': 'abc'}) is None
+
+
+def test_clave_generica_usa_la_pagina():
+    uno = {'extractor_key': 'Generic', 'id': 'video', 'format_id': '0', 'webpage_url': 'https://uno.example/video'}
+    dos = {**uno, 'webpage_url': 'https://dos.example/video'}
+    assert ContentStore.clave(uno) != ContentStore.clave(dos)
+
+
+def test_guardar_y_enlazar(tmp_path):
+    almacen = ContentStore(tmp_path / '.almacen')
+    clave = ContentStore.clave(INFO)
+    archivo = tmp_path / 'Video.mp4'
+    archivo.write_bytes(b'contenido')
+
+    assert not almacen.enlazar(clave, tmp_path / 'Nuevo título.mp4')
+    assert almacen.guardar(clave, archivo, INFO)
+    assert almacen.buscar(clave) is not None
+
+    copia = tmp_path / 'Nuevo título.mp4'
+    assert almacen.enlazar(clave, copia)
+    assert os.path.samefile(copia, archivo)
+    # Ya enlazado: no hay nada que hacer
+    assert almacen.enlazar(clave, copia)
+
+
+def test_no_pisa_otro_archivo_con_el_mismo_nombre(tmp_path):
+    almacen = ContentStore(tmp_path / '.almacen')
+    clave = ContentStore.clave(INFO)
+    archivo = tmp_path / 'Video.mp4'
+    archivo.write_bytes(b'contenido')
+    almacen.guardar(clave, archivo, INFO)
+
+    otro = tmp_path / 'Otro.mp4'
+    otro.write_bytes(b'otro video')
+    assert not almacen.enlazar(clave, otro)
+    assert otro.read_bytes() == b'otro video'
+
+
+def test_guardar_sin_enlaces_duros(tmp_path, monkeypatch):
+    almacen = ContentStore(tmp_path / '.almacen')
+    archivo = tmp_path / 'Video.mp4'
+    archivo.write_bytes(b'contenido')
+
+    def sin_enlaces(*args):
+        raise OSError(18, 'Invalid cross-device link')
+
+    monkeypatch.setattr(os, 'link', sin_enlaces)
+    assert not almacen.guardar(ContentStore.clave(INFO), archivo, INFO)
+    assert almacen.buscar(ContentStore.clave(INFO)) is None
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+import pytest
+
+from concurrency import AdaptiveConcurrency
+from video_downloader import VideoDownloader
+
+
+class DescargaFalsa:
+    """Sustituye a ejecutar_descarga: cuenta las descargas simultáneas en total y por host"""
+
+    def __init__(self, duraciones):
+        self.duraciones = duraciones
+        self._lock = threading.Lock()
+        self.activas = 0
+        self.por_host = Counter()
+        self.maximo = 0
+        self.maximo_por_host = Counter()
+        self.terminadas = []
+
+    def __call__(self, url, calidad, hooks, opciones=None, prioridad=None, esperar_postproceso=True):
+        host = urlsplit(url).hostname
+        with self._lock:
+            self.activas += 1
+            self.por_host[host] += 1
+            self.maximo = max(self.maximo, self.activas)
+            self.maximo_por_host[host] = max(self.maximo_por_host[host], self.por_host[host])
+        time.sleep(self.duraciones.get(url, 0.05))
+        with self._lock:
+            self.activas -= 1
+            self.por_host[host] -= 1
+            self.terminadas.append(url)
+        if 'falla' in url:
+            raise RuntimeError('HTTP Error 404: Not Found')
+        if 'fusion' in url:
+            # Como una descarga cuya fusión sigue en el grupo de posprocesado
+            futuro = Future()
+            threading.Timer(0.05, futuro.set_result, (None,)).start()
+            return futuro
+        return None
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    downloader = VideoDownloader(tmp_path)
+    downloader.silencioso = True
+    # Límites por host propios, sin el estado compartido del proceso ni ajustes durante la prueba
+    downloader.trabajos_por_host = AdaptiveConcurrency(inicial=2, maximo=8, intervalo=3600)
+    yield downloader
+    downloader.cerrar()
+
+
+def test_respeta_el_limite_global_y_por_host(downloader):
+    urls = [f'https://{host}.example/{n}' for n in range(6) for host in ('uno', 'dos', 'tres')]
+    falsa = downloader.ejecutar_descarga = DescargaFalsa({})
+    resultados = downloader.descargar_lote(urls, max_descargas=4, max_por_host=2)
+
+    assert all(r['ok'] for r in resultados)
+    assert len(falsa.terminadas) == len(urls)
+    assert falsa.maximo == 4
+    assert max(falsa.maximo_por_host.values()) == 2
+
+
+def test_resultados_en_el_orden_de_entrada_aunque_fallen(downloader):
+    urls = ['https://a.example/lento', 'https://b.example/falla', 'https://c.example/fusion',
+            'https://d.example/rapido']
+    falsa = downloader.ejecutar_descarga = DescargaFalsa({urls[0]: 0.3, urls[3]: 0.01})
+    vistos = []
+    resultados = downloader.descargar_lote(iter(urls), max_descargas=4, al_terminar=vistos.append)
+
+    assert [r['url'] for r in resultados] == urls
+    assert [r['ok'] for r in resultados] == [True, False, True, True]
+    assert 'HTTP Error 404' in resultados[1]['error']
+    # El primero en empezar es el último en terminar; al_terminar los ve según acaban
+    assert falsa.terminadas[-1] == urls[0]
+    assert vistos[-1]['url'] == urls[0]
+
+
+def test_un_host_ocupado_no_bloquea_a_los_demas(downloader):
+    urls = [f'https://lento.example/{n}' for n in range(4)] + ['https://otro.example/0']
+    falsa = downloader.ejecutar_descarga = DescargaFalsa({u: 0.2 for u in urls[:4]})
+    downloader.descargar_lote(urls, max_descargas=3, max_por_host=1)
+
+    assert falsa.maximo_por_host['lento.example'] == 1
+    # La de otro host no espera a que se vacíe la cola del host lento
+    assert falsa.terminadas.index('https://otro.example/0') < 2
@@ -0,0 +1,74 @@
+import threading
+
+from download_archive import DownloadArchive
+
+
+def test_alta_visible_antes_de_escribirse(tmp_path):
+    archivo = DownloadArchive(tmp_path / 'a.sqlite3', lote=100, intervalo=3600)
+    archivo.add('youtube abc')
+    assert 'youtube abc' in archivo
+    assert 'youtube otro' not in archivo
+    assert 'vimeo abc' not in archivo
+    archivo.cerrar()
+
+
+def test_escribe_por_lotes(tmp_path):
+    ruta = tmp_path / 'a.sqlite3'
+    archivo = DownloadArchive(ruta, lote=2, intervalo=3600)
+    otro = DownloadArchive(ruta)
+    archivo.add('youtube 1')
+    assert 'youtube 1' not in otro
+    archivo.add('youtube 2')
+    assert 'youtube 1' in otro and 'youtube 2' in otro
+    archivo.cerrar()
+    otro.cerrar()
+
+
+def test_cerrar_escribe_lo_pendiente(tmp_path):
+    ruta = tmp_path / 'a.sqlite3'
+    archivo = DownloadArchive(ruta, lote=100, intervalo=3600)
+    archivo.add('youtube abc')
+    archivo.cerrar()
+    archivo.cerrar()
+    assert 'youtube abc' in DownloadArchive(ruta)
+
+
+def test_altas_concurrentes_desde_varios_hilos_y_conexiones(tmp_path):
+    ruta = tmp_path / 'a.sqlite3'
+    archivos = [DownloadArchive(ruta, lote=7, intervalo=3600) for _ in range(2)]
+
+    def dar_de_alta(n):
+        archivo = archivos[n % 2]
+        for i in range(200):
+            video = f'youtube {n}-{i}'
+            archivo.add(video)
+            assert video in archivo
+
+    hilos = [threading.Thread(target=dar_de_alta, args=(n,)) for n in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    for archivo in archivos:
+        archivo.cerrar()
+
+    final = DownloadArchive(ruta)
+    assert all(f'youtube {n}-{i}' in final for n in range(8) for i in range(200))
+    assert final._db.execute('SELECT COUNT(*) FROM descargas').fetchone()[0] == 1600
+    final.cerrar()
+
+
+def test_importar_texto(tmp_path):
+    texto = tmp_path / 'archive.txt'
+    texto.write_text('youtube abc\n\nvimeo 123\nyoutube abc\n', encoding='utf-8')
+    archivo = DownloadArchive(tmp_path / 'a.sqlite3')
+    assert archivo.importar_texto(texto) == 3
+    assert 'youtube abc' in archivo and 'vimeo 123' in archivo
+    archivo.cerrar()
+
+
+def test_siempre_es_verdadero(tmp_path):
+    # yt-dlp no consulta un download_archive que se evalúa como falso
+    archivo = DownloadArchive(tmp_path / 'a.sqlite3')
+    assert archivo
+    archivo.cerrar()
@@ -0,0 +1,163 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from download_daemon import DownloadDaemon
+
+
+class DownloaderFalso:
+    """Sustituye al VideoDownloader: cada URL descarga hasta que se suelta y luego espera en 'procesando'"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._eventos = {}
+
+    def _evento(self, clave):
+        with self._lock:
+            return self._eventos.setdefault(clave, threading.Event())
+
+    def soltar_descarga(self, url):
+        self._evento((url, 'descarga')).set()
+
+    def soltar_proceso(self, url):
+        self._evento((url, 'proceso')).set()
+
+    def soltar_todo(self):
+        with self._lock:
+            eventos = list(self._eventos.values())
+        for evento in eventos:
+            evento.set()
+
+    def ejecutar_descarga(self, url, calidad, hooks, opciones=None, al_extraer=None,
+                          prioridad=None, esperar_postproceso=True):
+        al_extraer({'title': url, 'duration': 1})
+        while not self._evento((url, 'descarga')).wait(0.01):
+            for hook in hooks:
+                hook({'status': 'downloading', 'downloaded_bytes': 1, 'total_bytes': 2})
+        for hook in hooks:
+            hook({'status': 'finished'})
+        # Fusión y verificación: el hook ya no se llama
+        self._evento((url, 'proceso')).wait(5)
+
+
+@pytest.fixture
+def demonio():
+    demonio = DownloadDaemon(DownloaderFalso(), puerto=0, max_descargas=1).iniciar()
+    yield demonio
+    demonio.downloader.soltar_todo()
+    demonio.detener()
+
+
+def pedir(demonio, metodo, ruta, datos=None):
+    """(código, JSON de la respuesta)"""
+    cuerpo = datos if isinstance(datos, bytes) or datos is None else json.dumps(datos).encode()
+    peticion = urllib.request.Request(f'http://127.0.0.1:{demonio.puerto}{ruta}', data=cuerpo, method=metodo)
+    try:
+        with urllib.request.urlopen(peticion, timeout=5) as respuesta:
+            return respuesta.status, json.loads(respuesta.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def eventos_de(demonio, id_trabajo):
+    """Estados enviados por /eventos?trabajo=<id> hasta que el servidor cierra el stream"""
+    url = f'http://127.0.0.1:{demonio.puerto}/eventos?trabajo={id_trabajo}'
+    with urllib.request.urlopen(url, timeout=5) as respuesta:
+        return [json.loads(linea[6:]) for linea in respuesta if linea.startswith(b'data: ')]
+
+
+def esperar_estado(demonio, id_trabajo, estado):
+    desde = 0
+    while True:
+        desde, eventos = demonio.eventos(desde, id_trabajo, timeout=5)
+        assert eventos, f'el trabajo {id_trabajo} no llegó a {estado}'
+        if any(evento['estado'] == estado for _, evento in eventos):
+            return
+
+
+@pytest.mark.parametrize('datos', [
+    b'no es json',
+    [1, 2],
+    {'calidad': '720'},
+    {'urls': []},
+    {'urls': 'https://example.com/v'},
+    {'url': 42},
+    {'url': '   '},
+    {'url': 'https://example.com/v', 'calidad': '4k'},
+    {'url': 'https://example.com/v', 'calidad': True},
+    {'url': 'https://example.com/v', 'prioridad': 0},
+    {'url': 'https://example.com/v', 'prioridad': '1'},
+    {'urls': ['https://example.com/a', None]},
+])
+def test_rechaza_peticiones_no_validas_sin_encolar_nada(demonio, datos):
+    codigo, respuesta = pedir(demonio, 'POST', '/trabajos', datos)
+
+    assert codigo == 400
+    assert respuesta['error']
+    assert demonio.listar() == []
+
+
+def test_normaliza_los_datos_validos(demonio):
+    codigo, trabajos = pedir(demonio, 'POST', '/trabajos',
+                             {'urls': [' https://example.com/a ', 'https://example.com/b'], 'calidad': 720})
+
+    assert codigo == 201
+    assert [(t['url'], t['calidad'], t['prioridad']) for t in trabajos] == [
+        ('https://example.com/a', '720', 1), ('https://example.com/b', '720', 1)]
+
+
+def test_trabajo_desconocido(demonio):
+    assert pedir(demonio, 'GET', '/trabajos/99')[0] == 404
+    assert pedir(demonio, 'DELETE', '/trabajos/99')[0] == 409
+    with pytest.raises(urllib.error.HTTPError) as error:
+        eventos_de(demonio, 99)
+    assert error.value.code == 404
+
+
+def test_los_eventos_de_un_trabajo_se_cierran_al_terminar(demonio):
+    url = 'https://example.com/a'
+    trabajo = demonio.enviar(url)
+    demonio.downloader.soltar_descarga(url)
+    esperar_estado(demonio, trabajo['id'], 'procesando')
+
+    # Las cabeceras llegan después de tomar el estado actual: soltarlo ahora no pierde nada
+    with urllib.request.urlopen(f"http://127.0.0.1:{demonio.puerto}/eventos?trabajo={trabajo['id']}",
+                                timeout=5) as respuesta:
+        demonio.downloader.soltar_proceso(url)
+        estados = [json.loads(linea[6:])['estado'] for linea in respuesta if linea.startswith(b'data: ')]
+
+    assert estados == ['procesando', 'completado']
+    # Ya terminado: solo su estado actual, y se cierra
+    assert [evento['estado'] for evento in eventos_de(demonio, trabajo['id'])] == ['completado']
+
+
+def test_cancela_en_cola_y_descargando(demonio):
+    descargando = demonio.enviar('https://example.com/a')
+    en_cola = demonio.enviar('https://example.com/b')
+    esperar_estado(demonio, descargando['id'], 'descargando')
+
+    codigo, respuesta = pedir(demonio, 'DELETE', f"/trabajos/{en_cola['id']}")
+    assert (codigo, respuesta['estado']) == (200, 'cancelado')
+
+    assert pedir(demonio, 'DELETE', f"/trabajos/{descargando['id']}")[0] == 200
+    assert eventos_de(demonio, descargando['id'])[-1]['estado'] == 'cancelado'
+    # Ya terminado
+    assert pedir(demonio, 'DELETE', f"/trabajos/{descargando['id']}")[0] == 409
+
+
+def test_no_cancela_un_trabajo_que_se_esta_procesando(demonio):
+    url = 'https://example.com/a'
+    trabajo = demonio.enviar(url)
+    demonio.downloader.soltar_descarga(url)
+    esperar_estado(demonio, trabajo['id'], 'procesando')
+
+    codigo, respuesta = pedir(demonio, 'DELETE', f"/trabajos/{trabajo['id']}")
+    assert codigo == 409
+    assert 'procesando' in respuesta['error']
+
+    demonio.downloader.soltar_proceso(url)
+    # Lo que se anunció es lo que pasa: termina completado, no cancelado a medias
+    assert eventos_de(demonio, trabajo['id'])[-1]['estado'] == 'completado'
@@ -0,0 +1,82 @@
+import hashlib
+import json
+
+from download_journal import ChunkJournal
+
+DATOS = bytes(range(256)) * 64
+
+
+def escribir_parcial(tmp_path, piezas):
+    """Crea destino.part y un diario con las piezas (inicio, fin) indicadas"""
+    destino = tmp_path / 'video.mp4'
+    parcial = tmp_path / 'video.mp4.part'
+    parcial.write_bytes(DATOS)
+    diario = ChunkJournal(destino, {'tamano': len(DATOS)}, segmento=4096)
+    diario.iniciar()
+    for inicio, fin in piezas:
+        diario.registrar(inicio, inicio, fin, hashlib.sha256(DATOS[inicio:fin + 1]).hexdigest())
+    diario.cerrar()
+    return destino, parcial
+
+
+def test_reanudar_conserva_las_piezas_validas(tmp_path):
+    destino, parcial = escribir_parcial(tmp_path, [(0, 4095), (4096, 8191), (8192, 12287)])
+    with open(parcial, 'r+b') as f:
+        f.seek(5000)
+        f.write(b'\xff' * 10)
+
+    diario = ChunkJournal(destino, {'tamano': len(DATOS)}, segmento=1024)
+    assert diario.cargar()
+    assert set(diario.piezas) == {0, 4096, 8192}
+    # Se reanuda con el reparto guardado, no con el nuevo
+    assert diario.parametros == {'segmento': 4096}
+    assert set(diario.verificar(parcial)) == {0, 8192}
+
+
+def test_otra_identidad_no_vale(tmp_path):
+    destino, _ = escribir_parcial(tmp_path, [(0, 4095)])
+    diario = ChunkJournal(destino, {'tamano': len(DATOS) + 1})
+    assert not diario.cargar()
+    assert diario.piezas == {}
+
+
+def test_sin_diario_o_sin_cabecera(tmp_path):
+    diario = ChunkJournal(tmp_path / 'nada.mp4', {'tamano': 1})
+    assert not diario.cargar()
+    (tmp_path / 'nada.mp4.journal').write_text('', encoding='utf-8')
+    assert not diario.cargar()
+
+
+def test_ignora_la_ultima_linea_cortada(tmp_path):
+    destino, parcial = escribir_parcial(tmp_path, [(0, 4095), (4096, 8191)])
+    with open(str(destino) + '.journal', 'a', encoding='utf-8') as f:
+        f.write('{"clave": 8192, "inic')
+    diario = ChunkJournal(destino, {'tamano': len(DATOS)})
+    assert diario.cargar()
+    assert set(diario.verificar(parcial)) == {0, 4096}
+
+
+def test_sin_parcial_no_hay_piezas_validas(tmp_path):
+    destino, parcial = escribir_parcial(tmp_path, [(0, 4095)])
+    parcial.unlink()
+    diario = ChunkJournal(destino, {'tamano': len(DATOS)})
+    assert diario.cargar()
+    assert diario.verificar(parcial) == {}
+
+
+def test_iniciar_reescribe_solo_las_validas(tmp_path):
+    destino, parcial = escribir_parcial(tmp_path, [(0, 4095), (4096, 8191)])
+    parcial.write_bytes(DATOS[:4096])
+    diario = ChunkJournal(destino, {'tamano': len(DATOS)})
+    diario.cargar()
+    diario.verificar(parcial)
+    diario.iniciar()
+    diario.registrar('fin', 4096, 4105, 'x')
+    diario.cerrar()
+
+    lineas = [json.loads(linea) for linea in open(diario.path, encoding='utf-8')]
+    assert lineas[0] == {'identidad': {'tamano': len(DATOS)}, 'parametros': {'segmento': 4096}}
+    assert [p['clave'] for p in lineas[1:]] == [0, 'fin']
+
+    diario.eliminar()
+    assert not (tmp_path / 'video.mp4.journal').exists()
@@ -0,0 +1,97 @@
+from format_planner import planificar, planificar_audio, planificar_calidades, tamano_estimado
+
+
+def video(format_id, altura, tbr, vcodec='avc1', ext='mp4', fps=30):
+    return {'format_id': format_id, 'height': altura, 'tbr': tbr, 'vcodec': vcodec, 'acodec': 'none',
+            'ext': ext, 'fps': fps}
+
+
+def audio(format_id, abr, acodec='mp4a.40.2', ext='m4a'):
+    return {'format_id': format_id, 'abr': abr, 'tbr': abr, 'acodec': acodec, 'vcodec': 'none', 'ext': ext}
+
+
+def info(*formatos, duracion=100):
+    return {'duration': duracion, 'formats': list(formatos)}
+
+
+def test_tamano_estimado():
+    assert tamano_estimado({'filesize': 1000, 'tbr': 1}) == 1000
+    assert tamano_estimado({'filesize_approx': 500.4}) == 500
+    # 800 kbit/s durante 10 s
+    assert tamano_estimado({'tbr': 800}, 10) == 1_000_000
+    assert tamano_estimado({'vbr': 700, 'abr': 100}, 10) == 1_000_000
+    assert tamano_estimado({'tbr': 800}) is None
+
+
+def test_elige_la_combinacion_mas_ligera_de_la_misma_resolucion():
+    datos = info(video('h264', 1080, 4000), video('av1', 1080, 2000, vcodec='av01.0.08M.08'),
+                 video('720', 720, 1000), audio('a', 128))
+    plan = planificar(datos, 'best')
+    assert plan['format'] == 'av1+a'
+    assert plan['altura'] == 1080
+    assert plan['bytes'] == (2000 + 128) * 1000 // 8 * 100
+
+
+def test_no_pasa_de_la_altura_pedida():
+    datos = info(video('1080', 1080, 4000), video('720', 720, 2000), video('480', 480, 1000), audio('a', 128))
+    assert planificar(datos, '720')['format'] == '720+a'
+    assert planificar(datos, 'worst')['format'] == '480+a'
+
+
+def test_si_todo_supera_la_altura_usa_la_mas_cercana():
+    datos = info(video('1080', 1080, 4000), video('720', 720, 2000), audio('a', 128))
+    assert planificar(datos, '360')['format'] == '720+a'
+
+
+def test_prefiere_60_fps_a_igual_altura():
+    datos = info(video('30', 720, 1000), video('60', 720, 1500, fps=60), audio('a', 128))
+    assert planificar(datos, '720')['format'] == '60+a'
+
+
+def test_prefiere_mp4_sin_remux():
+    datos = info(video('webm', 720, 900, vcodec='vp9', ext='webm'), video('mp4', 720, 1000),
+                 audio('a', 128))
+    plan = planificar(datos, '720')
+    assert plan['format'] == 'mp4+a'
+    assert plan['mp4'] and not plan['remux']
+
+
+def test_descarta_audio_por_debajo_del_minimo_si_hay_otro():
+    datos = info(video('v', 720, 1000), audio('bajo', 48), audio('bueno', 128))
+    assert planificar(datos, 'best')['format'] == 'v+bueno'
+
+
+def test_sin_datos_de_tamano_devuelve_none():
+    datos = {'formats': [video('v', 720, None), audio('a', None)]}
+    assert planificar(datos, 'best') is None
+    assert planificar({'formats': []}, 'best') is None
+
+
+def test_ignora_formatos_con_drm():
+    datos = info({**video('drm', 1080, 1000), 'has_drm': True}, video('libre', 720, 2000), audio('a', 128))
+    assert planificar(datos, 'best')['format'] == 'libre+a'
+
+
+def test_audio_el_mas_pequeno_que_llega_al_objetivo():
+    datos = info(audio('64', 64), audio('130', 130), audio('160', 160, acodec='opus', ext='webm'))
+    assert planificar(datos, 'audio')['format'] == '130'
+    assert planificar_audio(datos, kbps=150)['format'] == '160'
+    assert planificar(datos, 'audio', audio_kbps=48)['format'] == '64'
+
+
+def test_audio_sin_ninguno_suficiente_elige_el_de_mas_bitrate():
+    datos = info(audio('64', 64), audio('96', 96))
+    plan = planificar_audio(datos, kbps=320)
+    assert plan['format'] == '96'
+    assert plan['kbps'] == 96
+
+
+def test_audio_sin_formatos_de_solo_audio():
+    assert planificar_audio(info(video('v', 720, 1000))) is None
+
+
+def test_planificar_calidades_cubre_todas():
+    datos = info(video('v', 720, 1000), audio('a', 128))
+    planes = planificar_calidades(datos, audio_kbps=64)
+    assert set(planes) == {'best', '1080', '720', '480', '360', 'worst', 'audio'}
+    assert planes['audio']['format'] == 'a'
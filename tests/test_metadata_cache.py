@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+from metadata_cache import MARGEN_EXPIRACION, MetadataCache, expiracion_formatos, normalizar_url
+
+URL = 'https://www.youtube.com/watch?v=BaW_jenozKc'
+
+
+def info_video(video_id='BaW_jenozKc', **extra):
+    return {'id': video_id, 'extractor_key': 'Youtube', 'title': 'Prueba',
+            'webpage_url': f'https://www.youtube.com/watch?v={video_id}', 'formats': [], **extra}
+
+
+@pytest.mark.parametrize('url', [
+    'https://youtube.com/watch?v=BaW_jenozKc',
+    'http://m.youtube.com/watch?v=BaW_jenozKc&feature=share',
+    'https://www.youtube.com/watch/?utm_source=x&v=BaW_jenozKc&si=abc',
+    'https://youtu.be/BaW_jenozKc?t=42',
+    'https://www.youtube.com/shorts/BaW_jenozKc',
+])
+def test_normalizar_url_variantes_de_youtube(url):
+    assert normalizar_url(url) == 'https://youtube.com/watch?v=BaW_jenozKc'
+
+
+def test_normalizar_url_ordena_y_conserva_parametros_utiles():
+    assert (normalizar_url('https://Example.com:8080/video/?b=2&a=1&gclid=x')
+            == 'https://example.com:8080/video?a=1&b=2')
+
+
+def test_expiracion_formatos_toma_la_primera():
+    datos = {'formats': [{'url': 'https://cdn/a?expire=2000'}, {'manifest_url': 'https://cdn/m?expire=1000'},
+                         {'url': 'https://cdn/sin'}]}
+    assert expiracion_formatos(datos) == 1000
+    assert expiracion_formatos({'formats': [{'url': 'https://cdn/a'}]}) is None
+
+
+def test_guardar_y_obtener_por_cualquier_variante(tmp_path):
+    cache = MetadataCache(tmp_path)
+    cache.guardar(URL, info_video())
+    assert cache.obtener(URL)['title'] == 'Prueba'
+    assert cache.obtener('https://youtu.be/BaW_jenozKc?si=x')['id'] == 'BaW_jenozKc'
+    assert cache.obtener('https://www.youtube.com/watch?v=otro_video1') is None
+
+
+def test_persiste_entre_instancias(tmp_path):
+    MetadataCache(tmp_path).guardar(URL, info_video())
+    assert MetadataCache(tmp_path).obtener(URL)['id'] == 'BaW_jenozKc'
+
+
+def test_no_guarda_listas_ni_infos_sin_id(tmp_path):
+    cache = MetadataCache(tmp_path)
+    cache.guardar(URL, {'_type': 'playlist', 'id': 'PL', 'entries': []})
+    cache.guardar(URL, {'title': 'sin id'})
+    assert cache.obtener(URL) is None
+
+
+def test_caduca_por_ttl(tmp_path):
+    cache = MetadataCache(tmp_path, ttl=0)
+    cache.guardar(URL, info_video())
+    assert cache.obtener(URL) is None
+    assert [p.name for p in tmp_path.glob('*.json')] == ['indice.json']
+
+
+def test_caduca_con_las_urls_firmadas(tmp_path):
+    cache = MetadataCache(tmp_path)
+    expira = int(time.time()) + MARGEN_EXPIRACION - 1
+    cache.guardar(URL, info_video(formats=[{'url': f'https://cdn/v?expire={expira}'}]))
+    assert cache.obtener(URL) is None
+
+    expira = int(time.time()) + MARGEN_EXPIRACION + 3600
+    cache.guardar(URL, info_video(formats=[{'url': f'https://cdn/v?expire={expira}'}]))
+    assert cache.obtener(URL) is not None
+
+
+def test_invalidar(tmp_path):
+    cache = MetadataCache(tmp_path)
+    cache.guardar(URL, info_video())
+    cache.invalidar('https://youtu.be/BaW_jenozKc')
+    assert cache.obtener(URL) is None
+
+
+def test_expulsa_la_menos_usada_al_superar_el_tamano(tmp_path):
+    cache = MetadataCache(tmp_path, max_bytes=1)
+    urls = [f'https://www.youtube.com/watch?v=video_{n:05d}' for n in range(3)]
+    for url in urls:
+        cache.guardar(url, info_video(url[-11:]))
+    # Siempre se conserva al menos la última
+    assert [cache.obtener(url) is not None for url in urls] == [False, False, True]
+
+
+def test_lru_respeta_el_ultimo_uso(tmp_path):
+    cache = MetadataCache(tmp_path)
+    a, b, c = (f'https://www.youtube.com/watch?v=video_{n:05d}' for n in range(3))
+    cache.guardar(a, info_video(a[-11:]))
+    cache.guardar(b, info_video(b[-11:]))
+    tamano = sum(e['tamano'] for e in cache._entradas.values())
+    cache.obtener(a)
+    cache.max_bytes = tamano
+    cache.guardar(c, info_video(c[-11:]))
+    assert cache.obtener(a) is not None
+    assert cache.obtener(b) is None
+
+
+def test_el_id_generico_no_se_confunde_entre_sitios(tmp_path):
+    cache = MetadataCache(tmp_path)
+    for sitio in ('https://uno.example/video.mp4', 'https://dos.example/video.mp4'):
+        cache.guardar(sitio, {'id': 'video', 'extractor_key': 'Generic', 'webpage_url': sitio, 'title': sitio})
+    assert cache.obtener('https://uno.example/video.mp4')['title'] == 'https://uno.example/video.mp4'
+    assert cache.obtener('https://dos.example/video.mp4')['title'] == 'https://dos.example/video.mp4'
@@ -0,0 +1,196 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+import pytest
+from yt_dlp.networking.exceptions import TransportError
+
+import parallel_download
+from parallel_download import (FragmentDownloader, FusionNoSoportada, RangosNoSoportados,
+                               SegmentedDownloader, StreamingMerger)
+from servidor_local import LocalMediaServer
+
+KB = 1024
+MB = 1024 * KB
+
+
+@pytest.fixture(autouse=True)
+def sin_esperas(monkeypatch):
+    # Las pruebas miden qué se pide, no cuánto se espera entre reintentos
+    monkeypatch.setattr(parallel_download, 'espera_reintento', lambda intento, **_: 0)
+
+
+@pytest.fixture
+def servidor():
+    with LocalMediaServer() as servidor:
+        yield servidor
+
+
+def segmentado(**opciones):
+    """Una conexión y segmentos de 64 KB: las peticiones llegan en orden y se pueden programar"""
+    return SegmentedDownloader(**{'conexiones': 1, 'segmento_minimo': 64 * KB, 'vigilancia': False,
+                                  **opciones})
+
+
+def test_servidor_sin_range_pasa_a_la_descarga_normal(servidor, tmp_path):
+    servidor.rangos = False
+    url = servidor.agregar_archivo('/v.mp4', tamano=MB)
+
+    with pytest.raises(RangosNoSoportados):
+        segmentado().descargar(url, tmp_path / 'v.mp4')
+
+    # Solo el sondeo, y nada escrito
+    assert servidor.rutas == ['/v.mp4']
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_reintenta_cortes_y_503_desde_donde_se_quedo(servidor, tmp_path):
+    datos = os.urandom(256 * KB)
+    url = servidor.agregar_archivo('/v.mp4', datos)
+    servidor.incidencias('/v.mp4', None, 'corte', '503', 'corte')
+    reintentos = []
+
+    piezas = segmentado(reintentos=3, al_reintentar=reintentos.append).descargar(url, tmp_path / 'v.mp4')
+
+    assert (tmp_path / 'v.mp4').read_bytes() == datos
+    assert len(reintentos) == 3
+    assert sorted((p['inicio'], p['fin'], p['sha256']) for p in piezas) == [
+        (inicio, inicio + 64 * KB - 1, hashlib.sha256(datos[inicio:inicio + 64 * KB]).hexdigest())
+        for inicio in range(0, len(datos), 64 * KB)]
+
+
+def test_reintentos_agotados_salen_como_transport_error(servidor, tmp_path):
+    url = servidor.agregar_archivo('/v.mp4', tamano=256 * KB)
+    servidor.incidencias('/v.mp4', None, '503', '503', '503')
+
+    with pytest.raises(TransportError):
+        segmentado(reintentos=2).descargar(url, tmp_path / 'v.mp4')
+
+    # Queda lo necesario para reanudar
+    assert (tmp_path / 'v.mp4.part').exists()
+    assert (tmp_path / 'v.mp4.journal').exists()
+
+
+def test_reanuda_del_diario_y_repite_la_pieza_corrupta(servidor, tmp_path):
+    datos = os.urandom(256 * KB)
+    url = servidor.agregar_archivo('/v.mp4', datos)
+    destino = tmp_path / 'v.mp4'
+    # Sondeo, dos segmentos bien y el tercero falla
+    servidor.incidencias('/v.mp4', None, None, None, '503')
+    with pytest.raises(TransportError):
+        segmentado(reintentos=0).descargar(url, destino)
+    with open(tmp_path / 'v.mp4.part', 'r+b') as f:
+        f.seek(1000)
+        f.write(b'\x00' * 10)
+    servidor.rutas.clear()
+
+    segmentado().descargar(url, destino)
+
+    assert destino.read_bytes() == datos
+    # Sondeo, el primero (corrupto) y los dos que faltaban: el segundo no se vuelve a pedir
+    assert len(servidor.rutas) == 4
+    assert not (tmp_path / 'v.mp4.journal').exists()
+
+
+def test_un_relevo_gana_el_rango_atascado(tmp_path):
+    datos = os.urandom(12 * MB)
+    relevos = []
+    with LocalMediaServer(ancho_banda=2 * MB, ancho_banda_lento=64 * KB) as servidor:
+        url = servidor.agregar_archivo('/v.mp4', datos)
+        # El primer segmento después del sondeo va a 64 KB/s: sin relevo tardaría medio minuto
+        servidor.incidencias('/v.mp4', None, 'lenta')
+        descargador = SegmentedDownloader(conexiones=4, segmento_minimo=2 * MB, vigilancia=True,
+                                          ventana_atasco=1.0, al_relevar=relevos.append)
+        inicio = time.monotonic()
+        piezas = descargador.descargar(url, tmp_path / 'v.mp4')
+        transcurrido = time.monotonic() - inicio
+
+    assert len(relevos) == 1
+    assert transcurrido < 15
+    assert (tmp_path / 'v.mp4').read_bytes() == datos
+    # El tramo relevado también queda registrado con el hash de lo que se escribió
+    assert all(p['sha256'] == hashlib.sha256(datos[p['inicio']:p['fin'] + 1]).hexdigest() for p in piezas)
+    assert len(piezas) == 6
+
+
+def lista_hls(servidor, fragmentos=12, tamano=256 * KB):
+    info = {'protocol': 'm3u8_native', 'url': servidor.agregar_hls('/hls/lista.m3u8', fragmentos, tamano)}
+    return info, b''.join(servidor.archivos[f'/hls/seg{i}.ts'] for i in range(fragmentos))
+
+
+def test_fragmentos_en_orden_con_el_buffer_acotado(servidor, tmp_path):
+    servidor.ancho_banda_lento = 128 * KB
+    info, esperado = lista_hls(servidor)
+    # El primero llega el último: los demás esperan en el buffer
+    servidor.incidencias('/hls/seg0.ts', 'lenta')
+    pedidas = []
+    # Mientras el primero sigue en camino
+    threading.Timer(0.75, lambda: pedidas.extend(servidor.rutas)).start()
+
+    piezas = FragmentDownloader(simultaneos=4, buffer=4).descargar(info, tmp_path / 'v.ts')
+
+    assert (tmp_path / 'v.ts').read_bytes() == esperado
+    assert sorted(pedidas) == ['/hls/lista.m3u8', '/hls/seg0.ts', '/hls/seg1.ts', '/hls/seg2.ts', '/hls/seg3.ts']
+    assert [(p['inicio'], p['fin']) for p in piezas] == [
+        (i * 256 * KB, (i + 1) * 256 * KB - 1) for i in range(12)]
+
+
+def test_fragmentos_reintentan_cortes_y_503(servidor, tmp_path):
+    info, esperado = lista_hls(servidor, fragmentos=6, tamano=64 * KB)
+    servidor.incidencias('/hls/seg2.ts', 'corte', '503')
+    reintentos = []
+
+    FragmentDownloader(simultaneos=3, reintentos=5, al_reintentar=reintentos.append).descargar(
+        info, tmp_path / 'v.ts')
+
+    assert (tmp_path / 'v.ts').read_bytes() == esperado
+    assert len(reintentos) == 2
+
+
+def test_fragmentos_con_reintentos_agotados_salen_como_transport_error(servidor, tmp_path):
+    info, _ = lista_hls(servidor, fragmentos=6, tamano=64 * KB)
+    servidor.incidencias('/hls/seg3.ts', '503', '503', '503')
+
+    with pytest.raises(TransportError):
+        FragmentDownloader(simultaneos=3, reintentos=2).descargar(info, tmp_path / 'v.ts')
+
+    assert not (tmp_path / 'v.ts').exists()
+
+
+def formato(url, formato_id, **campos):
+    return {'format_id': formato_id, 'url': url, 'protocol': 'http', 'container': 'mp4_dash', 'ext': 'mp4',
+            **campos}
+
+
+def test_fusion_sin_poder_abrir_un_formato_no_deja_nada(servidor, tmp_path):
+    video = formato(servidor.agregar_archivo('/v.mp4', tamano=64 * KB), 'v', vcodec='avc1', acodec='none')
+    audio = formato(servidor.agregar_archivo('/a.m4a', tamano=64 * KB), 'a', vcodec='none', acodec='mp4a')
+    servidor.incidencias('/a.m4a', '503', '503')
+
+    with pytest.raises(FusionNoSoportada):
+        StreamingMerger(ffmpeg=shutil.which('ffmpeg') or 'ffmpeg', reintentos=1).fusionar(
+            [video, audio], tmp_path / 'v.mp4')
+
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='hace falta FFmpeg')
+def test_fusion_en_flujo_sobrevive_a_un_corte(servidor, tmp_path):
+    from bench_descargas import generar_medios
+
+    archivos = generar_medios(tmp_path, 5, fragmentado=True)
+    video = formato(servidor.agregar_archivo('/v.mp4', archivos[0].read_bytes()), 'v',
+                    vcodec='avc1', acodec='none')
+    audio = formato(servidor.agregar_archivo('/a.m4a', archivos[1].read_bytes()), 'a',
+                    vcodec='none', acodec='mp4a')
+    servidor.incidencias('/v.mp4', 'corte')
+    destino = tmp_path / 'fusion.mp4'
+
+    resumenes = StreamingMerger().fusionar([video, audio], destino)
+
+    assert destino.stat().st_size > 0
+    # El hash de cada formato es el del archivo original, aunque se cortara a mitad
+    assert [r[0]['sha256'] for r in resumenes] == [
+        hashlib.sha256(a.read_bytes()).hexdigest() for a in archivos]
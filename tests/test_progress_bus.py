@@ -0,0 +1,58 @@
+from progress_bus import ProgressBus
+
+
+class Ventana:
+    """Sustituto de Tk: guarda las llamadas a after para ejecutarlas a mano"""
+
+    def __init__(self):
+        self.pendientes = []
+
+    def after(self, ms, funcion):
+        self.pendientes.append(funcion)
+
+    def tick(self):
+        funcion = self.pendientes.pop(0)
+        funcion()
+
+
+def test_drenar_conserva_eventos_y_solo_el_ultimo_progreso():
+    bus = ProgressBus()
+    llamadas = []
+    bus.publicar(llamadas.append, 'inicio')
+    bus.publicar_progreso('a', llamadas.append, 'a 10%')
+    bus.publicar_progreso('b', llamadas.append, 'b 50%')
+    bus.publicar_progreso('a', llamadas.append, 'a 20%')
+    bus.publicar(llamadas.append, 'fin')
+
+    for funcion, args in bus.drenar():
+        funcion(*args)
+    assert llamadas == ['inicio', 'fin', 'a 20%', 'b 50%']
+    assert bus.drenar() == []
+
+
+def test_sondeo_aplica_los_eventos_y_se_reprograma():
+    bus = ProgressBus()
+    ventana = Ventana()
+    llamadas = []
+    bus.iniciar_sondeo(ventana)
+    bus.publicar(llamadas.append, 1)
+    ventana.tick()
+    assert llamadas == [1]
+    assert len(ventana.pendientes) == 1
+
+
+def test_un_suscriptor_que_falla_no_para_a_los_demas(caplog):
+    bus = ProgressBus()
+    ventana = Ventana()
+    llamadas = []
+
+    def falla():
+        raise RuntimeError('widget destruido')
+
+    bus.iniciar_sondeo(ventana)
+    bus.publicar(falla)
+    bus.publicar(llamadas.append, 'siguiente')
+    ventana.tick()
+    assert llamadas == ['siguiente']
+    assert len(ventana.pendientes) == 1
+    assert 'widget destruido' in caplog.records[0].exc_text
@@ -4,9 +4,17 @@ Descargador de Videos Universal
 Soporta múltiples plataformas usando yt-dlp
 """
 
+import argparse
+import copy
+import json
 import os
 import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlsplit
 
 try:
     import yt_dlp
@@ -15,45 +23,182 @@ except ImportError:
     print("Instálalo con: pip install yt-dlp")
     sys.exit(1)
 
+from bandwidth import PRIORIDAD_INTERACTIVA, PRIORIDAD_LOTE, planificador
+from concurrency import INTERVALO, conexiones_por_host, espera_reintento, trabajos_por_host
+from content_store import ContentStore
+from download_archive import DownloadArchive
+from format_planner import (AUDIO_OBJETIVO_KBPS, formato_tamano, planificar, planificar_calidades,
+                            tamano_estimado)
+from integrity import ArchivoCorrupto, IntegrityIndex, es_el_mismo, esperado_de, huella, verificar_contenedor
+from job_metrics import metricas
+from metadata_cache import MetadataCache, clave_extractor
+from postprocessing import (CONTENEDORES_AUDIO, PostProcessPool, argumentos_audio, compatible_mp4,
+                            convertir_audio, copia_audio, encadenar)
+from parallel_download import (FragmentDownloader, FragmentosNoSoportados, FusionNoSoportada,
+                               HostConnectionPool, RangosNoSoportados, RedHTTP, SegmentedDownloader,
+                               StreamingMerger, VENTANA_ATASCO)
+from session_pool import YoutubeDLPool
+
 # Agregar FFmpeg al PATH si está instalado por WinGet
 ffmpeg_path = Path(os.environ.get('LOCALAPPDATA', '')) / 'Microsoft' / 'WinGet' / 'Links'
 if ffmpeg_path.exists() and str(ffmpeg_path) not in os.environ.get('PATH', ''):
     os.environ['PATH'] = str(ffmpeg_path) + os.pathsep + os.environ.get('PATH', '')
 
+# Veces que se repite una descarga cuyo archivo no pasa la verificación
+REINTENTOS_VERIFICACION = 1
+
 
 class VideoDownloader:
-    def __init__(self, output_dir="descargas"):
+    def __init__(self, output_dir="descargas", conexiones=1, fragmentos=1, archivo=None,
+                 fusion_en_flujo=False, formato_audio='m4a', audio_kbps=AUDIO_OBJETIVO_KBPS,
+                 vigilancia=False, ventana_atasco=VENTANA_ATASCO, verificacion=True):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
+        # Conexiones paralelas por archivo en formatos progresivos (1 = desactivado)
+        self.conexiones = conexiones
+        # Fragmentos HLS/DASH descargados a la vez (1 = uno tras otro)
+        self.fragmentos = fragmentos
+        # Relevar con otra conexión las que pasan ventana_atasco segundos muy por
+        # debajo de la mediana (formatos progresivos, aunque haya una sola
+        # conexión). Desactivado por defecto: añade una petición de sondeo a
+        # cada descarga y la hace con la pila HTTP propia en lugar de la de yt-dlp
+        self.vigilancia = vigilancia
+        self.ventana_atasco = ventana_atasco
+        # Comprobar con ffprobe cada archivo terminado y repetir la descarga si está corrupto
+        self.verificacion = verificacion
+        # Unir video y audio con FFmpeg mientras se descargan, sin archivos
+        # intermedios (un tercio de la E/S en disco; si no se puede, lo normal)
+        self.fusion_en_flujo = fusion_en_flujo
+        # Modo solo audio: contenedor de salida y bitrate si hay que recodificar
+        self.formato_audio = formato_audio
+        self.audio_kbps = audio_kbps
+        self.cache = MetadataCache(self.output_dir / '.cache' / 'metadatos')
+        self.almacen = ContentStore(self.output_dir / '.almacen')
+        # Hashes calculados al escribir y resultado de la verificación de cada archivo
+        self.integridad = IntegrityIndex(self.output_dir / '.integridad')
+        # Compartido por todas las descargas del proceso (límite global y prioridades)
+        self.planificador = planificador
+        # Tiempos por fase, bytes, reintentos y errores de cada descarga
+        self.metricas = metricas
+        # Límites adaptativos por host (AIMD) de descargas de un lote y de conexiones paralelas
+        self.trabajos_por_host = trabajos_por_host
+        self.conexiones_por_host = conexiones_por_host
+        # Sesiones de yt-dlp y conexiones keep-alive reutilizadas entre descargas
+        self.sesiones = YoutubeDLPool()
+        self.pool_http = HostConnectionPool()
+        # Fusión y correcciones con FFmpeg, en paralelo a las descargas
+        self.postproceso = PostProcessPool()
+        # Conversiones de audio de archivos ya descargados (una por núcleo)
+        self.transcodificacion = PostProcessPool(os.cpu_count(), 'transcodificacion')
+        # Verificación de los archivos terminados (un ffprobe por núcleo)
+        self.comprobaciones = PostProcessPool(os.cpu_count(), 'verificacion')
+        # Descargas repetidas porque el archivo no pasó la verificación
+        self.repeticiones = PostProcessPool(2, 'repeticion')
+        # Sin mensajes de texto en la salida (modo no interactivo de la CLI)
+        self.silencioso = False
+        # Registro de lo ya descargado (True = descargas/.archivo.sqlite3, o una ruta)
+        if archivo is True:
+            archivo = self.output_dir / '.archivo.sqlite3'
+        self.archivo = DownloadArchive(archivo) if archivo else None
+    
+    def precalentar(self):
+        """
+        Deja listo yt-dlp para la primera descarga
+        
+        Crea un YoutubeDL y recorre una vez los extractores, que compilan
+        sus expresiones regulares la primera vez que se consultan. Las GUIs
+        lo llaman en segundo plano mientras se pinta la ventana. La sesión
+        queda en self.sesiones lista para analizar formatos.
+        """
+        with self.sesiones.sesion({'quiet': True, 'no_warnings': True}) as ydl:
+            ydl.get_info_extractor('Generic')
+        clave_extractor('https://example.com/')
+    
+    def cerrar(self):
+        """Cierra las sesiones de yt-dlp (guarda sus cookies) y las conexiones libres"""
+        self.sesiones.cerrar()
+        self.pool_http.cerrar()
+    
+    def extraer_info(self, url, ydl, refrescar=False):
+        """
+        Devuelve el info dict de la URL, usando la caché si está disponible
+        
+        Las listas y canales se devuelven sin procesar: sus 'entries' siguen
+        siendo perezosas y se recorren con iterar_playlist.
+        """
+        info = None if refrescar else self.cache.obtener(url)
+        if info is None:
+            info = ydl.extract_info(url, download=False, process=False)
+            if info is None:
+                # yt-dlp devuelve None si el video ya está en el registro de descargas
+                return None
+            if es_playlist(info):
+                return info
+            info = ydl.process_ie_result(info, download=False)
+            if es_playlist(info):
+                # Una URL que redirige a una lista
+                return info
+            info = ydl.sanitize_info(info, remove_private_keys=True)
+            self.cache.guardar(url, info)
+        return info
+    
+    def iterar_playlist(self, info):
+        """
+        Genera las entradas de una lista a medida que se enumeran
+        
+        Las entradas planas (solo URL) se devuelven como URL para extraerlas
+        cuando les toque; las que ya vienen completas, como info dict.
+        """
+        for entrada in info.get('entries') or []:
+            if not entrada:
+                continue
+            if entrada.get('_type', 'video') == 'video' and entrada.get('formats'):
+                yield entrada
+                continue
+            url = entrada.get('url') or entrada.get('webpage_url')
+            if url:
+                yield url
     
     def obtener_formatos_disponibles(self, url):
-        """Obtiene los formatos disponibles para un video"""
+        """Obtiene los formatos disponibles para un video (incluidos los DASH de solo video o audio)"""
         ydl_opts = {
             'quiet': True,
             'no_warnings': True,
         }
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
+            with self.sesiones.sesion(ydl_opts) as ydl:
+                info = self.extraer_info(url, ydl)
                 formatos = []
                 
                 if 'formats' in info:
                     for f in info['formats']:
-                        if f.get('vcodec') != 'none' and f.get('acodec') != 'none':
-                            formato_info = {
-                                'format_id': f.get('format_id'),
-                                'ext': f.get('ext'),
-                                'resolution': f.get('resolution', 'audio only'),
-                                'filesize': f.get('filesize', 0),
-                            }
-                            formatos.append(formato_info)
+                        video = f.get('vcodec') != 'none'
+                        audio = f.get('acodec') != 'none'
+                        if not video and not audio:
+                            continue
+                        formato_info = {
+                            'format_id': f.get('format_id'),
+                            'ext': f.get('ext'),
+                            'resolution': f.get('resolution', 'audio only'),
+                            'tipo': 'video+audio' if video and audio else 'solo video' if video else 'solo audio',
+                            'filesize': tamano_estimado(f, info.get('duration')) or 0,
+                        }
+                        formatos.append(formato_info)
                 
                 return formatos, info.get('title', 'video')
         except Exception as e:
             print(f"Error al obtener formatos: {e}")
             return [], None
     
+    def estimar_calidades(self, url):
+        """Plan de formato y tamaño estimado de cada calidad del menú: (planes, título)"""
+        with self.sesiones.sesion({'quiet': True, 'no_warnings': True}) as ydl:
+            info = self.extraer_info(url, ydl)
+        if info is None or es_playlist(info):
+            return {}, None
+        return planificar_calidades(info, self.audio_kbps), info.get('title', 'video')
+    
     def descargar_video(self, url, calidad='best'):
         """
         Descarga un video con la calidad especificada
@@ -65,33 +210,614 @@ class VideoDownloader:
         - '720': 720p
         - '480': 480p
         - '360': 360p
+        - 'audio': Solo audio (en self.formato_audio)
+        """
+        try:
+            print(f"\n🎬 Descargando video en calidad: {calidad}")
+            print(f"📁 Guardando en: {self.output_dir.absolute()}\n")
+            self.ejecutar_descarga(url, calidad, [self._progress_hook],
+                                   prioridad=PRIORIDAD_INTERACTIVA)
+            print("\n✅ Descarga completada!")
+            return True
+        except Exception as e:
+            print(f"\n❌ Error al descargar: {e}")
+            return False
+    
+    def descargar_lote(self, urls, calidad='best', max_descargas=4, max_por_host=2,
+                       progress_hooks=(), opciones=None, prioridad=PRIORIDAD_LOTE, al_terminar=None):
+        """
+        Descarga varias URLs en paralelo
+        
+        Acepta una lista o un iterador (se consume de forma perezosa) de
+        URLs o de info dicts ya extraídos (entradas completas de una lista).
+        Limita las descargas simultáneas en total y por host (max_por_host
+        es solo el punto de partida: self.trabajos_por_host lo sube mientras
+        la velocidad mejore y lo recorta ante un 429/403), y devuelve
+        un resultado por URL en el mismo orden de entrada. El fallo de
+        una descarga no detiene al resto. La fusión de cada video corre en
+        la etapa de posprocesado y no ocupa un hueco de descarga.
+        
+        Si se indica al_terminar, se llama con cada resultado en cuanto
+        se conoce (en el orden en que terminan).
+        """
+        resultados = {}
+        pendientes = deque()
+        activos_por_host = Counter()
+        activos = 0
+        posprocesando = 0
+        cond = threading.Condition()
+        ventana = max_descargas * 2
+        urls = iter(urls)
+        agotado = False
+        
+        def liberar(host):
+            nonlocal activos
+            self.trabajos_por_host.salir(host)
+            with cond:
+                activos -= 1
+                activos_por_host[host] -= 1
+                cond.notify()
+        
+        def terminar(indice, url, host, inicio, error):
+            estado = "✅" if error is None else f"❌ {error}"
+            with cond:
+                resultados[indice] = {
+                    'url': _url_de(url),
+                    'ok': error is None,
+                    'error': error,
+                    'segundos': time.monotonic() - inicio,
+                }
+                if al_terminar:
+                    al_terminar(resultados[indice])
+                if not self.silencioso:
+                    total = self.planificador.estadisticas()['velocidad_total']
+                    print(f"[{len(resultados)}] {_url_de(url)} {estado} | Total: {_formato_velocidad(total)}"
+                          f"{_formato_concurrencia(host, self.trabajos_por_host.estado(host))}")
+                cond.notify()
+        
+        def posprocesado(indice, url, host, inicio, futuro):
+            nonlocal posprocesando
+            error = futuro.exception()
+            with cond:
+                posprocesando -= 1
+            terminar(indice, url, host, inicio, None if error is None else str(error))
+        
+        def trabajo(indice, url, host):
+            nonlocal posprocesando
+            inicio = time.monotonic()
+            try:
+                futuro = self.ejecutar_descarga(url, calidad, list(progress_hooks),
+                                                {'quiet': True, 'noprogress': True, **(opciones or {})},
+                                                prioridad=prioridad, esperar_postproceso=False)
+            except Exception as e:
+                self.trabajos_por_host.error(host, e)
+                liberar(host)
+                terminar(indice, url, host, inicio, str(e))
+                return
+            self.trabajos_por_host.exito(host)
+            if futuro is not None:
+                with cond:
+                    posprocesando += 1
+            # El hueco de descarga queda libre aunque falte la fusión
+            liberar(host)
+            if futuro is None:
+                terminar(indice, url, host, inicio, None)
+            else:
+                futuro.add_done_callback(lambda f: posprocesado(indice, url, host, inicio, f))
+        
+        if not self.silencioso:
+            print(f"\n🎬 Descarga en lote ({max_descargas} simultáneas, {max_por_host} por host al empezar)")
+            print(f"📁 Guardando en: {self.output_dir.absolute()}\n")
+        
+        with ThreadPoolExecutor(max_workers=max_descargas) as pool:
+            indice = 0
+            while True:
+                # Leer más URLs fuera del lock: el iterador puede ser lento
+                while not agotado and len(pendientes) < ventana:
+                    url = next(urls, None)
+                    if url is None:
+                        agotado = True
+                        break
+                    if isinstance(url, str):
+                        url = url.strip()
+                    if url:
+                        pendientes.append((indice, url, _host_de(_url_de(url))))
+                        indice += 1
+                
+                with cond:
+                    # Lanzar todo lo que quepa sin bloquear hosts ocupados
+                    for item in list(pendientes):
+                        if activos >= max_descargas:
+                            break
+                        # Cada lote cuenta los suyos: una lista dentro de un lote no
+                        # espera a que termine el trabajo que la está enumerando
+                        host = item[2]
+                        if activos_por_host[host] < self.trabajos_por_host.limite(host, max_por_host):
+                            pendientes.remove(item)
+                            activos += 1
+                            activos_por_host[host] += 1
+                            self.trabajos_por_host.ocupar(host)
+                            pool.submit(trabajo, *item)
+                    
+                    if agotado and not pendientes and activos == 0 and posprocesando == 0:
+                        break
+                    if agotado or len(pendientes) >= ventana:
+                        # Con URLs esperando, volver a mirar por si el límite de su host subió
+                        cond.wait(INTERVALO if pendientes else None)
+        
+        if self.archivo is not None:
+            self.archivo.vaciar()
+        return [resultados[i] for i in sorted(resultados)]
+    
+    def ejecutar_descarga(self, url, calidad, progress_hooks, opciones=None, al_extraer=None,
+                          prioridad=PRIORIDAD_LOTE, esperar_postproceso=True):
         """
+        Motor de descarga compartido por la CLI y las interfaces gráficas
+        
+        Extrae la información una sola vez (o la toma de la caché) y pasa
+        ese mismo info dict a la etapa de descarga y fusión. Si se indica
+        al_extraer, se llama con el info dict antes de empezar a descargar
+        (para mostrar título, duración, etc.). Lanza excepción si falla.
         
+        Cada descarga se registra en el planificador de ancho de banda con
+        la prioridad indicada (más alta = más parte del límite global), y
+        en self.metricas con el tiempo de cada fase.
+        
+        La fusión y demás posprocesado van a self.postproceso, y la
+        verificación de los archivos terminados a self.comprobaciones. Con
+        esperar_postproceso=False se devuelve el Future de ambas etapas (o
+        None si no hay nada pendiente) en lugar de esperarlo.
+        """
         # Configurar formato según calidad con FFmpeg
         if calidad == 'best':
             format_string = 'bestvideo+bestaudio/best'
         elif calidad == 'worst':
             format_string = 'worstvideo+worstaudio/worst'
+        elif calidad == 'audio':
+            format_string = 'bestaudio/best'
         else:
             format_string = f'bestvideo[height<={calidad}]+bestaudio/best[height<={calidad}]'
         
+        host = _host_de(_url_de(url))
+        trabajo = self.planificador.registrar(
+            _url_de(url), prioridad, al_consumir=lambda n: self.trabajos_por_host.transferidos(host, n))
+        medicion = self.metricas.iniciar(_url_de(url))
+        hooks = [trabajo.hook, *progress_hooks]
+        try:
+            futuro = self._ejecutar(url, calidad, format_string, progress_hooks, hooks, opciones,
+                                    al_extraer, prioridad, medicion)
+        except Exception as e:
+            medicion.bytes = trabajo.bytes
+            medicion.terminar(e)
+            raise
+        finally:
+            trabajo.terminar()
+        medicion.bytes = trabajo.bytes
+        
+        def terminar(f):
+            # Si la verificación repitió la descarga, sus bytes también cuentan
+            medicion.bytes = trabajo.bytes
+            medicion.terminar(f.exception())
+        
+        if futuro is None:
+            medicion.terminar()
+        else:
+            futuro.add_done_callback(terminar)
+        if futuro is not None and esperar_postproceso:
+            futuro.result()
+            return None
+        return futuro
+    
+    def _ejecutar(self, url, calidad, format_string, progress_hooks, hooks, opciones,
+                  al_extraer, prioridad, medicion):
         ydl_opts = {
             'format': format_string,
             'outtmpl': str(self.output_dir / '%(title)s.%(ext)s'),
             'merge_output_format': 'mp4',
-            'progress_hooks': [self._progress_hook],
+            'progress_hooks': hooks,
+            'concurrent_fragment_downloads': self.fragmentos,
+            'fragment_retries': 10,
+            # Esperas exponenciales con jitter en lugar de reintentar al instante
+            'retry_sleep_functions': {'http': _espera_ytdlp, 'fragment': _espera_ytdlp},
         }
+        if self.archivo is not None:
+            ydl_opts['download_archive'] = self.archivo
+        ydl_opts.update(opciones or {})
         
+        # Sesión prestada: vuelve al pool cuando termina también su posprocesado
+        ydl = self.sesiones.tomar(ydl_opts)
+        futuro = None
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                print(f"\n🎬 Descargando video en calidad: {calidad}")
-                print(f"📁 Guardando en: {self.output_dir.absolute()}\n")
-                ydl.download([url])
-                print("\n✅ Descarga completada!")
-                return True
-        except Exception as e:
-            print(f"\n❌ Error al descargar: {e}")
-            return False
+            huellas = self._instalar_descargador(ydl, hooks, medicion)
+            self._contar_reintentos(ydl, medicion, _host_de(_url_de(url)))
+            with medicion.fase('extraccion'):
+                if isinstance(url, dict):
+                    # Entrada de una lista que ya viene extraída por completo
+                    info, en_cache = url, False
+                else:
+                    info = self.cache.obtener(url)
+                    en_cache = info is not None
+                if not en_cache and not isinstance(url, dict):
+                    info = self.extraer_info(url, ydl, refrescar=True)
+            if info is None:
+                return None
+            if es_playlist(info):
+                # Descargar mientras se enumera la lista, sin resolverla entera antes
+                self._descargar_playlist(info, calidad, progress_hooks, opciones, prioridad)
+                return None
+            if al_extraer:
+                al_extraer(info)
+            # Un formato explícito en las opciones manda sobre el planificador
+            plan = None if 'format' in (opciones or {}) else calidad
+            try:
+                futuro = self._descargar_info(ydl, info, plan, medicion, hooks, huellas)
+            except yt_dlp.utils.DownloadError:
+                if not en_cache:
+                    raise
+                # Los formatos guardados pueden haber dejado de ser válidos
+                self.cache.invalidar(url)
+                with medicion.fase('extraccion'):
+                    info = self.extraer_info(url, ydl, refrescar=True)
+                futuro = self._descargar_info(ydl, info, plan, medicion, hooks, huellas)
+            return futuro
+        finally:
+            if futuro is None:
+                self.sesiones.devolver(ydl)
+            else:
+                futuro.add_done_callback(lambda f: self.sesiones.devolver(ydl))
+    
+    def _descargar_playlist(self, info, calidad, progress_hooks, opciones, prioridad):
+        """Envía las entradas de una lista al lote en cuanto se conocen"""
+        if not self.silencioso:
+            print(f"\n📃 Lista: {info.get('title') or info.get('id')}")
+        resultados = self.descargar_lote(self.iterar_playlist(info), calidad,
+                                         progress_hooks=progress_hooks, opciones=opciones,
+                                         prioridad=prioridad)
+        fallidas = [r for r in resultados if not r['ok']]
+        if fallidas:
+            raise yt_dlp.utils.DownloadError(
+                f"{len(fallidas)} de {len(resultados)} videos de la lista fallaron")
+    
+    def _descargar_info(self, ydl, info, calidad, medicion, hooks, huellas, intento=0):
+        """
+        Descarga un info dict ya extraído, o lo enlaza desde el almacén si ya se tiene
+        
+        Devuelve el Future de su posprocesado y verificación (fusión,
+        correcciones, comprobación del contenedor y alta en el archivo), o
+        None si no queda nada pendiente. huellas es donde el descargador
+        instalado deja los hashes de lo que escribe, por format_id.
+        """
+        if info is None:
+            return None
+        if info.get('_type', 'video') != 'video':
+            with medicion.fase('transferencia'):
+                ydl.process_ie_result(info, download=True)
+            return None
+        
+        with medicion.fase('seleccion'):
+            plan = planificar(info, calidad, self.audio_kbps) if calidad else None
+            if plan is not None:
+                # Formatos concretos en lugar de la cadena genérica de la calidad
+                ydl.params['format'] = plan['format']
+                ydl.format_selector = ydl.build_format_selector(plan['format'])
+                detalle = f"{plan['kbps']:g} kbps" if calidad == 'audio' else f"{plan['altura']}p"
+                ydl.to_screen(f"[plan] {plan['format']}: {detalle}, {formato_tamano(plan['bytes'])}")
+            
+            # Elegir formato sin descargar para saber qué archivo saldría
+            seleccion = ydl.process_ie_result(copy.deepcopy(info), download=False)
+            formatos = seleccion.get('requested_formats')
+            if formatos and seleccion.get('ext') == 'mp4' and not compatible_mp4(formatos):
+                # Copiar los streams a MKV en lugar de recodificarlos para que quepan en MP4
+                ydl.params['merge_output_format'] = 'mkv'
+                seleccion = ydl.process_ie_result(copy.deepcopy(info), download=False)
+            original, conversion = seleccion, None
+            if calidad == 'audio':
+                seleccion, conversion = self._seleccion_audio(seleccion)
+            clave = self.almacen.clave(seleccion)
+            destino = Path(ydl.prepare_filename(seleccion))
+        if self.almacen.enlazar(clave, destino):
+            ydl.to_screen(f"[almacén] {destino.name}: ya descargado, enlazado sin transferir")
+            return None
+        
+        if destino.exists() and self._es_otro_video(destino, clave):
+            # Mismo título pero otro video/formato (o no se sabe): no pisarlo ni darlo por descargado
+            ydl.params['outtmpl']['default'] = str(self.output_dir / '%(title)s [%(id)s].%(ext)s')
+            destino = Path(ydl.prepare_filename(seleccion))
+        
+        def guardar(archivo):
+            if not self.almacen.guardar(clave, archivo, seleccion):
+                ydl.to_screen(f"[almacén] {Path(archivo).name}: este sistema de archivos no admite enlaces "
+                              f"duros, no se podrá enlazar sin volver a descargarlo")
+        
+        def terminar_en_flujo(terminados):
+            ydl.record_download_archive(seleccion)
+            guardar(str(destino))
+        
+        if self.fusion_en_flujo and formatos and len(formatos) > 1:
+            fusionador = StreamingMerger(al_reintentar=medicion.reintento, pool=self.pool_http,
+                                         red=RedHTTP.de_ydl(ydl), limite=ydl.params.get('ratelimit'))
+            try:
+                # Descarga y fusión son el mismo paso
+                with medicion.fase('transferencia'):
+                    resumenes = fusionador.fusionar(formatos, destino, seleccion['ext'], hooks, seleccion)
+            except FusionNoSoportada as e:
+                ydl.to_screen(f"[flujo] {e}: se descarga y fusiona por separado")
+            else:
+                ydl.to_screen(f"[flujo] {destino.name}: unido con FFmpeg mientras se descargaba")
+                for f, piezas in zip(formatos, resumenes):
+                    huellas[f.get('format_id')] = huella(None, piezas)
+                return self._verificar(ydl, info, calidad, medicion, hooks, huellas, intento,
+                                       [(str(destino), seleccion)], terminar_en_flujo)
+        
+        if conversion is not None and not formatos:
+            convertidor = StreamingMerger(al_reintentar=medicion.reintento, pool=self.pool_http,
+                                          red=RedHTTP.de_ydl(ydl), limite=ydl.params.get('ratelimit'))
+            try:
+                # Descarga y conversión son el mismo paso
+                with medicion.fase('transferencia'):
+                    piezas = convertidor.convertir(original, destino, conversion, hooks, seleccion)
+            except FusionNoSoportada as e:
+                ydl.to_screen(f"[flujo] {e}: se descarga y convierte por separado")
+            else:
+                ydl.to_screen(f"[flujo] {destino.name}: convertido con FFmpeg mientras se descargaba")
+                huellas[original.get('format_id')] = huella(None, piezas)
+                return self._verificar(ydl, info, calidad, medicion, hooks, huellas, intento,
+                                       [(str(destino), seleccion)], terminar_en_flujo)
+        
+        # yt-dlp llama a post_process y luego apunta la descarga en el archivo:
+        # se guardan ambas cosas para hacerlas después, fuera del hilo de descarga
+        pendientes, archivar = [], []
+        post_process, record_download_archive = ydl.post_process, ydl.record_download_archive
+        
+        def aplazar(filename, info_video, files_to_move=None):
+            info_video['filepath'] = filename
+            # Copia: al volver, yt-dlp vacía y rellena este mismo dict con menos claves
+            pendientes.append((filename, dict(info_video), files_to_move))
+            return info_video
+        
+        ydl.post_process, ydl.record_download_archive = aplazar, archivar.append
+        try:
+            with medicion.fase('transferencia'):
+                resultado = ydl.process_ie_result(info, download=True)
+        finally:
+            del ydl.post_process, ydl.record_download_archive
+        
+        run_pp = ydl.run_pp
+        
+        def run_pp_medido(pp, info_video):
+            # El movimiento al destino final es un postprocesador más de yt-dlp
+            with medicion.fase('movimiento' if pp.PP_NAME == 'MoveFiles' else 'fusion'):
+                return run_pp(pp, info_video)
+        
+        def posprocesar():
+            """Fusiona y corrige; devuelve cada archivo final con el info dict que lo describe"""
+            terminados = []
+            ydl.run_pp = run_pp_medido
+            try:
+                for filename, info_video, files_to_move in pendientes:
+                    final = post_process(filename, info_video, files_to_move)
+                    if not final.get('filepath') or not os.path.isfile(final['filepath']):
+                        continue
+                    ajeno = info_video.get('__real_download') is False
+                    if ajeno and self._es_otro_video(final['filepath'], clave):
+                        # yt-dlp lo dio por descargado porque el nombre ya existía, pero
+                        # no lo escribió esta descarga ni se sabe de qué video es: ni
+                        # se registra su integridad ni entra en el almacén con esta clave
+                        ydl.to_screen(f"[almacén] {Path(final['filepath']).name}: ya existía y no se puede "
+                                      f"comprobar que sea este video; no se guarda en el almacén")
+                        continue
+                    terminados.append((final['filepath'], final))
+            finally:
+                del ydl.run_pp
+            return terminados
+        
+        def terminar(terminados):
+            # Solo lo que pasó la verificación cuenta como descargado
+            for info_video in archivar:
+                record_download_archive(info_video)
+            for archivo, _ in terminados:
+                guardar(archivo)
+        
+        if conversion is not None:
+            def convertir():
+                archivos = posprocesar()
+                if not archivos:
+                    return []
+                with medicion.fase('fusion'):
+                    convertir_audio(archivos[0][0], destino, conversion)
+                # Lo que se verifica y va al almacén es el archivo convertido
+                return [(str(destino), seleccion)]
+            
+            return self._verificar(ydl, info, calidad, medicion, hooks, huellas, intento,
+                                   self.transcodificacion.enviar(convertir), terminar)
+        
+        if not any(info_video.get('__postprocessors') for _, info_video, _ in pendientes):
+            # Nada que fusionar ni corregir: no hace falta pasar por la etapa
+            return self._verificar(ydl, info, calidad, medicion, hooks, huellas, intento,
+                                   posprocesar(), terminar)
+        return self._verificar(ydl, info, calidad, medicion, hooks, huellas, intento,
+                               self.postproceso.enviar(posprocesar), terminar)
+    
+    def _verificar(self, ydl, info, calidad, medicion, hooks, huellas, intento, terminados, al_terminar):
+        """
+        Etapa de verificación, en self.comprobaciones tras el posprocesado
+        
+        terminados es la lista de (archivo final, info dict que lo describe)
+        o el Future de la etapa anterior que la devuelve. Cada archivo se
+        comprueba con ffprobe y su resumen va al índice de integridad junto
+        con sus hashes (ver _resumen_integridad). Si todo está bien se llama
+        a al_terminar(terminados) (registro y almacén); si alguno está
+        corrupto se borran y se repite la descarga en self.repeticiones,
+        REINTENTOS_VERIFICACION veces como mucho.
+        """
+        previo = terminados if isinstance(terminados, Future) else None
+        
+        def verificar(resultado):
+            lista = resultado if previo is not None else terminados
+            datos = []
+            try:
+                with medicion.fase('verificacion'):
+                    for archivo, info_video in lista:
+                        esperado = esperado_de(info_video)
+                        contenedor = verificar_contenedor(archivo, esperado) if self.verificacion else None
+                        if self.verificacion and contenedor is None:
+                            ydl.to_screen(f"[integridad] {Path(archivo).name}: sin ffprobe ni FFmpeg, "
+                                          f"no se comprueba el contenedor")
+                        # La clave del almacén dice más tarde de qué video es el archivo
+                        datos.append((archivo, {'clave': self.almacen.clave(info_video), 'esperado': esperado,
+                                                'contenedor': contenedor,
+                                                **self._resumen_integridad(archivo, huellas)}))
+            except ArchivoCorrupto as e:
+                corrupto = Path(archivo).name
+                for archivo, _ in lista:
+                    self.integridad.eliminar(archivo)
+                    try:
+                        os.remove(archivo)
+                    except OSError:
+                        pass
+                if intento >= REINTENTOS_VERIFICACION:
+                    raise ArchivoCorrupto(f"{corrupto}: {e}") from e
+                ydl.to_screen(f"[integridad] {corrupto}: {e}; se descarga otra vez")
+                medicion.reintento()
+                huellas.clear()
+                # La descarga repetida va a su propio grupo: en este esperan las
+                # comprobaciones de otros archivos. Como sale de la caché, sin lo
+                # que yt-dlp añadió al descargarlo
+                return self.repeticiones.enviar(
+                    self._descargar_info, ydl, ydl.sanitize_info(info, remove_private_keys=True),
+                    calidad, medicion, hooks, huellas, intento + 1)
+            for archivo, resumen in datos:
+                self.integridad.guardar(archivo, resumen)
+            al_terminar(lista)
+            return None
+        
+        return encadenar(previo, self.comprobaciones, verificar)
+    
+    def _es_otro_video(self, archivo, clave):
+        """
+        False solo si archivo es, seguro, el de la descarga con esa clave
+        
+        Lo es si el índice de integridad lo registró con la misma clave del
+        almacén y no ha cambiado de tamaño. Un archivo sin registro (de
+        antes del almacén, o de otro programa) puede ser cualquier cosa: se
+        trata como otro video, para no darlo por descargado ni meterlo en
+        el almacén con la clave de esta descarga.
+        """
+        registro = self.integridad.obtener(archivo)
+        if registro and registro.get('clave') and registro.get('tamano') == os.path.getsize(archivo):
+            return registro['clave'] != clave
+        return True
+    
+    @staticmethod
+    def _resumen_integridad(archivo, huellas):
+        """
+        Hashes de un archivo final calculados al escribirlo
+        
+        Si el archivo es el mismo que escribió el descargador propio (sin
+        pasar por FFmpeg) su resumen es el del archivo; si no, se guardan
+        los de los streams descargados a partir de los que se generó. No se
+        vuelve a leer el archivo: sin descargador propio (lo bajó yt-dlp)
+        solo queda su tamaño.
+        """
+        for datos in huellas.values():
+            if datos is not None and es_el_mismo(datos, archivo):
+                return {'tamano': datos['tamano'], 'sha256_piezas': datos['sha256_piezas'],
+                        'piezas': datos['piezas']}
+        resumen = {'tamano': os.path.getsize(archivo)}
+        fuentes = {formato: {'tamano': datos['tamano'], 'sha256_piezas': datos['sha256_piezas']}
+                   for formato, datos in huellas.items() if datos is not None}
+        if fuentes:
+            resumen['fuentes'] = fuentes
+        return resumen
+    
+    def _seleccion_audio(self, seleccion):
+        """
+        Selección del modo solo audio: (selección, argumentos de FFmpeg o None)
+        
+        Si el formato elegido ya está en self.formato_audio no hay nada que
+        hacer. Si no, la selección pasa a describir el archivo convertido
+        (extensión e id propios, para que el almacén no lo confunda con el
+        original) y se devuelven los argumentos de la conversión: copia del
+        stream si el códec cabe en el contenedor, o recodificación a
+        self.audio_kbps (o al bitrate del original si es menor: más no
+        mejora el sonido y solo ocupa más).
+        """
+        contenedor = self.formato_audio
+        copiar = copia_audio(seleccion.get('acodec'), contenedor)
+        if copiar and seleccion.get('ext') == contenedor:
+            return seleccion, None
+        original = seleccion.get('abr') or seleccion.get('tbr')
+        kbps = min(self.audio_kbps, round(original)) if original else self.audio_kbps
+        sufijo = contenedor if copiar else f'{contenedor}{kbps}'
+        seleccion = {**seleccion, 'ext': contenedor, 'format_id': f"{seleccion.get('format_id')}-{sufijo}"}
+        return seleccion, argumentos_audio(contenedor, kbps, copiar)
+    
+    def _contar_reintentos(self, ydl, medicion, host):
+        """
+        Cuenta los reintentos que yt-dlp anuncia por pantalla
+        
+        Van a la medición y, como errores del host, a la concurrencia
+        adaptativa (un 429 de yt-dlp también recorta el límite del lote).
+        """
+        to_screen = ydl.to_screen
+        
+        def to_screen_contando(mensaje, *args, **kwargs):
+            if mensaje.startswith('[download] Got error') and '. Retrying' in mensaje:
+                medicion.reintento()
+                self.trabajos_por_host.error(host, mensaje)
+            return to_screen(mensaje, *args, **kwargs)
+        
+        ydl.to_screen = to_screen_contando
+    
+    def _instalar_descargador(self, ydl, progress_hooks, medicion):
+        """
+        Usa las descargas paralelas propias cuando están activadas y el formato lo permite
+        
+        Van con el proxy, las cookies, la verificación TLS y el límite de
+        velocidad de la sesión de yt-dlp; si el sondeo falla o algo no se
+        puede hacer con ellos, descarga yt-dlp. Devuelve el dict donde se
+        irán dejando, por format_id, los hashes de lo que escriben (vacío
+        para lo que descarga yt-dlp).
+        """
+        huellas = {}
+        if self.conexiones <= 1 and self.fragmentos <= 1 and not self.vigilancia:
+            return huellas
+        dl_original = ydl.dl
+        red, limite = RedHTTP.de_ydl(ydl), ydl.params.get('ratelimit')
+        
+        def dl(name, info, subtitle=False, test=False):
+            protocolo = info.get('protocol')
+            if subtitle or test:
+                pass
+            elif protocolo in ('http', 'https') and (self.conexiones > 1 or self.vigilancia):
+                segmentada = SegmentedDownloader(
+                    conexiones=self.conexiones, al_reintentar=medicion.reintento, pool=self.pool_http,
+                    concurrencia=self.conexiones_por_host if self.conexiones > 1 else None,
+                    vigilancia=self.vigilancia, ventana_atasco=self.ventana_atasco,
+                    red=red, limite=limite,
+                    al_relevar=lambda tramo: ydl.to_screen(
+                        f"[vigilancia] Conexión atascada en el byte {tramo.posicion}: abriendo un relevo"))
+                try:
+                    piezas = segmentada.descargar(info['url'], name, info.get('http_headers'), progress_hooks, info)
+                    huellas[info.get('format_id')] = huella(name, piezas)
+                    return True, True
+                except RangosNoSoportados:
+                    pass
+            elif protocolo in ('m3u8_native', 'http_dash_segments') and self.fragmentos > 1:
+                fragmentada = FragmentDownloader(simultaneos=self.fragmentos, al_reintentar=medicion.reintento,
+                                                 pool=self.pool_http, concurrencia=self.conexiones_por_host,
+                                                 red=red, limite=limite)
+                try:
+                    piezas = fragmentada.descargar(info, name, info.get('http_headers'), progress_hooks)
+                    huellas[info.get('format_id')] = huella(name, piezas)
+                    return True, True
+                except FragmentosNoSoportados:
+                    pass
+            # Lo demás (y lo que no soportamos) lo descarga yt-dlp
+            return dl_original(name, info, subtitle=subtitle, test=test)
+        
+        ydl.dl = dl
+        return huellas
     
     def _progress_hook(self, d):
         """Hook para mostrar progreso de descarga"""
@@ -99,11 +825,69 @@ class VideoDownloader:
             percent = d.get('_percent_str', 'N/A')
             speed = d.get('_speed_str', 'N/A')
             eta = d.get('_eta_str', 'N/A')
-            print(f"\rProgreso: {percent} | Velocidad: {speed} | ETA: {eta}", end='')
+            linea = f"\rProgreso: {percent} | Velocidad: {speed} | ETA: {eta}"
+            estadisticas = self.planificador.estadisticas()
+            if len(estadisticas['trabajos']) > 1:
+                linea += f" | Total: {_formato_velocidad(estadisticas['velocidad_total'])}"
+            # Conexiones en uso y límite adaptativo del servidor de este archivo
+            host = _servidor_de(d.get('info_dict') or {})
+            linea += _formato_concurrencia(host, self.conexiones_por_host.estado(host))
+            print(linea, end='')
         elif d['status'] == 'finished':
             print("\n🔄 Procesando video...")
 
 
+# Opción del menú → calidad
+CALIDADES_MENU = {
+    '1': 'best',
+    '2': '1080',
+    '3': '720',
+    '4': '480',
+    '5': '360',
+    '6': 'worst',
+    '10': 'audio'
+}
+
+
+def es_playlist(info):
+    """True si el info dict es una lista o canal en lugar de un video"""
+    return info.get('_type') in ('playlist', 'multi_video')
+
+
+def _url_de(item):
+    """URL de un elemento del lote (URL o info dict)"""
+    if isinstance(item, dict):
+        return item.get('webpage_url') or item.get('url') or item.get('id', '')
+    return item
+
+
+def _espera_ytdlp(n):
+    """retry_sleep_functions de yt-dlp (recibe el número de reintento como n)"""
+    return espera_reintento(n)
+
+
+def _formato_velocidad(bytes_por_segundo):
+    return f"{bytes_por_segundo / (1024 * 1024):.2f} MB/s"
+
+
+def _servidor_de(info):
+    """Servidor del que se descarga un formato (clave de conexiones_por_host)"""
+    return urlsplit(info.get('url') or '').hostname
+
+
+def _formato_concurrencia(host, estado):
+    """' | host: activas/límite' para las líneas de progreso ('' si el host no tiene estado)"""
+    if not estado:
+        return ''
+    return f" | {host}: {estado['activas']}/{estado['limite']}"
+
+
+def _host_de(url):
+    """Devuelve el host de una URL sin el prefijo www."""
+    host = (urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
 def mostrar_menu():
     """Muestra el menú principal"""
     print("\n" + "="*50)
@@ -117,11 +901,198 @@ def mostrar_menu():
     print("  5. 360p")
     print("  6. Peor calidad (worst)")
     print("  7. Ver formatos disponibles")
+    print("  8. Descargar varias URLs (lote)")
+    print("  9. Ajustes de rendimiento")
+    print(" 10. Solo audio")
     print("  0. Salir")
     print("="*50)
 
 
-def main():
+def pedir_entero(mensaje, actual):
+    """Pide un número entero positivo; Enter conserva el valor actual"""
+    valor = input(f"{mensaje} [{actual}]: ").strip()
+    if valor.isdigit() and int(valor) > 0:
+        return int(valor)
+    return actual
+
+
+def configurar_rendimiento(downloader):
+    """Ajusta las opciones de rendimiento del descargador"""
+    print("\n⚙️ Ajustes de rendimiento")
+    downloader.conexiones = pedir_entero(
+        "🔀 Conexiones por archivo (formatos progresivos, 1 = desactivado)", downloader.conexiones)
+    downloader.fragmentos = pedir_entero(
+        "🧩 Fragmentos HLS/DASH en paralelo (1 = uno tras otro)", downloader.fragmentos)
+    valor = input(f"🌊 Unir video y audio mientras se descargan, sin archivos temporales (s/n) "
+                  f"[{'s' if downloader.fusion_en_flujo else 'n'}]: ").strip().lower()
+    if valor in ('s', 'n'):
+        downloader.fusion_en_flujo = valor == 's'
+    valor = input(f"🐢 Relevar las conexiones atascadas con una conexión nueva (s/n) "
+                  f"[{'s' if downloader.vigilancia else 'n'}]: ").strip().lower()
+    if valor in ('s', 'n'):
+        downloader.vigilancia = valor == 's'
+    valor = input(f"🎵 Formato del modo solo audio ({'/'.join(CONTENEDORES_AUDIO)}) "
+                  f"[{downloader.formato_audio}]: ").strip().lower()
+    if valor in CONTENEDORES_AUDIO:
+        downloader.formato_audio = valor
+    downloader.audio_kbps = pedir_entero(
+        "🎚️ Bitrate en kbps si hay que recodificar el audio", downloader.audio_kbps)
+    actual = downloader.planificador.limite
+    valor = input(f"🚦 Límite de velocidad total en MB/s (0 = sin límite) "
+                  f"[{actual / (1024 * 1024) if actual else 0:g}]: ").strip()
+    try:
+        if valor:
+            downloader.planificador.limite = max(0.0, float(valor)) * 1024 * 1024 or None
+    except ValueError:
+        pass
+    print("✅ Ajustes guardados")
+
+
+def leer_urls(urls, archivos):
+    """URLs de los argumentos y luego de cada archivo ('-' = entrada estándar), de forma perezosa"""
+    yield from urls
+    for archivo in archivos:
+        f = sys.stdin if archivo == '-' else open(archivo, encoding='utf-8')
+        with f:
+            for linea in f:
+                linea = linea.strip()
+                # Líneas vacías y comentarios se ignoran, como en los archivos de yt-dlp
+                if linea and not linea.startswith('#'):
+                    yield linea
+
+
+class SalidaJSON:
+    """Escribe eventos como JSON lines en stdout (una línea completa por evento, desde cualquier hilo)"""
+    
+    def __init__(self, intervalo_progreso=1.0):
+        self.intervalo_progreso = intervalo_progreso
+        self._ultimo = {}
+        self._lock = threading.Lock()
+    
+    def emitir(self, evento, **datos):
+        linea = json.dumps({'evento': evento, **datos}, ensure_ascii=False)
+        with self._lock:
+            sys.stdout.write(linea + '\n')
+            sys.stdout.flush()
+    
+    def progress_hook(self, d):
+        """Progreso de cada archivo, como mucho una línea por intervalo"""
+        if d['status'] != 'downloading':
+            return
+        archivo = d.get('filename') or d.get('tmpfilename')
+        ahora = time.monotonic()
+        with self._lock:
+            if ahora - self._ultimo.get(archivo, 0) < self.intervalo_progreso:
+                return
+            self._ultimo[archivo] = ahora
+        info = d.get('info_dict') or {}
+        url = info.get('webpage_url') or info.get('original_url')
+        self.emitir(
+            'progreso',
+            url=url,
+            archivo=archivo,
+            descargado=d.get('downloaded_bytes'),
+            total=d.get('total_bytes') or d.get('total_bytes_estimate'),
+            velocidad=d.get('speed'),
+            eta=d.get('eta'),
+            # Estado de la concurrencia adaptativa: descargas del lote contra
+            # la plataforma y conexiones contra el servidor de medios
+            trabajos=trabajos_por_host.estado(_host_de(url or '')),
+            conexiones=conexiones_por_host.estado(_servidor_de(info)),
+        )
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        description="Descargador de videos universal. Sin argumentos abre el menú interactivo; "
+                    "con URLs (o --entrada) descarga sin preguntar y escribe JSON lines en stdout.")
+    parser.add_argument('urls', nargs='*', help='URLs a descargar')
+    parser.add_argument('-i', '--entrada', action='append', default=[], metavar='ARCHIVO',
+                        help="archivo con una URL por línea ('-' = entrada estándar); se puede repetir")
+    parser.add_argument('-c', '--calidad', default='best', choices=list(CALIDADES_MENU.values()))
+    parser.add_argument('-o', '--carpeta', default='descargas', help='carpeta de salida')
+    parser.add_argument('-j', '--simultaneas', type=int, default=4, help='descargas simultáneas')
+    parser.add_argument('--por-host', type=int, default=2, help='descargas simultáneas por host al empezar (luego se ajusta solo)')
+    parser.add_argument('--conexiones', type=int, default=1, help='conexiones por archivo al empezar (luego se ajusta solo)')
+    parser.add_argument('--fragmentos', type=int, default=1, help='fragmentos HLS/DASH en paralelo')
+    parser.add_argument('--fusion-en-flujo', action='store_true',
+                        help='unir video y audio con FFmpeg mientras se descargan, sin archivos intermedios')
+    parser.add_argument('--ventana-atasco', type=float, default=VENTANA_ATASCO, metavar='SEG',
+                        help='segundos muy por debajo de la velocidad mediana para relevar una conexión')
+    parser.add_argument('--vigilancia', action='store_true',
+                        help='relevar con una conexión nueva las conexiones atascadas')
+    parser.add_argument('--sin-verificacion', action='store_true',
+                        help='no comprobar con ffprobe los archivos terminados')
+    parser.add_argument('--formato-audio', default='m4a', choices=list(CONTENEDORES_AUDIO),
+                        help='contenedor del modo solo audio (-c audio)')
+    parser.add_argument('--kbps-audio', type=int, default=AUDIO_OBJETIVO_KBPS, metavar='KBPS',
+                        help='bitrate si hay que recodificar el audio')
+    parser.add_argument('--limite', type=float, default=None, metavar='MB/S',
+                        help='límite de velocidad total')
+    parser.add_argument('--registro', action='store_true',
+                        help='saltar lo ya descargado (registro en CARPETA/.archivo.sqlite3)')
+    parser.add_argument('--metricas', metavar='ARCHIVO',
+                        help='añadir tiempos por fase, bytes, reintentos y errores de cada descarga '
+                             'a este archivo JSON lines')
+    return parser
+
+
+def ejecutar_cli(args):
+    """
+    Modo no interactivo: devuelve el código de salida
+    
+    0 = todo descargado, 1 = alguna descarga falló, 2 = no se indicó ninguna URL
+    (main también sale con 2 si no puede leer un archivo de -i).
+    """
+    downloader = VideoDownloader(args.carpeta, conexiones=args.conexiones,
+                                 fragmentos=args.fragmentos, archivo=args.registro or None,
+                                 fusion_en_flujo=args.fusion_en_flujo,
+                                 formato_audio=args.formato_audio, audio_kbps=args.kbps_audio,
+                                 vigilancia=args.vigilancia, ventana_atasco=args.ventana_atasco,
+                                 verificacion=not args.sin_verificacion)
+    downloader.silencioso = True
+    if args.limite:
+        downloader.planificador.limite = args.limite * 1024 * 1024
+    if args.metricas:
+        downloader.metricas.configurar_archivo(args.metricas)
+    salida = SalidaJSON()
+    
+    def al_terminar(resultado):
+        salida.emitir('resultado', **resultado)
+    
+    resultados = downloader.descargar_lote(
+        leer_urls(args.urls, args.entrada), args.calidad,
+        max_descargas=args.simultaneas, max_por_host=args.por_host,
+        progress_hooks=[salida.progress_hook], al_terminar=al_terminar)
+    fallidas = sum(1 for r in resultados if not r['ok'])
+    salida.emitir('resumen', total=len(resultados), completadas=len(resultados) - fallidas,
+                  fallidas=fallidas)
+    if not resultados:
+        return 2
+    return 1 if fallidas else 0
+
+
+def main(argv=None):
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    # La entrada estándar solo se lee con -i -: sin argumentos siempre se abre el menú,
+    # aunque stdin no sea una terminal (consolas de IDE, nohup, </dev/null)
+    for archivo in args.entrada or ():
+        # leer_urls los abre sobre la marcha: comprobarlos antes de empezar
+        if archivo != '-':
+            try:
+                open(archivo, encoding='utf-8').close()
+            except OSError as e:
+                parser.error(f"no se puede leer {archivo}: {e.strerror or e}")
+    if args.urls or args.entrada:
+        try:
+            sys.exit(ejecutar_cli(args))
+        except KeyboardInterrupt:
+            sys.exit(130)
+    menu_interactivo()
+
+
+def menu_interactivo():
     downloader = VideoDownloader()
     
     while True:
@@ -133,6 +1104,19 @@ def main():
             print("\n👋 ¡Hasta luego!")
             break
         
+        if opcion == '9':
+            configurar_rendimiento(downloader)
+            continue
+        
+        if opcion == '8':
+            urls = input("\n🔗 Ingresa las URLs separadas por espacios: ").split()
+            calidad = input("📊 Calidad (best/1080/720/480/360/worst/audio) [best]: ").strip() or 'best'
+            resultados = downloader.descargar_lote(urls, calidad)
+            fallidas = [r for r in resultados if not r['ok']]
+            print(f"\n✅ {len(resultados) - len(fallidas)} completadas | ❌ {len(fallidas)} con error")
+            input("\n⏎ Presiona Enter para continuar...")
+            continue
+        
         url = input("\n🔗 Ingresa la URL del video: ").strip()
         
         if not url:
@@ -147,19 +1131,17 @@ def main():
                 print("\nFormatos disponibles:")
                 for i, f in enumerate(formatos[:10], 1):
                     size = f['filesize'] / (1024*1024) if f['filesize'] else 0
-                    print(f"  {i}. {f['resolution']} - {f['ext']} ({size:.1f} MB)")
+                    print(f"  {i}. {f['resolution']} - {f['ext']} - {f['tipo']} ({size:.1f} MB)")
+                planes, _ = downloader.estimar_calidades(url)
+                print("\nTamaño estimado por opción:")
+                for numero, calidad in CALIDADES_MENU.items():
+                    plan = planes.get(calidad)
+                    if plan:
+                        detalle = f"{plan['kbps']:g} kbps" if calidad == 'audio' else f"{plan['altura']}p"
+                        print(f"  {numero}. {calidad}: {detalle} {plan['ext']} ({formato_tamano(plan['bytes'])})")
             continue
         
-        calidad_map = {
-            '1': 'best',
-            '2': '1080',
-            '3': '720',
-            '4': '480',
-            '5': '360',
-            '6': 'worst'
-        }
-        
-        calidad = calidad_map.get(opcion)
+        calidad = CALIDADES_MENU.get(opcion)
         
         if calidad:
             downloader.descargar_video(url, calidad)
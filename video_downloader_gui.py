@@ -3,6 +3,7 @@
 Descargador de Videos Universal - Interfaz Gráfica
 """
 
+import logging
 import os
 import sys
 import threading
@@ -10,12 +11,17 @@ from pathlib import Path
 
 try:
     import customtkinter as ctk
-    import yt_dlp
 except ImportError:
     print("Error: Faltan dependencias.")
     print("Instala con: pip install customtkinter yt-dlp")
     sys.exit(1)
 
+from activity_log import ActivityLog
+from bandwidth import PRIORIDAD_INTERACTIVA
+from download_daemon import cliente_desde_entorno
+from format_planner import formato_tamano
+from progress_bus import ProgressBus
+
 # Agregar FFmpeg al PATH si está instalado por WinGet
 ffmpeg_path = Path(os.environ.get('LOCALAPPDATA', '')) / 'Microsoft' / 'WinGet' / 'Links'
 if ffmpeg_path.exists() and str(ffmpeg_path) not in os.environ.get('PATH', ''):
@@ -34,8 +40,57 @@ class VideoDownloaderGUI:
         
         self.output_dir = Path("descargas")
         self.output_dir.mkdir(exist_ok=True)
+        # Últimas líneas en pantalla; el historial completo en un log rotativo
+        self.registro = ActivityLog(self.output_dir / '.registro' / 'actividad.log')
+        # Con VIDEO_DOWNLOADER_DAEMON definida, las descargas las hace el demonio;
+        # si no, el descargador local se crea en segundo plano (ver warm_up)
+        self.downloader = cliente_desde_entorno()
         
         self.setup_ui()
+        
+        # Los hilos de descarga publican aquí; Tk lo vacía a ritmo fijo
+        self.bus = ProgressBus()
+        self.bus.iniciar_sondeo(self.window)
+        
+        if self.downloader is None:
+            self.prepare()
+    
+    def prepare(self):
+        """Crea el descargador local en segundo plano con los botones desactivados"""
+        # Importar yt-dlp tarda: la ventana se pinta ya y los botones se activan al terminar
+        self.download_btn.configure(state="disabled", text="⏳ Preparando yt-dlp...")
+        self.analyze_btn.configure(state="disabled")
+        threading.Thread(target=self.warm_up, daemon=True).start()
+    
+    def warm_up(self):
+        """Importa yt-dlp y prepara el descargador sin bloquear la ventana"""
+        try:
+            from video_downloader import VideoDownloader
+            downloader = VideoDownloader(self.output_dir)
+            downloader.precalentar()
+        except (ImportError, SystemExit):
+            self.bus.publicar(self.set_error, "❌ Falta yt-dlp: pip install yt-dlp")
+            return
+        except Exception as e:
+            # Carpeta sin permisos, caché ilegible...: sin esto los botones
+            # se quedarían desactivados para siempre
+            logging.exception("No se pudo preparar el descargador")
+            self.log(f"❌ No se pudo preparar el descargador: {e}")
+            self.bus.publicar(self.set_error, f"❌ Error al preparar el descargador: {e}")
+            return
+        self.downloader = downloader
+        self.bus.publicar(self.set_ready)
+    
+    def set_ready(self):
+        """Activa los botones cuando el descargador está listo"""
+        self.download_btn.configure(state="normal", text="⬇️ DESCARGAR VIDEO")
+        self.analyze_btn.configure(state="normal")
+    
+    def set_error(self, message):
+        """Muestra por qué no hay descargador y deja los botones activos para reintentar"""
+        self.update_status(message, "red")
+        self.download_btn.configure(state="normal", text="🔁 Reintentar")
+        self.analyze_btn.configure(state="normal")
     
     def setup_ui(self):
         # Frame principal
@@ -77,6 +132,16 @@ class VideoDownloaderGUI:
         )
         self.url_entry.pack(fill="x", padx=10, pady=(0, 10))
         
+        # Estimar el tamaño de cada calidad antes de descargar
+        self.analyze_btn = ctk.CTkButton(
+            url_frame,
+            text="🔍 Analizar tamaños",
+            command=self.start_analysis,
+            height=30,
+            font=ctk.CTkFont(size=12)
+        )
+        self.analyze_btn.pack(anchor="e", padx=10, pady=(0, 10))
+        
         # Frame para calidad
         quality_frame = ctk.CTkFrame(main_frame)
         quality_frame.pack(fill="x", padx=20, pady=10)
@@ -96,9 +161,11 @@ class VideoDownloaderGUI:
             ("📺 720p (HD)", "720"),
             ("📺 480p (SD)", "480"),
             ("📺 360p", "360"),
-            ("💾 Peor Calidad (menor tamaño)", "worst")
+            ("💾 Peor Calidad (menor tamaño)", "worst"),
+            ("🎵 Solo audio", "audio")
         ]
         
+        self.quality_radios = {}
         for text, value in qualities:
             radio = ctk.CTkRadioButton(
                 quality_frame,
@@ -108,6 +175,37 @@ class VideoDownloaderGUI:
                 font=ctk.CTkFont(size=12)
             )
             radio.pack(anchor="w", padx=20, pady=3)
+            self.quality_radios[value] = (radio, text)
+        
+        # Fragmentos HLS/DASH descargados a la vez
+        fragments_row = ctk.CTkFrame(quality_frame, fg_color="transparent")
+        fragments_row.pack(anchor="w", padx=20, pady=(8, 3))
+        
+        fragments_label = ctk.CTkLabel(
+            fragments_row,
+            text="⚡ Fragmentos paralelos (HLS/DASH):",
+            font=ctk.CTkFont(size=12)
+        )
+        fragments_label.pack(side="left")
+        
+        self.fragments_var = ctk.StringVar(value="4")
+        fragments_menu = ctk.CTkOptionMenu(
+            fragments_row,
+            values=["1", "2", "4", "8", "16"],
+            variable=self.fragments_var,
+            width=70
+        )
+        fragments_menu.pack(side="left", padx=(10, 0))
+        
+        # Relevo de conexiones atascadas en formatos progresivos (ver VideoDownloader.vigilancia)
+        self.hedging_var = ctk.BooleanVar(value=False)
+        hedging_check = ctk.CTkCheckBox(
+            fragments_row,
+            text="🛟 Relevar conexiones lentas",
+            variable=self.hedging_var,
+            font=ctk.CTkFont(size=12)
+        )
+        hedging_check.pack(side="left", padx=(20, 0))
         
         quality_frame.pack_configure(pady=(10, 10))
         
@@ -164,14 +262,63 @@ class VideoDownloaderGUI:
         self.log_text.pack(fill="both", expand=True, padx=20, pady=(10, 20))
     
     def log(self, message, color="white"):
-        """Agrega mensaje al log"""
-        self.log_text.insert("end", message + "\n")
-        self.log_text.see("end")
+        """Agrega mensaje al log (se puede llamar desde cualquier hilo)"""
+        self.registro.escribir(message)
+        # Como progreso: como mucho un volcado por fotograma
+        self.bus.publicar_progreso('registro', self.registro.volcar, self.log_text)
     
     def update_status(self, message, color="white"):
         """Actualiza el label de estado"""
         self.status_label.configure(text=message, text_color=color)
     
+    def show_progress(self, value, message, color):
+        """Actualiza barra y estado a la vez (value=None deja la barra igual)"""
+        if value is not None:
+            self.progress_bar.set(value)
+        self.update_status(message, color)
+    
+    def start_analysis(self):
+        """Calcula en un hilo el tamaño estimado de cada calidad"""
+        url = self.url_entry.get().strip()
+        
+        if not url:
+            self.update_status("❌ Por favor ingresa una URL", "red")
+            return
+        
+        if self.downloader is None:
+            # Falló la preparación (ver set_error): el botón la reintenta
+            self.prepare()
+            return
+        
+        self.analyze_btn.configure(state="disabled", text="⏳ Analizando...")
+        thread = threading.Thread(target=self.analyze_video, args=(url,))
+        thread.daemon = True
+        thread.start()
+    
+    def analyze_video(self, url):
+        """Obtiene el plan de formato de cada calidad"""
+        try:
+            planes, titulo = self.downloader.estimar_calidades(url)
+            if titulo:
+                self.log(f"📹 Título: {titulo}")
+            self.bus.publicar(self.show_sizes, planes)
+        except Exception as e:
+            self.log(f"❌ Error al analizar: {e}")
+        finally:
+            self.bus.publicar(lambda: self.analyze_btn.configure(
+                state="normal",
+                text="🔍 Analizar tamaños"
+            ))
+    
+    def show_sizes(self, planes):
+        """Añade el tamaño estimado a cada opción de calidad"""
+        for value, (radio, text) in self.quality_radios.items():
+            plan = planes.get(value)
+            if plan:
+                detalle = f"{plan['kbps']:.0f} kbps" if value == 'audio' else f"{plan['altura']}p"
+                text = f"{text}  ({detalle}, {formato_tamano(plan['bytes'])})"
+            radio.configure(text=text)
+    
     def start_download(self):
         """Inicia la descarga en un hilo separado"""
         url = self.url_entry.get().strip()
@@ -180,6 +327,11 @@ class VideoDownloaderGUI:
             self.update_status("❌ Por favor ingresa una URL", "red")
             return
         
+        if self.downloader is None:
+            # Falló la preparación (ver set_error): el botón la reintenta
+            self.prepare()
+            return
+        
         # Deshabilitar botón durante descarga
         self.download_btn.configure(state="disabled", text="⏳ Descargando...")
         self.progress_bar.set(0)
@@ -193,50 +345,40 @@ class VideoDownloaderGUI:
     def download_video(self, url):
         """Descarga el video"""
         quality = self.quality_var.get()
+        self.downloader.fragmentos = int(self.fragments_var.get())
+        self.downloader.vigilancia = self.hedging_var.get()
         
-        # Usar FFmpeg para mejor calidad
-        if quality == 'best':
-            format_string = 'bestvideo+bestaudio/best'
-        elif quality == 'worst':
-            format_string = 'worstvideo+worstaudio/worst'
-        else:
-            format_string = f'bestvideo[height<={quality}]+bestaudio/best[height<={quality}]'
-        
-        ydl_opts = {
-            'format': format_string,
-            'outtmpl': str(self.output_dir / '%(title)s.%(ext)s'),
-            'merge_output_format': 'mp4',
-            'progress_hooks': [self.progress_hook],
-        }
+        def mostrar_info(info):
+            title = info.get('title', 'video')
+            self.log(f"📹 Título: {title}")
+            self.log("")
         
         try:
             self.log(f"🎬 Iniciando descarga...")
             self.log(f"🔗 URL: {url}")
             self.log(f"📊 Calidad: {quality}")
+            self.log(f"⚡ Fragmentos paralelos: {self.downloader.fragmentos}")
+            if self.downloader.vigilancia:
+                self.log("🛟 Relevo de conexiones lentas activado")
             self.log(f"📁 Carpeta: {self.output_dir.absolute()}")
             self.log("-" * 50)
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                title = info.get('title', 'video')
-                self.log(f"📹 Título: {title}")
-                self.log("")
-                
-                ydl.download([url])
+            # Una sola extracción: el mismo info dict se usa para descargar
+            self.downloader.ejecutar_descarga(url, quality, [self.progress_hook], al_extraer=mostrar_info,
+                                              prioridad=PRIORIDAD_INTERACTIVA)
             
-            self.window.after(0, lambda: self.update_status("✅ Descarga completada!", "green"))
+            self.bus.publicar_progreso('descarga', self.show_progress, 1, "✅ Descarga completada!", "green")
             self.log("")
             self.log("✅ ¡Descarga completada exitosamente!")
-            self.window.after(0, lambda: self.progress_bar.set(1))
             
         except Exception as e:
             error_msg = str(e)
-            self.window.after(0, lambda: self.update_status(f"❌ Error: {error_msg}", "red"))
+            self.bus.publicar_progreso('descarga', self.show_progress, None, f"❌ Error: {error_msg}", "red")
             self.log(f"❌ Error: {error_msg}")
         
         finally:
             # Rehabilitar botón
-            self.window.after(0, lambda: self.download_btn.configure(
+            self.bus.publicar(lambda: self.download_btn.configure(
                 state="normal",
                 text="⬇️ DESCARGAR VIDEO"
             ))
@@ -253,22 +395,20 @@ class VideoDownloaderGUI:
                 else:
                     percent = 0
                 
-                # Actualizar barra de progreso
-                self.window.after(0, lambda p=percent: self.progress_bar.set(p))
-                
                 # Actualizar estado
                 percent_str = d.get('_percent_str', 'N/A')
                 speed_str = d.get('_speed_str', 'N/A')
                 eta_str = d.get('_eta_str', 'N/A')
                 
                 status = f"⬇️ Descargando: {percent_str} | Velocidad: {speed_str} | ETA: {eta_str}"
-                self.window.after(0, lambda s=status: self.update_status(s, "cyan"))
+                # Solo el último tick por trabajo llega a la interfaz
+                self.bus.publicar_progreso('descarga', self.show_progress, percent, status, "cyan")
                 
             except Exception:
                 pass
         
         elif d['status'] == 'finished':
-            self.window.after(0, lambda: self.update_status("🔄 Procesando video...", "yellow"))
+            self.bus.publicar_progreso('descarga', self.show_progress, None, "🔄 Procesando video...", "yellow")
     
     def run(self):
         """Ejecuta la aplicación"""
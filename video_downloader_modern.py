@@ -1,3 +1,4 @@
+import logging
 import os
 import sys
 import threading
@@ -7,12 +8,17 @@ import webbrowser
 try:
     import ttkbootstrap as ttk
     from ttkbootstrap.constants import *
-    import yt_dlp
 except ImportError:
     print("Error: Faltan dependencias.")
     print("Instala con: pip install ttkbootstrap yt-dlp")
     sys.exit(1)
 
+from activity_log import ActivityLog
+from bandwidth import PRIORIDAD_INTERACTIVA
+from download_daemon import cliente_desde_entorno
+from format_planner import formato_tamano
+from progress_bus import ProgressBus
+
 ffmpeg_path = Path(os.environ.get('LOCALAPPDATA', '')) / 'Microsoft' / 'WinGet' / 'Links'
 if ffmpeg_path.exists() and str(ffmpeg_path) not in os.environ.get('PATH', ''):
     os.environ['PATH'] = str(ffmpeg_path) + os.pathsep + os.environ.get('PATH', '')
@@ -26,8 +32,57 @@ class ModernVideoDownloader:
         
         self.output_dir = Path("descargas")
         self.output_dir.mkdir(exist_ok=True)
+        # Últimas líneas en pantalla; el historial completo en un log rotativo
+        self.registro = ActivityLog(self.output_dir / '.registro' / 'actividad.log')
+        # Con VIDEO_DOWNLOADER_DAEMON definida, las descargas las hace el demonio;
+        # si no, el descargador local se crea en segundo plano (ver warm_up)
+        self.downloader = cliente_desde_entorno()
         
         self.setup_ui()
+        
+        # Los hilos de descarga publican aquí; Tk lo vacía a ritmo fijo
+        self.bus = ProgressBus()
+        self.bus.iniciar_sondeo(self.window)
+        
+        if self.downloader is None:
+            self.prepare()
+    
+    def prepare(self):
+        """Crea el descargador local en segundo plano con los botones desactivados"""
+        # Importar yt-dlp tarda: la ventana se pinta ya y los botones se activan al terminar
+        self.download_btn.config(state="disabled", text="⏳ Preparando yt-dlp...")
+        self.analyze_btn.config(state="disabled")
+        threading.Thread(target=self.warm_up, daemon=True).start()
+    
+    def warm_up(self):
+        """Importa yt-dlp y prepara el descargador sin bloquear la ventana"""
+        try:
+            from video_downloader import VideoDownloader
+            downloader = VideoDownloader(self.output_dir)
+            downloader.precalentar()
+        except (ImportError, SystemExit):
+            self.bus.publicar(self.set_error, "❌ Falta yt-dlp: pip install yt-dlp")
+            return
+        except Exception as e:
+            # Carpeta sin permisos, caché ilegible...: sin esto los botones
+            # se quedarían desactivados para siempre
+            logging.exception("No se pudo preparar el descargador")
+            self.log(f"❌ No se pudo preparar el descargador: {e}")
+            self.bus.publicar(self.set_error, f"❌ Error al preparar el descargador: {e}")
+            return
+        self.downloader = downloader
+        self.bus.publicar(self.set_ready)
+    
+    def set_ready(self):
+        """Activa los botones cuando el descargador está listo"""
+        self.download_btn.config(state="normal", text="⬇️  DOWNLOAD VIDEO")
+        self.analyze_btn.config(state="normal")
+    
+    def set_error(self, message):
+        """Muestra por qué no hay descargador y deja los botones activos para reintentar"""
+        self.update_status(message, "danger")
+        self.download_btn.config(state="normal", text="🔁 Reintentar")
+        self.analyze_btn.config(state="normal")
     
     def setup_ui(self):
         # Header profesional
@@ -75,6 +130,15 @@ class ModernVideoDownloader:
         self.url_entry.insert(0, "Paste video link here...")
         self.url_entry.bind("<FocusIn>", self.clear_placeholder)
         
+        # Estimar el tamaño de cada calidad antes de descargar
+        self.analyze_btn = ttk.Button(
+            url_card,
+            text="🔍 Analyze sizes",
+            command=self.start_analysis,
+            bootstyle="info-outline"
+        )
+        self.analyze_btn.pack(anchor="e", pady=(10, 0))
+        
         # Card para calidad con diseño profesional
         quality_card = ttk.Labelframe(
             container,
@@ -93,9 +157,11 @@ class ModernVideoDownloader:
             ("📺 720p HD", "720", "info"),
             ("📺 480p SD", "480", "warning"),
             ("📺 360p", "360", "warning"),
-            ("💾 Smallest Size", "worst", "secondary")
+            ("💾 Smallest Size", "worst", "secondary"),
+            ("🎵 Audio Only", "audio", "primary")
         ]
         
+        self.quality_radios = {}
         for i, (text, value, style) in enumerate(qualities):
             row = i // 2
             col = i % 2
@@ -108,6 +174,36 @@ class ModernVideoDownloader:
                 bootstyle=style
             )
             radio.grid(row=row, column=col, sticky="w", padx=10, pady=5)
+            self.quality_radios[value] = (radio, text)
+        
+        # Fragmentos HLS/DASH descargados a la vez
+        fragments_label = ttk.Label(
+            quality_card,
+            text="⚡ Parallel fragments (HLS/DASH):",
+            font=("Segoe UI", 10)
+        )
+        fragments_label.grid(row=4, column=0, sticky="w", padx=10, pady=(10, 5))
+        
+        self.fragments_var = ttk.StringVar(value="4")
+        fragments_spin = ttk.Spinbox(
+            quality_card,
+            from_=1,
+            to=16,
+            textvariable=self.fragments_var,
+            width=5,
+            bootstyle="success"
+        )
+        fragments_spin.grid(row=4, column=1, sticky="w", padx=10, pady=(10, 5))
+        
+        # Relevo de conexiones atascadas en formatos progresivos (ver VideoDownloader.vigilancia)
+        self.hedging_var = ttk.BooleanVar(value=False)
+        hedging_check = ttk.Checkbutton(
+            quality_card,
+            text="🛟 Hedge slow connections",
+            variable=self.hedging_var,
+            bootstyle="success-round-toggle"
+        )
+        hedging_check.grid(row=5, column=0, columnspan=2, sticky="w", padx=10, pady=(5, 5))
         
         # Card para carpeta de salida
         output_card = ttk.Labelframe(
@@ -213,15 +309,62 @@ class ModernVideoDownloader:
         os.startfile(self.output_dir.absolute())
     
     def log(self, message):
-        """Agrega mensaje al log"""
-        self.log_text.insert("end", message + "\n")
-        self.log_text.see("end")
-        self.window.update()
+        """Agrega mensaje al log (se puede llamar desde cualquier hilo)"""
+        self.registro.escribir(message)
+        # Como progreso: como mucho un volcado por fotograma
+        self.bus.publicar_progreso('registro', self.registro.volcar, self.log_text)
     
     def update_status(self, message, style="secondary"):
         """Actualiza el label de estado"""
         self.status_label.config(text=message, bootstyle=style)
-        self.window.update()
+    
+    def show_progress(self, value, message, style):
+        """Actualiza barra y estado a la vez (value=None deja la barra igual)"""
+        if value is not None:
+            self.progress_bar.config(value=value)
+        self.update_status(message, style)
+    
+    def start_analysis(self):
+        """Calcula en un hilo el tamaño estimado de cada calidad"""
+        url = self.url_entry.get().strip()
+        
+        if not url or url == "Paste video link here...":
+            self.update_status("❌ Please enter a valid URL", "danger")
+            return
+        
+        if self.downloader is None:
+            # Falló la preparación (ver set_error): el botón la reintenta
+            self.prepare()
+            return
+        
+        self.analyze_btn.config(state="disabled", text="⏳ Analyzing...")
+        thread = threading.Thread(target=self.analyze_video, args=(url,))
+        thread.daemon = True
+        thread.start()
+    
+    def analyze_video(self, url):
+        """Obtiene el plan de formato de cada calidad"""
+        try:
+            planes, titulo = self.downloader.estimar_calidades(url)
+            if titulo:
+                self.log(f"📹 Title: {titulo}")
+            self.bus.publicar(self.show_sizes, planes)
+        except Exception as e:
+            self.log(f"❌ Analysis error: {e}")
+        finally:
+            self.bus.publicar(lambda: self.analyze_btn.config(
+                state="normal",
+                text="🔍 Analyze sizes"
+            ))
+    
+    def show_sizes(self, planes):
+        """Añade el tamaño estimado a cada opción de calidad"""
+        for value, (radio, text) in self.quality_radios.items():
+            plan = planes.get(value)
+            if plan:
+                detalle = f"{plan['kbps']:.0f} kbps" if value == 'audio' else f"{plan['altura']}p"
+                text = f"{text}  ({detalle}, {formato_tamano(plan['bytes'])})"
+            radio.config(text=text)
     
     def start_download(self):
         """Inicia la descarga"""
@@ -231,6 +374,11 @@ class ModernVideoDownloader:
             self.update_status("❌ Please enter a valid URL", "danger")
             return
         
+        if self.downloader is None:
+            # Falló la preparación (ver set_error): el botón la reintenta
+            self.prepare()
+            return
+        
         self.download_btn.config(state="disabled", text="⏳ Downloading...")
         self.progress_bar["value"] = 0
         self.log_text.delete("1.0", "end")
@@ -242,21 +390,23 @@ class ModernVideoDownloader:
     def download_video(self, url):
         """Descarga el video"""
         quality = self.quality_var.get()
-        
-        # Configurar formato con FFmpeg
-        if quality == 'best':
-            format_string = 'bestvideo+bestaudio/best'
-        elif quality == 'worst':
-            format_string = 'worstvideo+worstaudio/worst'
-        else:
-            format_string = f'bestvideo[height<={quality}]+bestaudio/best[height<={quality}]'
-        
-        ydl_opts = {
-            'format': format_string,
-            'outtmpl': str(self.output_dir / '%(title)s.%(ext)s'),
-            'merge_output_format': 'mp4',
-            'progress_hooks': [self.progress_hook],
-        }
+        try:
+            self.downloader.fragmentos = max(1, int(self.fragments_var.get()))
+        except ValueError:
+            self.downloader.fragmentos = 1
+        self.downloader.vigilancia = self.hedging_var.get()
+        
+        def mostrar_info(info):
+            title = info.get('title', 'video')
+            duration = int(info.get('duration') or 0)
+            
+            self.log(f"📹 Title: {title}")
+            if duration:
+                mins = duration // 60
+                secs = duration % 60
+                self.log(f"⏱️ Duration: {mins}:{secs:02d}")
+            self.log("")
+            self.log("⬇️ Downloading...")
         
         try:
             self.log("=" * 60)
@@ -264,38 +414,29 @@ class ModernVideoDownloader:
             self.log("=" * 60)
             self.log(f"🔗 URL: {url}")
             self.log(f"📊 Quality: {quality}")
+            self.log(f"⚡ Parallel fragments: {self.downloader.fragmentos}")
+            if self.downloader.vigilancia:
+                self.log("🛟 Slow-connection hedging on")
             self.log(f"📁 Destination: {self.output_dir.absolute()}")
             self.log("")
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                title = info.get('title', 'video')
-                duration = info.get('duration', 0)
-                
-                self.log(f"📹 Title: {title}")
-                if duration:
-                    mins = duration // 60
-                    secs = duration % 60
-                    self.log(f"⏱️ Duration: {mins}:{secs:02d}")
-                self.log("")
-                self.log("⬇️ Downloading...")
-                
-                ydl.download([url])
+            # Una sola extracción: el mismo info dict se usa para descargar
+            self.downloader.ejecutar_descarga(url, quality, [self.progress_hook], al_extraer=mostrar_info,
+                                              prioridad=PRIORIDAD_INTERACTIVA)
             
-            self.window.after(0, lambda: self.update_status("✅ Download completed successfully!", "success"))
+            self.bus.publicar_progreso('descarga', self.show_progress, 100, "✅ Download completed successfully!", "success")
             self.log("")
             self.log("=" * 60)
             self.log("✅ DOWNLOAD COMPLETED")
             self.log("=" * 60)
-            self.window.after(0, lambda: self.progress_bar.config(value=100))
             
         except Exception as e:
             error_msg = str(e)
-            self.window.after(0, lambda: self.update_status(f"❌ Error: {error_msg}", "danger"))
+            self.bus.publicar_progreso('descarga', self.show_progress, None, f"❌ Error: {error_msg}", "danger")
             self.log(f"\n❌ ERROR: {error_msg}")
         
         finally:
-            self.window.after(0, lambda: self.download_btn.config(
+            self.bus.publicar(lambda: self.download_btn.config(
                 state="normal",
                 text="⬇️  DOWNLOAD VIDEO"
             ))
@@ -311,20 +452,19 @@ class ModernVideoDownloader:
                 else:
                     percent = 0
                 
-                self.window.after(0, lambda p=percent: self.progress_bar.config(value=p))
-                
                 percent_str = d.get('_percent_str', 'N/A')
                 speed_str = d.get('_speed_str', 'N/A')
                 eta_str = d.get('_eta_str', 'N/A')
                 
                 status = f"⬇️ {percent_str} | 🚀 {speed_str} | ⏱️ ETA: {eta_str}"
-                self.window.after(0, lambda s=status: self.update_status(s, "info"))
+                # Solo el último tick por trabajo llega a la interfaz
+                self.bus.publicar_progreso('descarga', self.show_progress, percent, status, "info")
                 
             except Exception:
                 pass
         
         elif d['status'] == 'finished':
-            self.window.after(0, lambda: self.update_status("🔄 Processing and converting...", "warning"))
+            self.bus.publicar_progreso('descarga', self.show_progress, None, "🔄 Processing and converting...", "warning")
     
     def run(self):
         """Ejecuta la aplicación"""